@@ -18,18 +18,22 @@
 # *********************************************************************
 
 import inspect
-from datetime import datetime
+from contextlib import contextmanager
 from functools import wraps
+from heapq import heapify, heapreplace
 
+from lewis.adapters.epics_inprocess import InProcessDriver, InProcessServer
 from lewis.core.adapters import Adapter
-from lewis.core.devices import InterfaceBase
+from lewis.core.clock import get_clock
+from lewis.core.devices import DeviceBase, InterfaceBase
 from lewis.core.exceptions import (
     AccessViolationException,
     LewisException,
     LimitViolationException,
 )
 from lewis.core.logging import has_log
-from lewis.core.utils import FromOptionalDependency, format_doc_text, seconds_since
+from lewis.core.utils import IMMUTABLE_TYPES, FromOptionalDependency, format_doc_text
+from lewis.core.waveform import Waveform
 
 # pcaspy might not be available. To make EPICS-based adapters show up
 # in the listed adapters anyway dummy types are created in this case
@@ -46,9 +50,17 @@ Driver, SimpleServer = FromOptionalDependency(
     "pcaspy", missing_pcaspy_exception
 ).do_import("Driver", "SimpleServer")
 
-pcaspy_manager = FromOptionalDependency(
-    "pcaspy.driver", missing_pcaspy_exception
-).do_import("manager")
+array_equal, ndarray = FromOptionalDependency("numpy").do_import(
+    "array_equal", "ndarray"
+)
+
+_MISSING = object()
+
+
+@contextmanager
+def _unlocked():
+    """Context manager that does nothing, for reads that are served from a snapshot."""
+    yield
 
 
 class BoundPV:
@@ -69,7 +81,8 @@ class BoundPV:
     docstring.
 
     To get and set the value of the property on the target, the ``value``-property of
-    this class can be used, to get the meta data dict, there's a ``meta``-property.
+    this class can be used, to get the meta data dict, there's a ``meta``-property. If the
+    value can only change by assigning the attribute, ``changes`` counts those assignments.
 
     :param pv: PV object to bind to target and meta_target.
     :param target: Object that has an attribute named pv.property.
@@ -81,6 +94,10 @@ class BoundPV:
         self._target = target
         self._pv = pv
 
+        self._tracks_changes = isinstance(
+            target, DeviceBase
+        ) and target.tracks_attribute_changes(pv.property)
+
     @property
     def value(self):
         """Value of the bound property on the target."""
@@ -95,14 +112,43 @@ class BoundPV:
 
         setattr(self._target, self._pv.property, new_value)
 
+    @property
+    def changes(self):
+        """
+        Number of changes of the value if the PV exposes an attribute that the device lists in
+        ``tracked_attributes`` and that has an immutable value, see
+        :meth:`~lewis.core.devices.DeviceBase.get_attribute_changes`.
+        For a :class:`~lewis.core.waveform.Waveform`, its version is included. Otherwise the
+        value may change whenever the device is modified, then this is None.
+        """
+        if not self._tracks_changes:
+            return None
+
+        target = self._target
+
+        value = vars(target).get(self._pv.property, _MISSING)
+
+        if isinstance(value, Waveform):
+            return target.get_attribute_changes(self._pv.property), value.version
+
+        if not isinstance(value, IMMUTABLE_TYPES):
+            return None
+
+        return target.get_attribute_changes(self._pv.property)
+
     @property
     def meta(self):
         """Value of the bound meta-property on the target."""
-        if not self._pv.meta_data_property or not self._meta_target:
+        if not self.has_meta:
             return {}
 
         return getattr(self._meta_target, self._pv.meta_data_property)
 
+    @property
+    def has_meta(self):
+        """True if the PV has a meta-property, otherwise :attr:`meta` is always empty."""
+        return bool(self._pv.meta_data_property and self._meta_target)
+
     @property
     def read_only(self):
         """True if the PV is read-only."""
@@ -419,23 +465,231 @@ class PV:
         if inspect.ismethod(func):
             n += 1
 
-        argspec = inspect.getargspec(func)
+        argspec = inspect.getfullargspec(func)
         defaults = argspec.defaults or ()
 
         return len(argspec.args) - len(defaults) == n
 
 
-@has_log
-class PropertyExposingDriver(Driver):
-    def __init__(self, interface, device_lock):
-        super(PropertyExposingDriver, self).__init__()
+class PollSchedule:
+    """
+    The times at which the PVs of an interface are due to be polled, stored in a heap, so that
+    finding the PVs that are due only touches those PVs, no matter how many PVs with long
+    poll intervals there are.
+
+    PVs are due for the first time one poll interval after the schedule has been created.
+    When a PV is taken from the schedule, it is due again one poll interval later, unless
+    that time has already passed, then it is due one poll interval from now. PVs with a
+    poll interval of 0 are due whenever :meth:`pop_due` is called, they are not part of the
+    heap.
+
+    :param poll_intervals: Dictionary with the poll interval in seconds of each PV.
+    """
+
+    def __init__(self, poll_intervals):
+        self._clock = get_clock()
+        self._intervals = {
+            pv: round(interval * 1e9) for pv, interval in poll_intervals.items()
+        }
+        self._always_due = [
+            pv for pv, interval in self._intervals.items() if interval <= 0
+        ]
+
+        self.reset()
+
+    def reset(self):
+        """Schedules all PVs one poll interval from now."""
+        now = self._clock.time_ns()
+
+        self._heap = [
+            (now + interval, index, pv)
+            for index, (pv, interval) in enumerate(self._intervals.items())
+            if interval > 0
+        ]
+        heapify(self._heap)
+
+    def pop_due(self):
+        """
+        Returns the PVs that are due and schedules their next poll.
+
+        :return: List of PV names.
+        """
+        now = self._clock.time_ns()
+        heap = self._heap
+        due = list(self._always_due)
+
+        while heap and heap[0][0] <= now:
+            deadline, index, pv = heap[0]
+            interval = self._intervals[pv]
+
+            deadline += interval
+            if deadline <= now:
+                deadline = now + interval
+
+            heapreplace(heap, (deadline, index, pv))
+            due.append(pv)
+
+        return due
+
+    @property
+    def polls_continuously(self):
+        """True if there are PVs with a poll interval of 0."""
+        return bool(self._always_due)
+
+    def seconds_until_due(self):
+        """
+        Returns the time until the next PV in the heap is due.
+
+        :return: Time in seconds, 0 if a PV is overdue or None if the heap is empty.
+        """
+        if not self._heap:
+            return None
+
+        return max(self._heap[0][0] - self._clock.time_ns(), 0) * 1e-9
+
+
+class PropertyExposingDriverBase:
+    """
+    The driver logic of :class:`EpicsAdapter`, which publishes the values of the PVs of an
+    :class:`EpicsInterface` and forwards writes to the interface. It is combined with the
+    ``Driver`` class of a ChannelAccess backend, :class:`PropertyExposingDriver` for pcaspy
+    and :class:`InProcessPropertyExposingDriver` for the in-process stand-in.
+
+    Values and meta data of a PV are only read again after its poll interval has passed, which
+    is tracked by a :class:`PollSchedule`, and if they may have changed since they were last
+    read. For PVs that expose an attribute that the device tracks, that is the case if a
+    different value has been assigned to the attribute (see :attr:`BoundPV.changes`), for all
+    other PVs if the device has been processed or written to, which is tracked by the
+    :attr:`~lewis.core.adapters.DeviceLock.generation` of the device lock. Properties that
+    depend on anything but the state of device and interface, such as the current time, are
+    therefore not updated while the device is quiescent.
+
+    :param interface: :class:`EpicsInterface` with the PVs to publish.
+    :param device_lock: The lock that is used for device access.
+    :param kwargs: Arguments that are passed on to the ``Driver`` of the backend.
+    """
+
+    def __init__(self, interface, device_lock, **kwargs):
+        super(PropertyExposingDriverBase, self).__init__(**kwargs)
 
         self._interface = interface
         self._device_lock = device_lock
         self._set_logging_context(interface)
 
-        self._timers = {k: 0.0 for k in self._interface.bound_pvs.keys()}
-        self._last_update_call = None
+        self._generation_getter = self._create_getter(device_lock, "generation")
+        self._device_lock.register_getter(self._generation_getter)
+
+        self._bind_pvs()
+
+    def _bind_pvs(self):
+        """
+        Creates the poll schedule and getters for the PVs that are currently bound by the
+        interface. This is repeated when the interface is bound to a different device, for
+        example after switching the setup, because both refer to the bound PVs of the
+        previous device.
+        """
+        self._bound_pvs = self._interface.bound_pvs
+
+        self._schedule = PollSchedule(
+            {pv: pv_object.poll_interval for pv, pv_object in self._bound_pvs.items()}
+        )
+
+        # Getters for value, meta data and changes of each PV, so they can be served from
+        # snapshots, which then also contain the generation the values belong to. PVs without
+        # meta-property do not have a getter for meta data.
+        self._getters = {
+            pv: (
+                self._create_getter(pv_object, "value"),
+                (
+                    self._create_getter(pv_object, "meta")
+                    if pv_object.has_meta
+                    else None
+                ),
+                self._create_getter(pv_object, "changes"),
+            )
+            for pv, pv_object in self._bound_pvs.items()
+        }
+
+        for getters in self._getters.values():
+            for getter in getters:
+                if getter is not None:
+                    self._device_lock.register_getter(getter)
+
+        # Versions of value and meta data of each PV when they were last read
+        self._value_versions = {}
+        self._meta_versions = {}
+
+        # Meta data that has last been published for each PV
+        self._published_meta = {}
+
+        # Versions of the waveforms that have last been published
+        self._published_waveforms = {}
+
+    @staticmethod
+    def _create_getter(obj, attribute):
+        return lambda: getattr(obj, attribute)
+
+    @staticmethod
+    def _get_version(changes, generation):
+        """
+        Returns a value that is different whenever the value of a PV may have changed, or None
+        if that can not be determined.
+        """
+        if changes is not None:
+            return "changes", changes
+
+        if generation is not None:
+            return "generation", generation
+
+        return None
+
+    @staticmethod
+    def _is_current(versions, pv, version):
+        return version is not None and versions.get(pv) == version
+
+    def _has_changed(self, pv, value):
+        """
+        Returns True if value is different from the published value of the PV. Waveforms are
+        compared by their version, other arrays by their values.
+        """
+        if isinstance(value, Waveform):
+            return self._published_waveforms.get(pv) != value.version
+
+        if isinstance(value, ndarray):
+            return not array_equal(self.getParam(pv), value)
+
+        return self.getParam(pv) != value
+
+    def _get_param_value(self, pv, value):
+        """
+        Returns the value that is passed to the backend. Waveforms are published as read-only
+        views, which are not modified by later changes of the waveform, so that the values
+        are not copied. Other arrays are copied, because they may be modified in place.
+        """
+        if isinstance(value, Waveform):
+            self._published_waveforms[pv] = value.version
+            return value.values
+
+        self._published_waveforms.pop(pv, None)
+
+        if isinstance(value, ndarray):
+            return value.copy()
+
+        return value
+
+    def _read(self, getter, snapshot):
+        """
+        Returns the value of getter from snapshot if possible. If there is no snapshot, the
+        device lock must already be held for reading.
+        """
+        if snapshot is None:
+            return getter()
+
+        if getter in snapshot:
+            return snapshot[getter]
+
+        with self._device_lock.read():
+            return getter()
 
     def write(self, pv, value):
         self.log.debug("PV put request: %s=%s", pv, value)
@@ -448,7 +702,7 @@ class PropertyExposingDriver(Driver):
         try:
             with self._device_lock:
                 pv_object.value = value
-                self.setParam(pv, pv_object.value)
+                self.setParam(pv, self._get_param_value(pv, pv_object.value))
 
                 return True
         except LimitViolationException as e:
@@ -468,70 +722,97 @@ class PropertyExposingDriver(Driver):
 
         return False
 
-    def _get_param_info(self, pv, meta_keys):
-        """
-        Get PV info fields from pcaspy's "manager" object. This function returns a dictionary
-        with info/value pairs, where each entry of meta_keys results in a dictionary entry if
-        pcaspy's PVInfo-object has such an attribute. Attributes that do not exist are ignored.
-        Valid attributes are the same as specified in the ``pvdb``-argument that
-
-        :param pv: PV base name
-        :param meta_keys: List of keys for what information to obtain
-        :return:
-        """
-        # TODO: Submit upstream patch to make this method available in base class
-        pv = pcaspy_manager.pvs[self.port][pv]
-
-        info_dict = {}
-        for key in meta_keys:
-            if hasattr(pv.info, key):
-                info_dict[key] = getattr(pv.info, key)
-
-        return info_dict
-
     def process_pv_updates(self, force=False):
         """
         Update PV values that have changed for PVs that are due to update according to their
-        respective poll interval timers.
+        respective poll intervals.
 
-        :param force: If True, will force updates to all PVs regardless of timers.
+        If the interface has been bound to a different device since the last call, all PVs are
+        updated from the new device.
+
+        :param force: If True, will force updates to all PVs regardless of poll intervals.
         """
-        dt = seconds_since(self._last_update_call or datetime.now())
+        if self._bound_pvs is not self._interface.bound_pvs:
+            self.log.info("Interface has been bound to a new device, updating all PVs.")
+            self._bind_pvs()
+            force = True
+
+        if force:
+            due = list(self._interface.bound_pvs.keys())
+            self._schedule.reset()
+        else:
+            due = self._schedule.pop_due()
+
+        if not due:
+            return
 
         # Cache details of PVs that need to update
         value_updates = []
         meta_updates = []
 
-        with self._device_lock:
-            for pv, pv_object in self._interface.bound_pvs.items():
-                self._timers[pv] = self._timers.get(pv, 0.0) + dt
-                if self._timers[pv] >= pv_object.poll_interval or force:
-                    try:
-                        if self.getParam(pv) != pv_object.value or force:
-                            value_updates.append((pv, pv_object.value))
+        # Values are read from the latest snapshot of the device, if there is one
+        snapshot = self._device_lock.snapshot
+
+        # Reading PVs does not modify the device, so it does not need to wake the simulation
+        with self._device_lock.read() if snapshot is None else _unlocked():
+            generation = self._read(self._generation_getter, snapshot)
+
+            for pv in due:
+                try:
+                    value_getter, meta_getter, changes_getter = self._getters[pv]
+
+                    version = self._get_version(
+                        self._read(changes_getter, snapshot), generation
+                    )
+
+                    if force or not self._is_current(self._value_versions, pv, version):
+                        value = self._read(value_getter, snapshot)
+                        if force or self._has_changed(pv, value):
+                            value_updates.append((pv, self._get_param_value(pv, value)))
+
+                        self._value_versions[pv] = version
+
+                    if meta_getter is None:
+                        continue
 
-                        pv_meta = pv_object.meta
-                        if self._get_param_info(pv, pv_meta.keys()) != pv_meta or force:
+                    version = self._get_version(None, generation)
+
+                    if force or not self._is_current(self._meta_versions, pv, version):
+                        pv_meta = self._read(meta_getter, snapshot)
+                        if self._published_meta.get(pv) != pv_meta or force:
                             meta_updates.append((pv, pv_meta))
 
-                    except (AttributeError, TypeError):
-                        self.log.exception(
-                            "An error occurred while updating PV %s.", pv
-                        )
-                    finally:
-                        self._timers[pv] = 0.0
+                        self._meta_versions[pv] = version
+
+                except (AttributeError, TypeError):
+                    self.log.exception("An error occurred while updating PV %s.", pv)
 
         self._process_value_updates(value_updates)
         self._process_meta_updates(meta_updates)
 
-        self._last_update_call = datetime.now()
+    @property
+    def seconds_until_update(self):
+        """
+        Time in seconds until the next PV is due to be updated or None if all PVs are updated
+        in every call of :meth:`process_pv_updates`.
+        """
+        return self._schedule.seconds_until_due()
+
+    @property
+    def polls_continuously(self):
+        """True if there are PVs that are updated in every call of :meth:`process_pv_updates`."""
+        return self._schedule.polls_continuously
 
     def _process_value_updates(self, updates):
         if updates:
             update_log = []
             for pv, value in updates:
                 self.setParam(pv, value)
-                update_log.append("{}={}".format(pv, value))
+                update_log.append(
+                    "{}=<{} values>".format(pv, len(value))
+                    if isinstance(value, ndarray)
+                    else "{}={}".format(pv, value)
+                )
 
             self.log.info("Processed PV updates: %s", ", ".join(update_log))
 
@@ -543,11 +824,42 @@ class PropertyExposingDriver(Driver):
             update_log = []
             for pv, info in updates:
                 self.setParamInfo(pv, info)
+                self._published_meta[pv] = dict(info)
                 update_log.append("{}={}".format(pv, info))
 
             self.log.info("Processed PV-info updates: %s", ", ".join(update_log))
 
 
+@has_log
+class PropertyExposingDriver(PropertyExposingDriverBase, Driver):
+    """
+    The pcaspy driver of :class:`EpicsAdapter`, see :class:`PropertyExposingDriverBase`.
+
+    :param interface: :class:`EpicsInterface` with the PVs to publish.
+    :param device_lock: The lock that is used for device access.
+    """
+
+    def __init__(self, interface, device_lock):
+        super(PropertyExposingDriver, self).__init__(interface, device_lock)
+
+
+@has_log
+class InProcessPropertyExposingDriver(PropertyExposingDriverBase, InProcessDriver):
+    """
+    The driver of :class:`EpicsAdapter` for the in-process ChannelAccess stand-in, see
+    :class:`PropertyExposingDriverBase` and :mod:`lewis.adapters.epics_inprocess`.
+
+    :param interface: :class:`EpicsInterface` with the PVs to publish.
+    :param device_lock: The lock that is used for device access.
+    :param server: :class:`~lewis.adapters.epics_inprocess.InProcessServer` with the PVs.
+    """
+
+    def __init__(self, interface, device_lock, server):
+        super(InProcessPropertyExposingDriver, self).__init__(
+            interface, device_lock, server=server
+        )
+
+
 class EpicsAdapter(Adapter):
     """
     This adapter provides ChannelAccess server functionality through the pcaspy module.
@@ -561,10 +873,16 @@ class EpicsAdapter(Adapter):
             'prefix': 'PVPREFIX:'
         }
 
+    The ``backend`` option selects the ChannelAccess implementation, either ``pcaspy``
+    (default) or ``inprocess``. The latter is a stand-in that does not require pcaspy or
+    EPICS base, its PVs can only be accessed from the same process with
+    :class:`~lewis.adapters.epics_inprocess.InProcessClient`, which is useful for
+    benchmarks and tests.
+
     :param options: Dictionary with options.
     """
 
-    default_options = {"prefix": ""}
+    default_options = {"prefix": "", "backend": "pcaspy"}
 
     def __init__(self, options=None):
         super(EpicsAdapter, self).__init__(options)
@@ -572,6 +890,12 @@ class EpicsAdapter(Adapter):
         self._server = None
         self._driver = None
 
+        if self._options.backend not in ("pcaspy", "inprocess"):
+            raise LewisException(
+                "Unknown EPICS backend '{}', must be either 'pcaspy' or "
+                "'inprocess'.".format(self._options.backend)
+            )
+
     @property
     def documentation(self):
         pvs = []
@@ -592,21 +916,33 @@ class EpicsAdapter(Adapter):
 
     def start_server(self):
         """
-        Creates a pcaspy-server.
+        Creates a pcaspy-server or an in-process server, depending on the ``backend`` option.
 
         .. note::
 
             The server does not process requests unless :meth:`handle` is called regularly.
         """
         if self._server is None:
-            self._server = SimpleServer()
+            if self._options.backend == "inprocess":
+                self._server = InProcessServer()
+            else:
+                self._server = SimpleServer()
+
             self._server.createPV(
                 prefix=self._options.prefix,
                 pvdb={k: v.config for k, v in self.interface.bound_pvs.items()},
             )
-            self._driver = PropertyExposingDriver(
-                interface=self.interface, device_lock=self.device_lock
-            )
+
+            if self._options.backend == "inprocess":
+                self._driver = InProcessPropertyExposingDriver(
+                    interface=self.interface,
+                    device_lock=self.device_lock,
+                    server=self._server,
+                )
+            else:
+                self._driver = PropertyExposingDriver(
+                    interface=self.interface, device_lock=self.device_lock
+                )
             self._driver.process_pv_updates(force=True)
 
             self.log.info(
@@ -620,6 +956,9 @@ class EpicsAdapter(Adapter):
             )
 
     def stop_server(self):
+        if self._options.backend == "inprocess" and self._server is not None:
+            self._server.close()
+
         self._driver = None
         self._server = None
 
@@ -627,16 +966,39 @@ class EpicsAdapter(Adapter):
     def is_running(self):
         return self._server is not None
 
+    @property
+    def seconds_until_update(self):
+        """
+        Time in seconds until the next PV is due to be updated according to its poll interval.
+        It is None if the server is not running, if no PV is updated periodically or if there
+        are PVs with a poll interval of 0, which are updated whenever :meth:`handle` is called.
+        """
+        if self._server is None or self._driver.polls_continuously:
+            return None
+
+        return self._driver.seconds_until_update
+
     def handle(self, cycle_delay=0.1):
         """
         Call this method to spend about ``cycle_delay`` seconds processing
-        requests in the pcaspy server. Under load, for example when running ``caget`` at a
+        requests in the ChannelAccess server. Under load, for example when running ``caget`` at a
         high frequency, the actual time spent in the method may be much shorter. This effect
         is not corrected for.
 
-        :param cycle_delay: Approximate time to be spent processing requests in pcaspy server.
+        PVs are updated as soon as they are due according to their poll interval, so the time
+        spent processing requests is shorter than ``cycle_delay`` if a PV is due earlier. The
+        time until the next PV is due is available in :attr:`seconds_until_update`, which the
+        :class:`~lewis.core.adapters.AdapterCollection` uses to avoid waking up the adapter
+        more often than necessary.
+
+        :param cycle_delay: Approximate time to be spent processing requests in the server.
         """
         if self._server is not None:
+            until_update = self._driver.seconds_until_update
+
+            if until_update is not None:
+                cycle_delay = min(cycle_delay, until_update)
+
             self._server.process(cycle_delay)
             self._driver.process_pv_updates()
 
@@ -697,6 +1059,17 @@ class EpicsInterface(InterfaceBase):
     protocol specific stuff, such as in the case above where stopping a device
     via EPICS might involve writing a value to a PV, whereas other protocols may
     offer an RPC-way of achieving the same thing.
+
+    Arrays are exposed as waveform PVs by specifying the number of elements as ``count``.
+    If the device stores the values in a :class:`~lewis.core.waveform.Waveform`, changes
+    are detected via its version and the values are published without copying them:
+
+    .. sourcecode:: Python
+
+        class SimpleDeviceEpicsInterface(EpicsInterface):
+            pvs = {
+                'VELO-TRACE': PV('speed_trace', read_only=True, count=1000),
+            }
     """
 
     protocol = "epics"
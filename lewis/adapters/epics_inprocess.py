@@ -0,0 +1,505 @@
+# -*- coding: utf-8 -*-
+# *********************************************************************
+# lewis - a library for creating hardware device simulators
+# Copyright (C) 2016-2020 European Spallation Source ERIC
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# *********************************************************************
+
+"""
+This module contains a ChannelAccess stand-in that runs entirely in the Python process, so that
+:class:`~lewis.adapters.epics.EpicsAdapter` can be used without pcaspy and EPICS base, for
+example to benchmark or test the PV update path. It is selected with the ``backend`` option of
+the adapter:
+
+.. sourcecode:: Python
+
+    options = {
+        'prefix': 'PVPREFIX:',
+        'backend': 'inprocess',
+    }
+
+:class:`InProcessServer` and :class:`InProcessDriver` implement the subset of the API of
+``pcaspy.SimpleServer`` and ``pcaspy.Driver`` that is used by the adapter. Clients in the same
+process access the PVs with :class:`InProcessClient`, which finds the PVs of all running
+servers by name, similar to the name search of ChannelAccess:
+
+.. sourcecode:: Python
+
+    client = InProcessClient()
+
+    client.put('PVPREFIX:Spd', 10.0)
+    client.get('PVPREFIX:Spd-RB')  # 10.0
+
+    monitor = client.monitor('PVPREFIX:ActSpd', lambda name, value, timestamp: print(value))
+    ...
+    monitor.clear()
+    client.close()
+
+There is no network involved, so the stand-in measures the time spent in the adapter, the
+device and the locking between them, but not the time spent in a ChannelAccess library.
+"""
+
+import queue
+import threading
+from concurrent.futures import Future
+
+from lewis.core.clock import get_clock
+from lewis.core.exceptions import LewisException
+from lewis.core.logging import has_log
+
+_servers = []
+_servers_lock = threading.Lock()
+
+_SCALAR_TYPES = (bool, int, float, str)
+
+_default_values = {"float": 0.0, "int": 0, "enum": 0, "string": "", "char": ""}
+
+
+class _Record:
+    """
+    Value and configuration of a PV. A record can be served under several names, if the same
+    PV is created with different prefixes.
+    """
+
+    def __init__(self, reason, config):
+        self.reason = reason
+        self.info = dict(config)
+        self.type = self.info.get("type", "float")
+        self.count = self.info.get("count", 1)
+
+        default = _default_values.get(self.type, 0.0)
+
+        if self.count > 1 and self.type != "char":
+            default = [default] * self.count
+
+        self.value = self.info.pop("value", default)
+        self.timestamp = get_clock().time_ns()
+        self.flag = False
+        self.monitors = []
+
+    def convert(self, value):
+        """
+        Converts a value that is put by a client to the type of the PV, similar to the
+        conversion done by ChannelAccess. Strings are accepted for enums.
+        """
+        if self.type in ("string", "char"):
+            return str(value)
+
+        if self.count > 1:
+            return value
+
+        try:
+            if self.type == "enum":
+                enums = self.info.get("enums", [])
+                return enums.index(value) if value in enums else int(value)
+
+            if self.type == "int":
+                return int(value)
+
+            return float(value)
+        except (TypeError, ValueError):
+            raise LewisException(
+                "Can not convert {!r} to the type {} of PV {}.".format(
+                    value, self.type, self.reason
+                )
+            )
+
+
+@has_log
+class InProcessServer:
+    """
+    Replacement for ``pcaspy.SimpleServer``. PVs are created with :meth:`createPV` and
+    requests of clients are only processed while :meth:`process` is called, which is done
+    by :meth:`~lewis.adapters.epics.EpicsAdapter.handle`.
+
+    While the server exists, its PVs can be found by :class:`InProcessClient`, :meth:`close`
+    removes it from the names that are visible to clients.
+    """
+
+    def __init__(self):
+        self._records = {}
+        self._names = {}
+        self._requests = queue.Queue()
+        self._lock = threading.Lock()
+        self._driver = None
+        self._clock = get_clock()
+
+        with _servers_lock:
+            _servers.append(self)
+
+    def createPV(self, prefix, pvdb):
+        """
+        Creates PVs with the supplied prefix. The PV database has the same format as for
+        pcaspy, it maps the PV names without prefix to dictionaries with the keys ``type``,
+        ``count``, ``enums`` and so on.
+
+        :param prefix: Prefix of the PV names.
+        :param pvdb: Dictionary with PV names and their configuration.
+        """
+        with self._lock:
+            for reason, config in pvdb.items():
+                record = self._records.get(reason)
+
+                if record is None:
+                    record = self._records[reason] = _Record(reason, config)
+
+                self._names[prefix + reason] = record
+
+    @property
+    def pv_names(self):
+        """Names of all PVs of this server, including prefix."""
+        with self._lock:
+            return sorted(self._names.keys())
+
+    def process(self, timeout):
+        """
+        Processes put requests of clients for about ``timeout`` seconds. The method returns
+        earlier if no request arrives within the remaining time.
+
+        :param timeout: Time in seconds to spend processing requests.
+        """
+        deadline = self._clock.time_ns() + round(timeout * 1e9)
+
+        while True:
+            remaining = (deadline - self._clock.time_ns()) * 1e-9
+
+            try:
+                name, value, future = self._requests.get(timeout=max(remaining, 0.0))
+            except queue.Empty:
+                return
+
+            future.set_result(self._write(name, value))
+
+    def close(self):
+        """
+        Removes the server from the names that are visible to clients. Put requests that have
+        not been processed yet fail.
+        """
+        with _servers_lock:
+            if self in _servers:
+                _servers.remove(self)
+
+        while True:
+            try:
+                _, _, future = self._requests.get_nowait()
+            except queue.Empty:
+                break
+
+            future.set_result(False)
+
+    def _attach(self, driver):
+        if self._driver is not None:
+            raise LewisException("The server already has a driver.")
+
+        self._driver = driver
+
+    def _get_record(self, name):
+        with self._lock:
+            return self._names.get(name)
+
+    def _write(self, name, value):
+        record = self._get_record(name)
+
+        if record is None or self._driver is None:
+            return False
+
+        try:
+            success = bool(self._driver.write(record.reason, value))
+        except Exception:
+            self.log.exception("An error occurred while writing %s to %s.", value, name)
+            return False
+
+        # Like pcaspy, a successful write is posted to monitors right away
+        if success:
+            self._driver.updatePVs()
+
+        return success
+
+    def _put(self, name, value):
+        record = self._get_record(name)
+
+        if record is None:
+            raise LewisException("PV {} does not exist.".format(name))
+
+        future = Future()
+        self._requests.put((name, record.convert(value), future))
+
+        return future
+
+
+@has_log
+class InProcessDriver:
+    """
+    Replacement for ``pcaspy.Driver``, which holds the values of the PVs of an
+    :class:`InProcessServer`. Values that are changed with :meth:`setParam` are posted to
+    monitors when :meth:`updatePVs` is called. Like in pcaspy, setting a scalar to the value it
+    already has is not posted, arrays are always posted.
+
+    Sub-classes override :meth:`write` to handle put requests of clients.
+
+    :param server: :class:`InProcessServer` with the PVs of the driver.
+    """
+
+    def __init__(self, server):
+        self._server = server
+        self._server._attach(self)
+
+    def _get_record(self, reason):
+        try:
+            return self._server._records[reason]
+        except KeyError:
+            raise LewisException("PV {} does not exist.".format(reason))
+
+    def getParam(self, reason):
+        """
+        Returns the value of a PV.
+
+        :param reason: Name of the PV without prefix.
+        :return: Value of the PV.
+        """
+        record = self._get_record(reason)
+
+        with self._server._lock:
+            return record.value
+
+    def setParam(self, reason, value):
+        """
+        Sets the value of a PV, it is posted to monitors by the next call of
+        :meth:`updatePVs` if it has changed.
+
+        :param reason: Name of the PV without prefix.
+        :param value: New value of the PV.
+        """
+        record = self._get_record(reason)
+
+        with self._server._lock:
+            if not isinstance(value, _SCALAR_TYPES) or record.value != value:
+                record.value = value
+                record.flag = True
+
+    def getParamInfo(self, reason, info_keys=None):
+        """
+        Returns the configuration of a PV, such as limits or units.
+
+        :param reason: Name of the PV without prefix.
+        :param info_keys: Keys to return, all keys if None.
+        :return: Dictionary with the requested keys.
+        """
+        record = self._get_record(reason)
+
+        with self._server._lock:
+            return {
+                key: value
+                for key, value in record.info.items()
+                if info_keys is None or key in info_keys
+            }
+
+    def setParamInfo(self, reason, info):
+        """
+        Updates the configuration of a PV, such as limits or units.
+
+        :param reason: Name of the PV without prefix.
+        :param info: Dictionary with the keys to update.
+        """
+        record = self._get_record(reason)
+
+        with self._server._lock:
+            record.info.update(info)
+
+    def updatePVs(self):
+        """
+        Posts the values that have been set since the last call to the monitors of the PVs.
+        All updates of one call share the same timestamp.
+        """
+        timestamp = self._server._clock.time_ns()
+        updates = []
+
+        with self._server._lock:
+            for record in self._server._records.values():
+                if record.flag:
+                    record.flag = False
+                    record.timestamp = timestamp
+                    updates.append((record.value, list(record.monitors)))
+
+        for value, monitors in updates:
+            for monitor in monitors:
+                monitor._post(value, timestamp)
+
+    def read(self, reason):
+        """
+        Returns the value of a PV for a get request.
+
+        :param reason: Name of the PV without prefix.
+        :return: Value of the PV.
+        """
+        return self.getParam(reason)
+
+    def write(self, reason, value):
+        """
+        Handles a put request. The default implementation sets the value.
+
+        :param reason: Name of the PV without prefix.
+        :param value: Value that has been converted to the type of the PV.
+        :return: True if the value has been accepted.
+        """
+        self.setParam(reason, value)
+        return True
+
+
+class Monitor:
+    """
+    A subscription to the updates of a PV, as returned by :meth:`InProcessClient.monitor`.
+    """
+
+    def __init__(self, client, server, record, name, callback):
+        self._client = client
+        self._server = server
+        self._record = record
+        self.name = name
+        self.callback = callback
+
+    def _post(self, value, timestamp):
+        self._client._events.put((self.callback, (self.name, value, timestamp)))
+
+    def clear(self):
+        """Stops the subscription, updates that have already been posted are delivered."""
+        with self._server._lock:
+            if self in self._record.monitors:
+                self._record.monitors.remove(self)
+
+
+@has_log
+class InProcessClient:
+    """
+    A ChannelAccess-like client for the PVs of all :class:`InProcessServer` objects in the
+    process. Put requests are processed by the server and block until they have been handled,
+    updates of monitored PVs are delivered to the callbacks in a thread of the client, so that
+    slow callbacks do not hold up the server.
+
+    Callbacks are called with the PV name, the value and the timestamp of the update in
+    nanoseconds of the default :class:`~lewis.core.clock.Clock`, so that the latency of the
+    update is the difference to the current time of the clock.
+    """
+
+    def __init__(self):
+        self._events = queue.Queue()
+        self._monitors = []
+
+        self._thread = threading.Thread(target=self._dispatch, name="lewis-ca-client")
+        self._thread.daemon = True
+        self._thread.start()
+
+    @property
+    def pv_names(self):
+        """Names of the PVs of all servers."""
+        with _servers_lock:
+            servers = list(_servers)
+
+        return sorted(name for server in servers for name in server.pv_names)
+
+    def _resolve(self, name):
+        with _servers_lock:
+            servers = list(_servers)
+
+        for server in servers:
+            record = server._get_record(name)
+
+            if record is not None:
+                return server, record
+
+        raise LewisException("PV {} could not be found.".format(name))
+
+    def get(self, name):
+        """
+        Returns the current value of a PV.
+
+        :param name: Name of the PV including prefix.
+        :return: Value of the PV.
+        """
+        server, record = self._resolve(name)
+
+        with server._lock:
+            return record.value
+
+    def put(self, name, value, wait=True, timeout=1.0):
+        """
+        Writes a value to a PV. The value is converted to the type of the PV and written when
+        the server processes requests.
+
+        :param name: Name of the PV including prefix.
+        :param value: Value to write.
+        :param wait: If True, block until the request has been processed.
+        :param timeout: Time in seconds to wait for the request to be processed.
+        :return: True if the value was accepted, if wait is False a
+                 ``concurrent.futures.Future`` of that result.
+        :raises TimeoutError: The request has not been processed in time.
+        """
+        server, _ = self._resolve(name)
+        future = server._put(name, value)
+
+        return future.result(timeout) if wait else future
+
+    def monitor(self, name, callback):
+        """
+        Subscribes to the updates of a PV. As in ChannelAccess, the callback is called with the
+        current value first.
+
+        :param name: Name of the PV including prefix.
+        :param callback: Callable that takes the name, value and timestamp of an update.
+        :return: :class:`Monitor` that can be cleared to stop the subscription.
+        """
+        server, record = self._resolve(name)
+        monitor = Monitor(self, server, record, name, callback)
+
+        with server._lock:
+            record.monitors.append(monitor)
+            monitor._post(record.value, server._clock.time_ns())
+
+        self._monitors.append(monitor)
+
+        return monitor
+
+    def flush(self, timeout=1.0):
+        """
+        Waits until all updates that have been posted so far have been delivered.
+
+        :param timeout: Time in seconds to wait.
+        """
+        future = Future()
+        self._events.put((future.set_result, (None,)))
+        future.result(timeout)
+
+    def close(self):
+        """Clears all monitors and stops the thread that delivers updates."""
+        for monitor in self._monitors:
+            monitor.clear()
+
+        self._monitors = []
+        self._events.put(None)
+        self._thread.join()
+
+    def _dispatch(self):
+        while True:
+            event = self._events.get()
+
+            if event is None:
+                return
+
+            callback, args = event
+
+            try:
+                callback(*args)
+            except Exception:
+                self.log.exception("An error occurred in a callback for %s.", args[0])
@@ -32,15 +32,24 @@ were used as guidelines and references for implementing the protocol:
     at lewis/examples/modbus_device.
 """
 
-import asyncore
+import asyncio
 import socket
 import struct
 from copy import deepcopy
 from math import ceil
+from time import sleep
 
 from lewis.core.adapters import Adapter
 from lewis.core.devices import InterfaceBase
+from lewis.core.exceptions import LewisException
 from lewis.core.logging import has_log
+from lewis.core.utils import FromOptionalDependency
+
+# asyncore is not available in newer Python versions, in that case
+# only the asyncio backend of the ModbusAdapter can be used.
+asyncore_loop, dispatcher, dispatcher_with_send = FromOptionalDependency(
+    "asyncore"
+).do_import("loop", "dispatcher", "dispatcher_with_send")
 
 
 class ModbusDataBank:
@@ -535,9 +544,9 @@ class ModbusProtocol:
 
 
 @has_log
-class ModbusHandler(asyncore.dispatcher_with_send):
+class ModbusHandler(dispatcher_with_send):
     def __init__(self, sock, interface, server):
-        asyncore.dispatcher_with_send.__init__(self, sock=sock)
+        dispatcher_with_send.__init__(self, sock=sock, map=server.socket_map)
         self._datastore = ModbusDataStore(
             interface.di, interface.co, interface.ir, interface.hr
         )
@@ -558,9 +567,11 @@ class ModbusHandler(asyncore.dispatcher_with_send):
 
 
 @has_log
-class ModbusServer(asyncore.dispatcher):
-    def __init__(self, host, port, interface, device_lock):
-        asyncore.dispatcher.__init__(self)
+class ModbusServer(dispatcher):
+    def __init__(self, host, port, interface, device_lock, event_loop=None):
+        self.socket_map = event_loop.socket_map if event_loop is not None else None
+
+        dispatcher.__init__(self, map=self.socket_map)
         self.device_lock = device_lock
         self.interface = interface
         self.create_socket(socket.AF_INET, socket.SOCK_STREAM)
@@ -592,15 +603,134 @@ class ModbusServer(asyncore.dispatcher):
         self.close()
 
 
+@has_log
+class ModbusConnection(asyncio.Protocol):
+    """
+    Connection handler of :class:`AsyncioModbusServer`. Received data is passed to a
+    :class:`ModbusProtocol` as soon as it arrives, which buffers incomplete frames and sends
+    a response for each complete request.
+
+    :param server: The :class:`AsyncioModbusServer` that accepted the connection.
+    """
+
+    def __init__(self, server):
+        self._server = server
+        self._transport = None
+        self._modbus = ModbusProtocol(self._send, server.datastore)
+
+        self._set_logging_context(server.interface)
+
+    def connection_made(self, transport):
+        self._transport = transport
+        self._server.add_handler(self)
+
+        self.log.info(
+            "Client connected from %s:%s", *transport.get_extra_info("peername")[:2]
+        )
+
+    def connection_lost(self, exc):
+        self.log.info("Closing connection to client")
+
+        self._server.remove_handler(self)
+        self._transport = None
+
+    def data_received(self, data):
+        self._modbus.process(data, self._server.device_lock)
+
+    def _send(self, data):
+        if self._transport is not None:
+            self._transport.write(data)
+
+    def close(self):
+        if self._transport is not None:
+            self._transport.close()
+
+
+@has_log
+class AsyncioModbusServer:
+    """
+    A Modbus TCP server that is based on ``asyncio``. It runs on the event loop of an
+    :class:`~lewis.core.event_loop.EventLoop` and must be constructed and closed on the loop
+    thread. All connections share one :class:`ModbusDataStore`.
+
+    :param host: Address to bind to.
+    :param port: Port to listen on.
+    :param interface: :class:`ModbusInterface` with the data banks.
+    :param device_lock: Lock for device access.
+    :param event_loop: :class:`~lewis.core.event_loop.EventLoop` to run on.
+    """
+
+    def __init__(self, host, port, interface, device_lock, event_loop):
+        self.device_lock = device_lock
+        self.interface = interface
+        self.datastore = ModbusDataStore(
+            interface.di, interface.co, interface.ir, interface.hr
+        )
+
+        self._listener = event_loop.listen(lambda: ModbusConnection(self), host, port)
+
+        self._set_logging_context(interface)
+        self.log.info("Listening on %s:%s", host, port)
+
+        self._accepted_connections = []
+
+    def add_handler(self, handler):
+        self._accepted_connections.append(handler)
+
+    def remove_handler(self, handler):
+        if handler in self._accepted_connections:
+            self._accepted_connections.remove(handler)
+
+    def close(self):
+        self.log.info("Shutting down server, closing all remaining client connections.")
+
+        self._listener.close()
+
+        for handler in list(self._accepted_connections):
+            handler.close()
+
+        self._accepted_connections = []
+
+
 class ModbusAdapter(Adapter):
-    default_options = {"bind_address": "0.0.0.0", "port": 502}
+    """
+    Adapter that exposes the data banks of a :class:`ModbusInterface` via Modbus TCP.
+
+    Available adapter options are:
+
+     - bind_address: IP of network adapter to bind on (defaults to 0.0.0.0, or all adapters)
+     - port: Port to listen on (defaults to 502)
+     - backend: Networking backend, either ``asyncio`` or ``asyncore`` (defaults to asyncio)
+
+    :param options: Dictionary with options.
+    """
+
+    default_options = {"bind_address": "0.0.0.0", "port": 502, "backend": "asyncio"}
+    uses_event_loop = True
 
     def __init__(self, options=None):
         super(ModbusAdapter, self).__init__(options)
         self._server = None
 
+        if self._options.backend not in ("asyncio", "asyncore"):
+            raise LewisException(
+                "Unknown modbus backend '{}', must be either 'asyncio' or "
+                "'asyncore'.".format(self._options.backend)
+            )
+
     def start_server(self):
-        self._server = ModbusServer(
+        if self._options.backend == "asyncore":
+            self._server = ModbusServer(
+                self._options.bind_address,
+                self._options.port,
+                self.interface,
+                self.device_lock,
+                self.event_loop,
+            )
+            return
+
+        self._server = self._create_on_event_loop(
+            AsyncioModbusServer,
             self._options.bind_address,
             self._options.port,
             self.interface,
@@ -609,7 +739,11 @@ class ModbusAdapter(Adapter):
 
     def stop_server(self):
         if self._server is not None:
-            self._server.close()
+            if self._options.backend == "asyncore":
+                self._server.close()
+            else:
+                self._close_on_event_loop(self._server)
+
             self._server = None
 
     @property
@@ -617,7 +751,12 @@ class ModbusAdapter(Adapter):
         return self._server is not None
 
     def handle(self, cycle_delay=0.1):
-        asyncore.loop(cycle_delay, count=1)
+        if self._options.backend == "asyncio":
+            # Requests are processed on the event loop as soon as they arrive
+            sleep(cycle_delay)
+            return
+
+        asyncore_loop(cycle_delay, count=1)
 
 
 class ModbusInterface(InterfaceBase):
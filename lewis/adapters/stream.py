@@ -17,131 +17,782 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 # *********************************************************************
 
-import asynchat
-import asyncore
+import asyncio
 import inspect
 import re
 import socket
+import struct
+from heapq import heappop, heappush
+from itertools import count
+from time import sleep
 
 from scanf import scanf_compile
 
 from lewis.core.adapters import Adapter
+from lewis.core.clock import get_clock
 from lewis.core.devices import InterfaceBase
+from lewis.core.exceptions import LewisException
 from lewis.core.logging import has_log
-from lewis.core.utils import format_doc_text
+from lewis.core.utils import FromOptionalDependency, format_doc_text
 
+# asyncore and asynchat are not available in newer Python versions, in that case
+# only the asyncio backend of the StreamAdapter can be used.
+async_chat = FromOptionalDependency("asynchat").do_import("async_chat")
+asyncore_loop, dispatcher = FromOptionalDependency("asyncore").do_import(
+    "loop", "dispatcher"
+)
 
-@has_log
-class StreamHandler(asynchat.async_chat):
-    def __init__(self, sock, target, stream_server):
-        asynchat.async_chat.__init__(self, sock=sock)
-        self.set_terminator(target.in_terminator.encode())
-        self._readtimeout = target.readtimeout
-        self._readtimer = 0
-        self._target = target
-        self._buffer = []
 
-        self._stream_server = stream_server
-        self._target.handler = self
+_NOT_CACHED = object()
 
-        self._set_logging_context(target)
-        self.log.info("Client connected from %s:%s", *sock.getpeername())
 
-    def process(self, msec):
-        if not self._buffer:
+def _to_bytes(value):
+    """Terminators and replies can be str, which is encoded, or bytes."""
+    return value.encode() if isinstance(value, str) else value
+
+
+class ResponseCache:
+    """
+    Stores the replies to requests that have been processed by commands with ``cached=True``,
+    so that repeated requests, for example from a client that polls a value many times per
+    simulation cycle, are not matched and processed again. Replies are only valid as long as
+    the :attr:`~lewis.core.adapters.DeviceLock.generation` of the device lock does not change,
+    which happens whenever the device is processed or written to. A cached reply is therefore
+    always the same as the reply that processing the request again would produce.
+
+    Replies must be added while holding the device lock. If the lock does not count
+    generations, nothing is cached.
+
+    :param device_lock: The lock that is used for device access.
+    """
+
+    def __init__(self, device_lock):
+        self._device_lock = device_lock
+        self._generation = None
+        self._replies = {}
+
+    def get(self, request, default=None):
+        """
+        Returns the cached reply to the request or default if there is none.
+
+        :param request: Request without terminator.
+        :param default: Value to return if no reply is cached.
+        :return: Cached reply or default.
+        """
+        if self._generation != self._device_lock.generation:
+            return default
+
+        return self._replies.get(request, default)
+
+    def clear(self):
+        """Removes all cached replies."""
+        self._replies.clear()
+
+    def add(self, request, reply):
+        """
+        Adds the reply to a request to the cache.
+
+        :param request: Request without terminator.
+        :param reply: Reply to the request.
+        """
+        generation = self._device_lock.generation
+
+        if generation is None:
             return
 
-        if self._readtimer >= self._readtimeout and self._readtimeout != 0:
-            if not self.get_terminator():
-                # If no terminator is set, this timeout is the terminator
-                self.found_terminator()
+        if generation != self._generation:
+            self._replies.clear()
+            self._generation = generation
+
+        self._replies[request] = reply
+
+
+class ReadTimeouts:
+    """
+    The read timeouts of all connections of a server, stored as absolute deadlines in a heap,
+    so that checking for expired timeouts only touches the connections whose deadline has
+    passed, no matter how many connections are idle.
+
+    Restarting the timeout of a connection that already has a deadline only stores the new
+    deadline. The entry in the heap is updated when it reaches the top, so a connection that
+    receives data in many small chunks does not cause any heap operations in between.
+
+    Connections whose deadline has passed are handled by calling their
+    ``_read_timeout_expired`` method from :meth:`expire`. If an event loop is supplied, a
+    single timer on the loop calls :meth:`expire` when the earliest deadline has passed,
+    otherwise it must be called regularly.
+
+    :param event_loop: :class:`~lewis.core.event_loop.EventLoop` to schedule the timer on.
+    """
+
+    def __init__(self, event_loop=None):
+        self._event_loop = event_loop
+        self._clock = get_clock()
+
+        self._heap = []
+        self._entries = {}
+        self._deadlines = {}
+        self._counter = count()
+
+        self._timer = None
+        self._timer_deadline = None
+
+    def restart(self, handler, timeout):
+        """
+        Sets the deadline of a connection to timeout seconds from now.
+
+        :param handler: Connection handler.
+        :param timeout: Timeout in seconds.
+        """
+        deadline = self._clock.time_ns() + round(timeout * 1e9)
+        self._deadlines[handler] = deadline
+
+        if handler not in self._entries:
+            self._push(handler, deadline)
+            self._schedule()
+
+    def cancel(self, handler):
+        """
+        Removes the deadline of a connection.
+
+        :param handler: Connection handler.
+        """
+        self._deadlines.pop(handler, None)
+        entry = self._entries.pop(handler, None)
+
+        # The entry remains in the heap until it reaches the top
+        if entry is not None:
+            entry[2] = None
+
+    def expire(self):
+        """
+        Handles all connections whose deadline has passed.
+        """
+        now = self._clock.time_ns()
+        heap = self._heap
+
+        while heap and heap[0][0] <= now:
+            _, _, handler = heappop(heap)
+
+            if handler is None:
+                continue
+
+            del self._entries[handler]
+            deadline = self._deadlines[handler]
+
+            if deadline > now:
+                self._push(handler, deadline)
             else:
-                self._readtimer = 0
-                request = self._get_request()
-                with self._stream_server.device_lock:
-                    error = RuntimeError(
-                        "ReadTimeout while waiting for command terminator."
-                    )
-                    reply = self._handle_error(request, error)
-                self._send_reply(reply)
+                del self._deadlines[handler]
+                handler._read_timeout_expired()
 
-        if self._buffer:
-            self._readtimer += msec
+        self._schedule()
 
-    def collect_incoming_data(self, data):
-        self._buffer.append(data)
-        self._readtimer = 0
+    def clear(self):
+        """Removes all deadlines and stops the timer."""
+        self._heap = []
+        self._entries.clear()
+        self._deadlines.clear()
+
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def _push(self, handler, deadline):
+        entry = [deadline, next(self._counter), handler]
+        self._entries[handler] = entry
+        heappush(self._heap, entry)
+
+    def _schedule(self):
+        if self._event_loop is None or not self._heap:
+            return
+
+        deadline = self._heap[0][0]
+
+        if self._timer is not None:
+            if self._timer_deadline <= deadline:
+                return
+
+            self._timer.cancel()
+
+        self._timer_deadline = deadline
+        self._timer = self._event_loop.call_later(
+            max(deadline - self._clock.time_ns(), 0) * 1e-9, self._timer_expired
+        )
+
+    def _timer_expired(self):
+        self._timer = None
+        self.expire()
+
+
+class Framing:
+    """
+    Base class for framing strategies, which determine where requests start and end in the
+    incoming byte stream and how replies are delimited. A framing is assigned to the
+    ``framing`` attribute of a :class:`StreamInterface`, if none is assigned, requests and
+    replies are delimited by the terminators of the interface (see :class:`TerminatorFraming`).
+
+    Framings do not store any state of a connection, so one instance can be shared by all
+    connections. Sub-classes have to implement :meth:`split` and :meth:`encode`.
+    """
+
+    #: True if a request is complete when the read timeout expires.
+    terminated_by_timeout = False
+
+    def split(self, buffer, searched):
+        """
+        Removes all complete frames from the start of the buffer and returns them.
+
+        :param buffer: bytearray with the data that has been received.
+        :param searched: Number of bytes at the start of the buffer that have been inspected
+                         by a previous call, this can be used to avoid searching the same
+                         data repeatedly.
+        :return: Tuple of the list of frames (bytes) and the new value for searched.
+        """
+        raise NotImplementedError("Framings must implement split.")
+
+    def decode(self, frame):
+        """
+        Returns the request contained in a frame. Invalid frames raise ``ValueError``, which is
+        passed to :meth:`StreamInterface.handle_error`. The default returns the frame.
+
+        :param frame: Frame as returned by :meth:`split`.
+        :return: Request that is matched against the commands.
+        """
+        return frame
+
+    def encode(self, reply):
+        """
+        Returns the reply with framing, ready to be sent to the client.
+
+        :param reply: Reply as bytes.
+        :return: Framed reply.
+        """
+        raise NotImplementedError("Framings must implement encode.")
+
+
+class TerminatorFraming(Framing):
+    """
+    Requests end with in_terminator and out_terminator is appended to replies. If in_terminator
+    is empty, requests end when the read timeout of the interface expires.
+
+    :param in_terminator: Terminator of requests, str or bytes.
+    :param out_terminator: Terminator of replies, str or bytes.
+    """
+
+    def __init__(self, in_terminator, out_terminator):
+        self._in_terminator = _to_bytes(in_terminator)
+        self._out_terminator = _to_bytes(out_terminator)
+
+        self.terminated_by_timeout = not self._in_terminator
+
+    def split(self, buffer, searched):
+        terminator = self._in_terminator
+
+        if not terminator:
+            return [], 0
+
+        frames = []
+
+        # A terminator may start in data that has already been searched
+        start = 0
+        search = max(searched - len(terminator) + 1, 0)
+
+        with memoryview(buffer) as view:
+            while True:
+                end = buffer.find(terminator, search)
+
+                if end < 0:
+                    break
+
+                frames.append(bytes(view[start:end]))
+                start = search = end + len(terminator)
+
+        if start:
+            del buffer[:start]
+
+        return frames, len(buffer)
+
+    def encode(self, reply):
+        return reply + self._out_terminator
+
+
+class FixedLengthFraming(Framing):
+    """
+    All requests have the same length, replies are sent without framing.
+
+    :param length: Length of requests in bytes.
+    """
+
+    def __init__(self, length):
+        if length < 1:
+            raise LewisException("The frame length must be positive.")
+
+        self._length = length
+
+    def split(self, buffer, searched):
+        length = self._length
+        end = len(buffer) - len(buffer) % length
+
+        if not end:
+            return [], 0
+
+        with memoryview(buffer) as view:
+            frames = [bytes(view[i : i + length]) for i in range(0, end, length)]
+
+        del buffer[:end]
+
+        return frames, 0
+
+    def encode(self, reply):
+        return reply
+
+
+class LengthPrefixedFraming(Framing):
+    """
+    Requests and replies start with their length, which is packed with ``struct`` according
+    to length_format. The prefix is removed from requests and added to replies.
+
+    .. sourcecode:: Python
+
+        class BinaryInterface(StreamInterface):
+            # Two byte big endian length that does not include itself
+            framing = LengthPrefixedFraming(">H")
+
+    :param length_format: Format of the length for ``struct``, for example ``"B"`` or ``">I"``.
+    :param includes_prefix: True if the length includes the prefix itself.
+    """
+
+    def __init__(self, length_format=">H", includes_prefix=False):
+        self._prefix = struct.Struct(length_format)
+        self._includes_prefix = includes_prefix
+
+    def split(self, buffer, searched):
+        prefix = self._prefix
+        size = prefix.size
+        offset = 0 if self._includes_prefix else size
+
+        frames = []
+        start = 0
+
+        with memoryview(buffer) as view:
+            while len(buffer) - start >= size:
+                (length,) = prefix.unpack_from(view, start)
+                end = start + max(length + offset, size)
+
+                if end > len(buffer):
+                    break
+
+                frames.append(bytes(view[start + size : end]))
+                start = end
+
+        if start:
+            del buffer[:start]
+
+        return frames, 0
+
+    def encode(self, reply):
+        length = len(reply) + (self._prefix.size if self._includes_prefix else 0)
+
+        try:
+            return self._prefix.pack(length) + reply
+        except struct.error:
+            raise ValueError(
+                "Reply of {} bytes is too long for the length prefix.".format(
+                    len(reply)
+                )
+            )
+
+
+def _sum_checksum(data):
+    return sum(data) & 0xFF
+
+
+class ChecksumFraming(Framing):
+    """
+    Adds a checksum to another framing. The checksum follows the payload and is packed with
+    ``struct`` according to checksum_format, it is computed by checksum from the payload. It
+    is verified and removed from requests and added to replies. Requests with an invalid
+    checksum are passed to :meth:`StreamInterface.handle_error`.
+
+    .. sourcecode:: Python
+
+        from functools import reduce
+        from operator import xor
+
+        class BinaryInterface(StreamInterface):
+            # Fixed frames of 4 bytes, the last of which is the XOR of the first three
+            framing = ChecksumFraming(
+                FixedLengthFraming(4), checksum=lambda data: reduce(xor, data, 0))
+
+    Because a checksum can have any value, it should not be combined with a
+    :class:`TerminatorFraming`, unless the terminator can not appear in the checksum.
+
+    :param framing: Framing of the payload together with the checksum.
+    :param checksum: Function that computes the checksum from bytes, defaults to the sum of
+                     all bytes modulo 256.
+    :param checksum_format: Format of the checksum for ``struct``.
+    """
+
+    def __init__(self, framing, checksum=_sum_checksum, checksum_format="B"):
+        self._framing = framing
+        self._checksum = checksum
+        self._checksum_struct = struct.Struct(checksum_format)
+
+        self.terminated_by_timeout = framing.terminated_by_timeout
+
+    def split(self, buffer, searched):
+        return self._framing.split(buffer, searched)
+
+    def decode(self, frame):
+        frame = self._framing.decode(frame)
+        size = self._checksum_struct.size
+
+        if len(frame) < size:
+            raise ValueError("Frame is too short to contain a checksum.")
+
+        payload = frame[: len(frame) - size]
+        (checksum,) = self._checksum_struct.unpack_from(frame, len(payload))
+
+        if checksum != self._checksum(payload):
+            raise ValueError("Invalid checksum {:#x} of request.".format(checksum))
+
+        return payload
+
+    def encode(self, reply):
+        return self._framing.encode(
+            reply + self._checksum_struct.pack(self._checksum(reply))
+        )
+
+
+class StreamHandlerBase:
+    """
+    Request processing that is shared by the connection handlers of the stream adapter
+    backends, :class:`StreamHandler` and :class:`StreamProtocol`. Sub-classes must call
+    :meth:`_init_handler` and implement :meth:`_send`, which sends raw bytes to the client.
+    Received data is passed to :meth:`_receive`.
+    """
+
+    def _init_handler(self, target, stream_server):
+        self._target = target
+        self._stream_server = stream_server
+        self._framing = target.framing or TerminatorFraming(
+            target.in_terminator, target.out_terminator
+        )
+        self._readtimeout = target.readtimeout
+        self._buffer = bytearray()
+        self._searched = 0
+
+    def _send(self, data):
+        raise NotImplementedError("Stream handlers must implement _send.")
+
+    def _receive(self, data):
+        """
+        Adds data to the buffer and processes all requests that are complete, the replies are
+        sent at once. The read timeout is restarted if an incomplete request remains.
+        """
+        self._buffer += data
+
+        frames, self._searched = self._framing.split(self._buffer, self._searched)
+
+        if frames:
+            self.log.debug("Got requests %s", frames)
+            self._send_replies(self._process_frames(frames))
+
+        read_timeouts = self._stream_server.read_timeouts
+
+        if self._buffer and self._readtimeout != 0:
+            read_timeouts.restart(self, self._readtimeout / 1000.0)
+        else:
+            read_timeouts.cancel(self)
+
+    def _take_buffer(self):
+        """Removes the incomplete request from the buffer and returns it."""
+        request = bytes(self._buffer)
+        self._buffer.clear()
+        self._searched = 0
 
-    def _get_request(self):
-        request = b"".join(self._buffer)
-        self._buffer = []
         self.log.debug("Got request %s", request)
         return request
 
+    def _encode_reply(self, reply):
+        return self._framing.encode(_to_bytes(reply))
+
     def _push(self, reply):
-        if isinstance(reply, str):
-            reply_message = (reply + self._target.out_terminator).encode()
-        else:
-            reply_message = reply + self._target.out_terminator
-        self.push(reply_message)
+        self._send(self._encode_reply(reply))
 
     def _send_reply(self, reply):
         if reply is not None:
             self.log.debug("Sending reply %s", reply)
             self._push(reply)
 
+    def _send_replies(self, replies):
+        """Sends the replies that are not None to the client at once."""
+        replies = [reply for reply in replies if reply is not None]
+
+        if replies:
+            self.log.debug("Sending replies %s", replies)
+            self._send(b"".join(self._encode_reply(reply) for reply in replies))
+
     def _handle_error(self, request, error):
         self.log.debug("Error while processing request", exc_info=error)
         return self._target.handle_error(request, error)
 
-    def found_terminator(self):
-        self._readtimer = 0
+    def _process_request(self, request):
+        """
+        Processes a complete request with the matching command of the target and returns the
+        reply. Errors are passed to the target's handle_error-method.
+
+        :param request: Request without terminator.
+        :return: Reply to send to the client or None.
+        """
+        response_cache = self._stream_server.response_cache
+        reply = response_cache.get(request, _NOT_CACHED)
 
-        request = self._get_request()
+        if reply is not _NOT_CACHED:
+            self.log.debug("Using cached reply for request %s", request)
+            return reply
 
-        with self._stream_server.device_lock:
+        cmd, arguments = self._target.command_index.find(request)
+
+        device_lock = self._stream_server.device_lock
+        reply = self._reply_from_snapshot(request, cmd, device_lock.snapshot)
+
+        if reply is not _NOT_CACHED:
+            return reply
+
+        with device_lock.read() if self._is_reading(cmd) else device_lock:
+            return self._call_command(request, cmd, arguments)
+
+    def _reply_from_snapshot(self, request, cmd, snapshot):
+        """
+        Returns the reply to a request for a read-only command from a snapshot of the device
+        lock. Errors are passed to the target's handle_error-method.
+
+        :param request: Request without terminator.
+        :param cmd: Command that matched the request or None.
+        :param snapshot: Snapshot as returned by the device lock, may be None.
+        :return: Reply to send to the client or ``_NOT_CACHED`` if the snapshot can not be used.
+        """
+        if snapshot is None or cmd is None or not cmd.read_only:
+            return _NOT_CACHED
+
+        value = snapshot.get(cmd.func, _NOT_CACHED)
+
+        if value is _NOT_CACHED:
+            return _NOT_CACHED
+
+        self.log.info(
+            "Processing request %s using snapshot for command %s",
+            request,
+            cmd.matcher.pattern,
+        )
+
+        try:
+            return cmd.map_return_value(value)
+        except Exception as error:
+            with self._stream_server.device_lock:
+                return self._handle_error(request, error)
+
+    def _process_frames(self, frames):
+        """
+        Decodes the requests from frames and processes them, see :meth:`_process_requests`.
+        Frames that can not be decoded are passed to the target's handle_error-method.
+
+        :param frames: List of frames as returned by the framing.
+        :return: List of replies, which contains None for requests without reply.
+        """
+        requests = []
+        replies = []
+
+        for frame in frames:
             try:
-                cmd = next(
-                    (
-                        cmd
-                        for cmd in self._target.bound_commands
-                        if cmd.can_process(request)
-                    ),
-                    None,
-                )
+                requests.append(self._framing.decode(frame))
+            except ValueError as error:
+                if requests:
+                    replies += self._process_requests(requests)
+                    requests = []
 
-                if cmd is None:
-                    raise RuntimeError("None of the device's commands matched.")
+                with self._stream_server.device_lock:
+                    replies.append(self._handle_error(frame, error))
 
-                self.log.info(
-                    "Processing request %s using command %s",
-                    request,
-                    cmd.matcher.pattern,
-                )
+        if requests:
+            replies += self._process_requests(requests)
+
+        return replies
+
+    def _process_requests(self, requests):
+        """
+        Processes several complete requests in the order in which they were received, while
+        acquiring the device lock only once. The lock is acquired for reading if none of the
+        requests can modify the device. Requests for read-only commands that precede all
+        requests which can modify the device are answered from the snapshot of the device lock
+        if possible, the lock is not acquired at all if that is the case for all requests.
+
+        :param requests: List of requests without terminators.
+        :return: List of replies, which contains None for requests without reply.
+        """
+        if len(requests) == 1:
+            return [self._process_request(requests[0])]
+
+        response_cache = self._stream_server.response_cache
+        command_index = self._target.command_index
+
+        # Requests with cached replies are only matched if the cache is invalidated meanwhile
+        matches = [
+            (
+                None
+                if response_cache.get(request, _NOT_CACHED) is not _NOT_CACHED
+                else command_index.find(request)
+            )
+            for request in requests
+        ]
+
+        device_lock = self._stream_server.device_lock
+        snapshot = device_lock.snapshot
+        replies = []
+
+        for request, match in zip(requests, matches):
+            if match is not None and not self._is_reading(match[0]):
+                snapshot = None
+
+            replies.append(
+                _NOT_CACHED
+                if match is None
+                else self._reply_from_snapshot(request, match[0], snapshot)
+            )
+
+        pending = [index for index, reply in enumerate(replies) if reply is _NOT_CACHED]
+
+        if not pending:
+            return replies
+
+        reading = all(
+            matches[index] is None or self._is_reading(matches[index][0])
+            for index in pending
+        )
+
+        with device_lock.read() if reading else device_lock:
+            for index in pending:
+                request, match = requests[index], matches[index]
+                reply = response_cache.get(request, _NOT_CACHED)
+
+                if reply is _NOT_CACHED:
+                    cmd, arguments = match or command_index.find(request)
+                    reply = self._call_command(request, cmd, arguments)
 
-                reply = cmd.process_request(request)
+                    # The lock is held, so the generation does not change on writes
+                    if not self._is_reading(cmd):
+                        response_cache.clear()
 
-            except Exception as error:
-                reply = self._handle_error(request, error)
+                replies[index] = reply
 
-        self._send_reply(reply)
+        return replies
+
+    @staticmethod
+    def _is_reading(cmd):
+        return cmd is not None and (cmd.read_only or cmd.cached)
+
+    def _call_command(self, request, cmd, arguments):
+        """Must be called while holding the device lock."""
+        try:
+            if cmd is None:
+                raise RuntimeError("None of the device's commands matched.")
+
+            self.log.info(
+                "Processing request %s using command %s",
+                request,
+                cmd.matcher.pattern,
+            )
+
+            reply = cmd.process_arguments(arguments)
+
+            if cmd.cached:
+                self._stream_server.response_cache.add(request, reply)
+
+            return reply
+
+        except Exception as error:
+            return self._handle_error(request, error)
+
+    def _process_read_timeout(self, request):
+        """
+        Processes a request that has not been terminated within the read timeout. If the target
+        has no terminator, the timeout is the terminator, otherwise it is an error.
+
+        :param request: Incomplete request.
+        :return: Reply to send to the client or None.
+        """
+        if self._framing.terminated_by_timeout:
+            return self._process_frames([request])[0]
+
+        with self._stream_server.device_lock:
+            error = RuntimeError("ReadTimeout while waiting for command terminator.")
+            return self._handle_error(request, error)
+
+
+@has_log
+class StreamHandler(StreamHandlerBase, async_chat):
+    def __init__(self, sock, target, stream_server):
+        async_chat.__init__(self, sock=sock, map=stream_server.socket_map)
+        self._init_handler(target, stream_server)
+        self._target.handler = self
+
+        # Requests are split by the framing, so all data is passed to collect_incoming_data
+        self.set_terminator(None)
+
+        self._set_logging_context(target)
+        self.log.info("Client connected from %s:%s", *sock.getpeername())
+
+    def _read_timeout_expired(self):
+        # The connection might have been closed in the meantime
+        if self._buffer and self._fileno is not None:
+            self._send_reply(self._process_read_timeout(self._take_buffer()))
+
+            if self._stream_server.event_loop is not None:
+                self._stream_server.event_loop.refresh(self)
+
+    def collect_incoming_data(self, data):
+        self._receive(data)
+
+    def _send(self, data):
+        self.push(data)
 
     def unsolicited_reply(self, reply):
         self.log.debug("Sending unsolicited reply %s", reply)
-        self._push(reply)
+
+        event_loop = self._stream_server.event_loop
+
+        # Unsolicited replies are usually sent from the simulation thread
+        if event_loop is not None and not event_loop.in_loop_thread:
+            event_loop.call_soon(self._push, reply)
+        else:
+            self._push(reply)
 
     def handle_close(self):
         self.log.info("Closing connection to client %s:%s", *self.socket.getpeername())
+
+        self._stream_server.read_timeouts.cancel(self)
         self._stream_server.remove_handler(self)
-        asynchat.async_chat.handle_close(self)
+        async_chat.handle_close(self)
 
 
 @has_log
-class StreamServer(asyncore.dispatcher):
-    def __init__(self, host, port, target, device_lock):
-        asyncore.dispatcher.__init__(self)
+class StreamServer(dispatcher):
+    def __init__(self, host, port, target, device_lock, event_loop=None):
+        self.event_loop = event_loop
+        self.socket_map = event_loop.socket_map if event_loop is not None else None
+
+        dispatcher.__init__(self, map=self.socket_map)
         self.target = target
         self.device_lock = device_lock
+        self.response_cache = ResponseCache(device_lock)
+        self.read_timeouts = ReadTimeouts(event_loop)
+
+        for cmd in target.bound_commands:
+            if cmd.read_only:
+                device_lock.register_getter(cmd.func)
+
         self.create_socket(socket.AF_INET, socket.SOCK_STREAM)
         self.set_reuse_addr()
         self.bind((host, port))
@@ -168,7 +819,8 @@ class StreamServer(asyncore.dispatcher):
         # be called directly. This is important to still perform all
         # the teardown-work that asyncore.dispatcher does.
         self.log.info("Shutting down server, closing all remaining client connections.")
-        asyncore.dispatcher.close(self)
+        dispatcher.close(self)
+        self.read_timeouts.clear()
 
         # But in addition, close all open sockets and clear the connection list.
         for handler in self._accepted_connections:
@@ -177,8 +829,119 @@ class StreamServer(asyncore.dispatcher):
         self._accepted_connections = []
 
     def process(self, msec):
-        for handler in self._accepted_connections:
-            handler.process(msec)
+        self.read_timeouts.expire()
+
+
+@has_log
+class StreamProtocol(StreamHandlerBase, asyncio.Protocol):
+    """
+    Connection handler of :class:`AsyncioStreamServer`. Incoming data is collected in a buffer
+    and split into requests by the :class:`Framing` of the target as soon as it arrives. Only
+    data that has not been searched yet is searched for the terminator, so a large request
+    that arrives in many chunks is not scanned repeatedly, and each request is copied out of
+    the buffer once. The read timeout is restarted in the :class:`ReadTimeouts` of the server
+    whenever data is received while an incomplete request is in the buffer.
+
+    :param target: :class:`StreamInterface` that processes the requests.
+    :param stream_server: The :class:`AsyncioStreamServer` that accepted the connection.
+    """
+
+    def __init__(self, target, stream_server):
+        self._init_handler(target, stream_server)
+        self._transport = None
+
+        self._set_logging_context(target)
+
+    def connection_made(self, transport):
+        self._transport = transport
+        self._target.handler = self
+        self._stream_server.add_handler(self)
+
+        self.log.info(
+            "Client connected from %s:%s", *transport.get_extra_info("peername")[:2]
+        )
+
+    def connection_lost(self, exc):
+        self.log.info("Closing connection to client")
+
+        self._stream_server.read_timeouts.cancel(self)
+        self._stream_server.remove_handler(self)
+        self._transport = None
+
+    def data_received(self, data):
+        self._receive(data)
+
+    def _read_timeout_expired(self):
+        if self._buffer and self._transport is not None:
+            self._send_reply(self._process_read_timeout(self._take_buffer()))
+
+    def _send(self, data):
+        if self._transport is not None:
+            self._transport.write(data)
+
+    def unsolicited_reply(self, reply):
+        self.log.debug("Sending unsolicited reply %s", reply)
+
+        # Unsolicited replies are usually sent from the simulation thread
+        self._stream_server.loop.call_soon_threadsafe(self._push, reply)
+
+    def close(self):
+        if self._transport is not None:
+            self._transport.close()
+
+
+@has_log
+class AsyncioStreamServer:
+    """
+    A TCP server for :class:`StreamInterface` that is based on ``asyncio``. It runs on the
+    event loop of an :class:`~lewis.core.event_loop.EventLoop` and must be constructed and
+    closed on the loop thread.
+
+    :param host: Address to bind to.
+    :param port: Port to listen on.
+    :param target: :class:`StreamInterface` that processes the requests.
+    :param device_lock: Lock for device access.
+    :param event_loop: :class:`~lewis.core.event_loop.EventLoop` to run on.
+    """
+
+    def __init__(self, host, port, target, device_lock, event_loop):
+        self.event_loop = event_loop
+        self.loop = event_loop.loop
+        self.target = target
+        self.device_lock = device_lock
+        self.response_cache = ResponseCache(device_lock)
+        self.read_timeouts = ReadTimeouts(event_loop)
+
+        for cmd in target.bound_commands:
+            if cmd.read_only:
+                device_lock.register_getter(cmd.func)
+
+        self._listener = event_loop.listen(
+            lambda: StreamProtocol(target, self), host, port
+        )
+
+        self._set_logging_context(target)
+        self.log.info("Listening on %s:%s", host, port)
+
+        self._accepted_connections = []
+
+    def add_handler(self, handler):
+        self._accepted_connections.append(handler)
+
+    def remove_handler(self, handler):
+        if handler in self._accepted_connections:
+            self._accepted_connections.remove(handler)
+
+    def close(self):
+        self.log.info("Shutting down server, closing all remaining client connections.")
+
+        self._listener.close()
+
+        for handler in list(self._accepted_connections):
+            handler.close()
+
+        self._accepted_connections = []
+        self.read_timeouts.clear()
 
 
 class PatternMatcher:
@@ -335,12 +1098,25 @@ class Func:
     :param argument_mappings: Iterable with mapping functions from string to some type.
     :param return_mapping: Mapping function for return value of method.
     :param doc: Description of the command. If not supplied, the docstring is used.
+    :param read_only: True if the function does not modify device or interface and takes no
+                      arguments, so that it can be processed while only holding the device lock
+                      for reading or from a snapshot of the device.
+    :param cached: True if the function does not modify device or interface and its return
+                   value only depends on the arguments and the state of the device, so that
+                   replies can be re-used until the device changes.
 
     .. _re: https://docs.python.org/2/library/re.html#regular-expression-syntax
     """
 
     def __init__(
-        self, func, pattern, argument_mappings=None, return_mapping=None, doc=None
+        self,
+        func,
+        pattern,
+        argument_mappings=None,
+        return_mapping=None,
+        doc=None,
+        read_only=False,
+        cached=False,
     ):
         if not callable(func):
             raise RuntimeError(
@@ -380,9 +1156,19 @@ class Func:
                 )
             )
 
+        if read_only and self.matcher.arg_count != 0:
+            raise RuntimeError(
+                "Function matched by pattern '{}' can not be read-only, because the pattern "
+                "defines {} argument(s).".format(
+                    self.matcher.pattern, self.matcher.arg_count
+                )
+            )
+
         self.argument_mappings = argument_mappings
         self.return_mapping = return_mapping
         self.doc = doc or (inspect.getdoc(self.func) if callable(self.func) else None)
+        self.read_only = read_only
+        self.cached = cached
 
     def can_process(self, request):
         return self.matcher.match(request) is not None
@@ -393,7 +1179,17 @@ class Func:
         if match is None:
             raise RuntimeError("Request can not be processed.")
 
-        args = self.map_arguments(match)
+        return self.process_arguments(match)
+
+    def process_arguments(self, arguments):
+        """
+        Calls the function with the arguments that have been matched in a request, for example
+        by :class:`CommandIndex`, and returns the mapped return value.
+
+        :param arguments: List of matched argument values.
+        :return: Mapped return value of the function.
+        """
+        args = self.map_arguments(arguments)
 
         return self.map_return_value(self.func(*args))
 
@@ -428,6 +1224,138 @@ class Func:
         return return_value
 
 
+class CommandIndex:
+    """
+    Finds the command that processes a request with as few pattern evaluations as possible.
+    The result is the same as trying each command in order and taking the first one that
+    matches, but the cost of a request does not grow with the number of commands:
+
+     - Requests that are exactly equal to a pattern without special characters, such as
+       ``^T$``, are looked up in a dictionary.
+     - Consecutive regular expressions are combined into a single alternation, so that a
+       request is matched only once. The ``re`` module tries the alternatives in order.
+     - Patterns that can not be combined, because they contain inline flags, named groups or
+       backreferences, or because they are not regular expressions, are tried on their own.
+
+    :class:`StreamInterface` creates the index when a device is bound.
+
+    :param commands: Bound commands (:class:`Func`) in the order in which they are tried.
+    """
+
+    _special_characters = frozenset(b".^$*+?{}[]|()\\")
+    _not_combinable = re.compile(rb"\\[1-9]|\(\?P|\(\?\(")
+
+    def __init__(self, commands):
+        self._segments = []
+
+        combinable = []
+
+        for cmd in commands:
+            if self._is_combinable(cmd.matcher):
+                combinable.append(cmd)
+            else:
+                self._add_segment(combinable)
+                self._add_segment([cmd])
+                combinable = []
+
+        self._add_segment(combinable)
+
+        # Literal requests are resolved in advance, so that the order of commands is respected
+        self._literals = {}
+
+        for cmd in commands:
+            literal = self._get_literal(cmd.matcher)
+
+            if literal is not None and literal not in self._literals:
+                self._literals[literal] = self._find(literal)
+
+    def _is_combinable(self, matcher):
+        return (
+            isinstance(matcher, regex)
+            and matcher.compiled_pattern.flags == 0
+            and self._not_combinable.search(matcher.compiled_pattern.pattern) is None
+        )
+
+    def _add_segment(self, commands):
+        if len(commands) == 1:
+            self._segments.append((None, commands[0]))
+        elif commands:
+            # Each alternative is enclosed in a group that identifies the command
+            groups = {}
+            group = 1
+
+            for cmd in commands:
+                groups[group] = cmd
+                group += cmd.matcher.arg_count + 1
+
+            combined = re.compile(
+                b"|".join(
+                    b"(" + cmd.matcher.compiled_pattern.pattern + b")"
+                    for cmd in commands
+                )
+            )
+
+            self._segments.append((combined, groups))
+
+    def _get_literal(self, matcher):
+        if not isinstance(matcher, regex) or matcher.compiled_pattern.flags != 0:
+            return None
+
+        pattern = matcher.compiled_pattern.pattern
+
+        if len(pattern) < 2 or pattern[:1] != b"^" or pattern[-1:] != b"$":
+            return None
+
+        literal = bytearray()
+        characters = iter(pattern[1:-1])
+
+        for character in characters:
+            if character == ord("\\"):
+                character = next(characters, None)
+
+                if character is None or chr(character).isalnum():
+                    return None
+            elif character in self._special_characters:
+                return None
+
+            literal.append(character)
+
+        return bytes(literal)
+
+    def find(self, request):
+        """
+        Returns the first command that matches the request, along with the matched arguments.
+
+        :param request: Request without terminator.
+        :return: Tuple of :class:`Func` and argument list or (None, None) if nothing matches.
+        """
+        result = self._literals.get(request)
+
+        if result is not None:
+            return result
+
+        return self._find(request)
+
+    def _find(self, request):
+        for combined, commands in self._segments:
+            if combined is None:
+                arguments = commands.matcher.match(request)
+
+                if arguments is not None:
+                    return commands, arguments
+            else:
+                match = combined.match(request)
+
+                if match is not None:
+                    # The group that encloses the matching alternative is closed last
+                    cmd = commands[match.lastindex]
+                    start = match.lastindex
+
+                    return cmd, match.groups()[start : start + cmd.matcher.arg_count]
+
+        return None, None
+
+
 class CommandBase:
     """
     This is the common base class of :class:`Cmd` and :class:`Var`. The concept of commands for
@@ -465,10 +1393,17 @@ class CommandBase:
     :param argument_mappings: Iterable with mapping functions from string to some type.
     :param return_mapping: Mapping function for return value of method.
     :param doc: Description of the command. If not supplied, the docstring is used.
+    :param cached: Re-use replies until the device changes, see :class:`ResponseCache`.
     """
 
     def __init__(
-        self, func, pattern, argument_mappings=None, return_mapping=None, doc=None
+        self,
+        func,
+        pattern,
+        argument_mappings=None,
+        return_mapping=None,
+        doc=None,
+        cached=False,
     ):
         super(CommandBase, self).__init__()
 
@@ -477,6 +1412,7 @@ class CommandBase:
         self.argument_mappings = argument_mappings
         self.return_mapping = return_mapping
         self.doc = doc
+        self.cached = cached
 
     def bind(self, target):
         raise NotImplementedError("Binders need to implement the bind method.")
@@ -506,6 +1442,12 @@ class Cmd(CommandBase):
     function that always returns 4, ``RR``, which calls ``SomeInterface.random`` and returns 5 and
     lastly ``RRR`` which calls the free function defined above and returns the best random number.
 
+    Commands that only return information about the device without modifying it can be marked
+    with ``cached=True``. Their replies are then re-used for identical requests until the
+    device is processed again or modified by a write, which makes frequent polling cheaper.
+    This must only be used if the return value depends on nothing but the arguments and the
+    state of the device.
+
     For a detailed explanation of requirements to the constructor arguments, please refer to the
     documentation of :class:`Func`, to which the arguments are forwarded.
 
@@ -519,6 +1461,8 @@ class Cmd(CommandBase):
     :param argument_mappings: Iterable with mapping functions from string to some type.
     :param return_mapping: Mapping function for return value of method.
     :param doc: Description of the command. If not supplied, the docstring is used.
+    :param cached: Re-use replies until the device changes, the function must not modify
+                   device or interface.
     """
 
     def __init__(
@@ -528,8 +1472,11 @@ class Cmd(CommandBase):
         argument_mappings=None,
         return_mapping=lambda x: None if x is None else str(x),
         doc=None,
+        cached=False,
     ):
-        super(Cmd, self).__init__(func, pattern, argument_mappings, return_mapping, doc)
+        super(Cmd, self).__init__(
+            func, pattern, argument_mappings, return_mapping, doc, cached
+        )
 
     def bind(self, target):
         method = self.func if callable(self.func) else getattr(target, self.func, None)
@@ -544,6 +1491,7 @@ class Cmd(CommandBase):
                 self.argument_mappings,
                 self.return_mapping,
                 self.doc,
+                cached=self.cached,
             )
         ]
 
@@ -580,6 +1528,11 @@ class Var(CommandBase):
     In the above example, the foo attribute can be read and written, it's automatically converted
     to an integer, while bar is a property that can only be read via the stream protocol.
 
+    With ``cached=True``, replies to the read pattern are re-used until the device is processed
+    again or modified by a write, see :class:`ResponseCache`. Properties that are computed
+    from the state of the device can be cached as well, as long as they do not depend on
+    anything else, such as the current time.
+
     .. seealso::
 
         For exposing methods and free functions, there's the :class:`Cmd`-class.
@@ -593,6 +1546,7 @@ class Var(CommandBase):
                            applied to getter and setter.
     :param doc: Description of the command. If not supplied, the docstring is used. For plain data
                 attributes the only way to get docs is to supply this argument.
+    :param cached: Re-use replies to the read pattern until the device changes.
     """
 
     def __init__(
@@ -603,9 +1557,10 @@ class Var(CommandBase):
         argument_mappings=None,
         return_mapping=lambda x: None if x is None else str(x),
         doc=None,
+        cached=False,
     ):
         super(Var, self).__init__(
-            target_member, None, argument_mappings, return_mapping, doc
+            target_member, None, argument_mappings, return_mapping, doc, cached
         )
 
         self.target = None
@@ -635,6 +1590,8 @@ class Var(CommandBase):
                     self.read_pattern,
                     return_mapping=self.return_mapping,
                     doc=self.doc,
+                    read_only=True,
+                    cached=self.cached,
                 )
             )
 
@@ -671,16 +1628,34 @@ class StreamAdapter(Adapter):
      - bind_address: IP of network adapter to bind on (defaults to 0.0.0.0, or all adapters)
      - port: Port to listen on (defaults to 9999)
      - telnet_mode: When True, overrides in- and out-terminator for CRNL (defaults to False)
+     - backend: Networking backend, either ``asyncio`` or ``asyncore`` (defaults to asyncio)
+
+    The ``asyncio`` backend processes each request as soon as its terminator has been received
+    and handles read timeouts with timers on the event loop. The ``asyncore`` backend is the
+    previous implementation, which is only available in Python versions that still provide
+    the ``asyncore`` and ``asynchat`` modules.
 
     :param options: Dictionary with options.
     """
 
-    default_options = {"telnet_mode": False, "bind_address": "0.0.0.0", "port": 9999}
+    default_options = {
+        "telnet_mode": False,
+        "bind_address": "0.0.0.0",
+        "port": 9999,
+        "backend": "asyncio",
+    }
+    uses_event_loop = True
 
     def __init__(self, options=None):
         super(StreamAdapter, self).__init__(options)
         self._server = None
 
+        if self._options.backend not in ("asyncio", "asyncore"):
+            raise LewisException(
+                "Unknown stream backend '{}', must be either 'asyncio' or "
+                "'asyncore'.".format(self._options.backend)
+            )
+
     @property
     def documentation(self):
         commands = [
@@ -693,12 +1668,16 @@ class StreamAdapter(Adapter):
             )
         ]
 
+        if self.interface.framing is not None:
+            framing = "Framing: {}".format(type(self.interface.framing).__name__)
+        else:
+            framing = "Request terminator: {}\nReply terminator: {}".format(
+                repr(self.interface.in_terminator), repr(self.interface.out_terminator)
+            )
+
         options = format_doc_text(
-            "Listening on: {}\nPort: {}\nRequest terminator: {}\nReply terminator: {}".format(
-                self._options.bind_address,
-                self._options.port,
-                repr(self.interface.in_terminator),
-                repr(self.interface.out_terminator),
+            "Listening on: {}\nPort: {}\n{}".format(
+                self._options.bind_address, self._options.port, framing
             )
         )
 
@@ -718,7 +1697,8 @@ class StreamAdapter(Adapter):
         Host and port are configured via the command line arguments.
 
         .. note:: The server does not process requests unless
-                  :meth:`handle` is called in regular intervals.
+                  :meth:`handle` is called in regular intervals or ``event_loop``
+                  has been assigned before the server is started.
 
         """
         if self._server is None:
@@ -726,7 +1706,18 @@ class StreamAdapter(Adapter):
                 self.interface.in_terminator = "\r\n"
                 self.interface.out_terminator = "\r\n"
 
-            self._server = StreamServer(
+            if self._options.backend == "asyncore":
+                self._server = StreamServer(
+                    self._options.bind_address,
+                    self._options.port,
+                    self.interface,
+                    self.device_lock,
+                    self.event_loop,
+                )
+                return
+
+            self._server = self._create_on_event_loop(
+                AsyncioStreamServer,
                 self._options.bind_address,
                 self._options.port,
                 self.interface,
@@ -735,7 +1726,11 @@ class StreamAdapter(Adapter):
 
     def stop_server(self):
         if self._server is not None:
-            self._server.close()
+            if self._options.backend == "asyncore":
+                self._server.close()
+            else:
+                self._close_on_event_loop(self._server)
+
             self._server = None
 
     @property
@@ -748,7 +1743,12 @@ class StreamAdapter(Adapter):
 
         :param cycle_delay: S
         """
-        asyncore.loop(cycle_delay, count=1)
+        if self._options.backend == "asyncio":
+            # Requests are processed on the event loop as soon as they arrive
+            sleep(cycle_delay)
+            return
+
+        asyncore_loop(cycle_delay, count=1)
         self._server.process(int(cycle_delay * 1000))
 
 
@@ -767,6 +1767,11 @@ class StreamInterface(InterfaceBase):
      - in_terminator, out_terminator: These define how lines are terminated when transferred
        to and from the device respectively. They are stripped/added automatically.
        Inverse of protocol file InTerminator and OutTerminator. The default is ``\\r``.
+       Terminators can consist of several characters and can be bytes for binary protocols.
+     - framing: A :class:`Framing` for protocols that do not use terminators, for example
+       :class:`FixedLengthFraming`, :class:`LengthPrefixedFraming` or
+       :class:`ChecksumFraming`. If set, in_terminator and out_terminator are not used.
+       Defaults to None.
      - readtimeout: How many msec to wait for additional data between packets, once transmission
        of an incoming command has begun. Inverse of ReadTimeout in protocol files.
        Defaults to 100 (ms). Set to 0 to disable timeout completely.
@@ -801,11 +1806,14 @@ class StreamInterface(InterfaceBase):
     In addition, the :meth:`handle_error`-method can be overridden. It is called when an exception
     is raised while handling commands.
     """
+
     protocol = "stream"
 
     in_terminator = "\r"
     out_terminator = "\r"
 
+    framing = None
+
     readtimeout = 100
 
     commands = None
@@ -813,6 +1821,7 @@ class StreamInterface(InterfaceBase):
     def __init__(self):
         super(StreamInterface, self).__init__()
         self.bound_commands = None
+        self.command_index = None
 
     @property
     def adapter(self):
@@ -848,6 +1857,8 @@ class StreamInterface(InterfaceBase):
 
                 self.bound_commands.append(bound_cmd)
 
+        self.command_index = CommandIndex(self.bound_commands)
+
     def handle_error(self, request, error):
         """
         Override this method to handle exceptions that are raised during command processing.
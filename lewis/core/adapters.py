@@ -22,13 +22,21 @@ This module contains :class:`Adapter`, which serves as a base class for concrete
 implementations in :mod:`lewis.adapters`. It also contains :class:`AdapterCollection` which can
 be used to store multiple adapters and manage them together.
 """
+
+import copy
 import inspect
 import threading
+import weakref
 from collections import namedtuple
+from contextlib import contextmanager
+from types import MappingProxyType
 
+from lewis.core.clock import get_clock
+from lewis.core.event_loop import get_event_loop
 from lewis.core.exceptions import LewisException
 from lewis.core.logging import has_log
-from lewis.core.utils import dict_strict_update
+from lewis.core.statistics import Histogram
+from lewis.core.utils import IMMUTABLE_TYPES, dict_strict_update
 
 
 class NoLock:
@@ -47,6 +55,369 @@ class NoLock:
     def __exit__(self, exc_type, exc_val, exc_tb):
         pass
 
+    snapshot = None
+    generation = None
+
+    def read(self):
+        return self
+
+    def register_getter(self, getter):
+        pass
+
+
+@has_log
+class DeviceLock:
+    """
+    The lock that is used to synchronize access to a device. It behaves like a ``threading.Lock``
+    in a with-statement, but additionally sets the :attr:`wake_event` each time it is released.
+    This tells a :class:`~lewis.core.simulation.Simulation` that waits while its device is
+    quiescent that the device may have been modified from outside.
+
+    The simulation itself acquires the lock with :meth:`silent` when processing the device,
+    which does not set the event. Code that only reads from the device, such as getters of
+    PVs, stream ``Var`` read patterns or ``:get`` requests of the control server, uses
+    :meth:`read`:
+
+    .. sourcecode:: Python
+
+        with device_lock.read():
+            value = device.speed
+
+    By default, reads are exclusive like all other acquisitions. If ``shared_reads`` is True,
+    any number of reads can hold the lock at the same time, while writes and the processing of
+    the device remain exclusive. A thread that wants to acquire the lock exclusively waits for
+    active reads to finish, new reads are not admitted during that time.
+
+    To avoid taking the lock for reads altogether, readers can register getters with
+    :meth:`register_getter`. If ``snapshots`` is True, the simulation calls
+    :meth:`publish_snapshot` after each time it has processed the device, which evaluates all
+    getters while it is still holding the lock. The values are stored in a new read-only
+    dictionary that replaces the previous one, so readers that obtained a :attr:`snapshot`
+    keep a consistent set of values without holding the lock:
+
+    .. sourcecode:: Python
+
+        getter = lambda: device.speed
+        device_lock.register_getter(getter)
+
+        snapshot = device_lock.snapshot
+
+        if snapshot is not None and getter in snapshot:
+            value = snapshot[getter]
+        else:
+            with device_lock.read():
+                value = getter()
+
+    Releasing the lock after a write discards the snapshot until the next one is published, so
+    that reads never return values that are older than the last write.
+
+    Each exclusive acquisition, including the ones of the simulation, increments
+    :attr:`generation`. Readers can store values that they have obtained together with the
+    generation and re-use them as long as it has not changed, because the device can not
+    have been modified in the meantime.
+
+    The lock counts how often it has been acquired for writing and for reading and how often
+    these acquisitions were contended, that is, another thread was holding the lock. The time
+    spent waiting for contended acquisitions is recorded in a
+    :class:`~lewis.core.statistics.Histogram`, see :attr:`stats`.
+
+    :param wake_event: ``threading.Event`` to set on release, a new one is created if None.
+    :param shared_reads: Allow concurrent reads.
+    :param snapshots: Publish snapshots of the registered getters.
+    """
+
+    def __init__(self, wake_event=None, shared_reads=False, snapshots=False):
+        self._lock = threading.Lock()
+        self.wake_event = wake_event if wake_event is not None else threading.Event()
+
+        self._shared_reads = shared_reads
+        self._readers = 0
+        self._readers_done = threading.Condition(threading.Lock())
+
+        self._snapshots = snapshots
+        self._snapshot = None
+        self._getters = weakref.WeakSet()
+        self._getters_lock = threading.Lock()
+
+        self._generation = 0
+        self._before_write = {}
+
+        self._clock = get_clock()
+        self._acquisitions = 0
+        self._contentions = 0
+        self._wait_time = Histogram()
+        self._reads = 0
+        self._read_contentions = 0
+        self._read_wait_time = Histogram()
+
+    def acquire(self, blocking=True, timeout=-1):
+        start = None
+
+        if not self._lock.acquire(False):
+            if not blocking:
+                return False
+
+            start = self._clock.time_ns()
+
+            if not self._lock.acquire(True, timeout):
+                return False
+
+        if self._readers:
+            if start is None:
+                start = self._clock.time_ns()
+
+            if not blocking or not self._wait_for_readers(start, timeout):
+                self._lock.release()
+                return False
+
+        # The statistics are only modified while holding the lock
+        if start is not None:
+            self._contentions += 1
+            self._wait_time.add(self._clock.seconds_since(start))
+
+        self._acquisitions += 1
+        self._generation += 1
+
+        return True
+
+    def _wait_for_readers(self, start, timeout):
+        """
+        Waits until all active reads have ended, which is only necessary in shared mode. Must be
+        called while holding the lock, so that no new reads are admitted.
+        """
+        with self._readers_done:
+            while self._readers:
+                remaining = None
+
+                if timeout >= 0:
+                    remaining = timeout - self._clock.seconds_since(start)
+
+                    if remaining <= 0.0:
+                        return False
+
+                self._readers_done.wait(remaining)
+
+        return True
+
+    def release(self):
+        self._snapshot = None
+        self._lock.release()
+        self.wake_event.set()
+
+    def locked(self):
+        return self._lock.locked() or self._readers > 0
+
+    def __enter__(self):
+        self.acquire()
+
+        if self._before_write:
+            funcs, self._before_write = self._before_write, {}
+
+            try:
+                for func in funcs.values():
+                    try:
+                        func()
+                    except Exception:
+                        self.log.exception(
+                            "An error occurred in %s, which was called before a write.",
+                            func,
+                        )
+            except BaseException:
+                self.release()
+                raise
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
+
+    @contextmanager
+    def silent(self):
+        """Context manager that holds the lock without setting the wake event."""
+        self.acquire()
+
+        try:
+            yield
+        finally:
+            self._lock.release()
+
+    @contextmanager
+    def read(self):
+        """
+        Context manager for read-only access to the device, which does not set the wake event.
+        In shared mode, the lock is only held exclusively while the read is registered, so that
+        other reads can proceed concurrently.
+        """
+        start = None
+
+        if not self._lock.acquire(False):
+            start = self._clock.time_ns()
+            self._lock.acquire()
+
+        self._reads += 1
+
+        if start is not None:
+            self._read_contentions += 1
+            self._read_wait_time.add(self._clock.seconds_since(start))
+
+        if not self._shared_reads:
+            try:
+                yield
+            finally:
+                self._lock.release()
+
+            return
+
+        with self._readers_done:
+            self._readers += 1
+
+        self._lock.release()
+
+        try:
+            yield
+        finally:
+            with self._readers_done:
+                self._readers -= 1
+
+                if not self._readers:
+                    self._readers_done.notify_all()
+
+    def call_before_write(self, func):
+        """
+        Registers a callable without arguments that is called once, the next time the lock is
+        acquired for writing in a with-statement, before the writer can access the device.
+        A :class:`~lewis.core.simulation.Simulation` that waits while its device is quiescent
+        uses this to process the device up to the time of the write, so that the time spent
+        waiting is not applied after the write. Acquisitions via :meth:`silent` and
+        :meth:`read` do not call it. Exceptions raised by the callable are logged, they do not
+        affect the writer.
+
+        Several callables can be registered at the same time, for example by the members of a
+        :class:`~lewis.core.simulation.SimulationHost` that share its device lock, they are
+        called in the order of registration.
+
+        :param func: Callable without arguments.
+        :return: Handle to pass to :meth:`cancel_before_write`.
+        """
+        handle = object()
+
+        with self._lock:
+            self._before_write[handle] = func
+
+        return handle
+
+    def cancel_before_write(self, handle):
+        """
+        Removes a callable that has been registered with :meth:`call_before_write`, if it has
+        not been called yet.
+
+        :param handle: Handle returned by :meth:`call_before_write`.
+        """
+        with self._lock:
+            self._before_write.pop(handle, None)
+
+    def register_getter(self, getter):
+        """
+        Registers a callable without arguments that reads a value from the device, so that its
+        value is contained in published snapshots. Only a weak reference to the getter is kept,
+        so it must be referenced by the reader.
+
+        :param getter: Callable that returns a value to include in snapshots.
+        """
+        with self._getters_lock:
+            self._getters.add(getter)
+
+    def publish_snapshot(self):
+        """
+        Evaluates all registered getters and publishes the values as the new :attr:`snapshot`.
+        This must be called while holding the lock, usually via :meth:`silent`. Mutable values
+        are copied, getters that raise an exception are left out of the snapshot. If
+        ``snapshots`` is False, this does nothing.
+        """
+        if not self._snapshots:
+            return
+
+        with self._getters_lock:
+            getters = list(self._getters)
+
+        values = {}
+
+        for getter in getters:
+            try:
+                value = getter()
+            except Exception:
+                continue
+
+            values[getter] = (
+                value if isinstance(value, IMMUTABLE_TYPES) else copy.copy(value)
+            )
+
+        self._snapshot = MappingProxyType(values)
+
+    @property
+    def snapshot(self):
+        """
+        Read-only dictionary with the values of the registered getters after the last time the
+        device was processed, or None if no current snapshot is available.
+        """
+        return self._snapshot
+
+    @property
+    def generation(self):
+        """
+        Number that is incremented each time the lock is acquired exclusively, that is, each
+        time the device may be modified.
+        """
+        return self._generation
+
+    @property
+    def snapshots(self):
+        """
+        If True, snapshots of the registered getters are published by :meth:`publish_snapshot`.
+        """
+        return self._snapshots
+
+    @snapshots.setter
+    def snapshots(self, value):
+        with self.silent():
+            self._snapshots = bool(value)
+            self._snapshot = None
+
+    @property
+    def shared_reads(self):
+        """
+        If True, reads acquired via :meth:`read` can hold the lock at the same time.
+        """
+        return self._shared_reads
+
+    @shared_reads.setter
+    def shared_reads(self, value):
+        with self.silent():
+            self._shared_reads = bool(value)
+
+    @property
+    def stats(self):
+        """
+        Dictionary with the number of exclusive acquisitions and reads, the number of contended
+        acquisitions and reads and summaries of the time spent waiting for them.
+        """
+        return {
+            "acquisitions": self._acquisitions,
+            "contentions": self._contentions,
+            "wait_time": self._wait_time.summary(),
+            "reads": self._reads,
+            "read_contentions": self._read_contentions,
+            "read_wait_time": self._read_wait_time.summary(),
+        }
+
+    def reset_stats(self):
+        """Resets the lock statistics."""
+        with self.silent():
+            self._acquisitions = 0
+            self._contentions = 0
+            self._wait_time.reset()
+            self._reads = 0
+            self._read_contentions = 0
+            self._read_wait_time.reset()
+
 
 @has_log
 class Adapter:
@@ -84,16 +455,26 @@ class Adapter:
     the device (or interface). This means that before starting the server component of an Adapter,
     a proper Lock-object needs to be assigned to ``lock``.
 
+    Adapters whose servers are driven by sockets can set ``uses_event_loop`` to True. Instead of
+    calling :meth:`handle` in a thread of its own, :class:`AdapterCollection` then assigns the
+    shared :class:`~lewis.core.event_loop.EventLoop` to ``event_loop`` and calls
+    :meth:`start_server` and :meth:`stop_server` on the loop, which processes all requests.
+    Such adapters can use :meth:`_create_on_event_loop` and :meth:`_close_on_event_loop` to
+    create and close their servers, which also works when the adapter is started on its own.
+
     :param options: Configuration options for the adapter.
     """
 
     default_options = {}
+    uses_event_loop = False
 
     def __init__(self, options=None):
         super(Adapter, self).__init__()
         self._interface = None
 
         self.device_lock = NoLock()
+        self.event_loop = None
+        self._owns_event_loop = False
 
         options = options or {}
         combined_options = dict(self.default_options)
@@ -198,6 +579,54 @@ class Adapter:
         """
         pass
 
+    @property
+    def seconds_until_update(self):
+        """
+        Time in seconds until the adapter has to update its clients, or None if the adapter has
+        no such deadline. Adapters running in their own thread are handled with a cycle delay of
+        at least this value, so that an adapter with nothing to do does not wake up in every cycle
+        of the adapter loop. The default implementation returns None.
+        """
+        return None
+
+    def _create_on_event_loop(self, server_type, *args):
+        """
+        Constructs a server on ``event_loop`` in :meth:`start_server`, the event loop is passed
+        as the last argument to server_type. Without an assigned event loop, the adapter starts
+        the shared :class:`~lewis.core.event_loop.EventLoop` itself and stops it again in
+        :meth:`_close_on_event_loop` or if the server can not be constructed.
+
+        :param server_type: Type of the server, or another callable that returns it.
+        :param args: Arguments for server_type before the event loop.
+        :return: The server.
+        """
+        if self.event_loop is None:
+            self.event_loop = get_event_loop()
+            self.event_loop.start()
+            self._owns_event_loop = True
+
+        try:
+            return self.event_loop.call(server_type, *(args + (self.event_loop,)))
+        except Exception:
+            self._release_event_loop()
+            raise
+
+    def _close_on_event_loop(self, server):
+        """
+        Closes a server that has been created with :meth:`_create_on_event_loop` on the event
+        loop and stops the loop if the adapter started it.
+
+        :param server: Server with a close-method.
+        """
+        self.event_loop.call(server.close)
+        self._release_event_loop()
+
+    def _release_event_loop(self):
+        if self._owns_event_loop:
+            self.event_loop.stop()
+            self.event_loop = None
+            self._owns_event_loop = False
+
 
 @has_log
 class AdapterCollection:
@@ -219,15 +648,26 @@ class AdapterCollection:
 
     This class also makes sure that all adapters use the same Lock for device interaction.
 
+    Adapters that support it run on the :class:`~lewis.core.event_loop.EventLoop` that is shared
+    by all adapters of the process, the other adapters are handled in a thread of their own.
+    An adapter that reports the time until its next update in
+    :attr:`Adapter.seconds_until_update` is handled with correspondingly longer cycle delays,
+    which are limited to :attr:`max_cycle_delay` so that :meth:`disconnect` does not have to wait
+    for long.
+
     :param args: List of adapters to add to the container
     """
 
+    #: Upper limit in seconds for the cycle delay of adapters running in their own thread.
+    max_cycle_delay = 0.5
+
     def __init__(self, *args):
         self._adapters = {}
 
         self._threads = {}
         self._running = {}
-        self._lock = threading.Lock()
+        self._lock = DeviceLock()
+        self._event_loop = get_event_loop()
 
         for adapter in args:
             self.add_adapter(adapter)
@@ -238,10 +678,21 @@ class AdapterCollection:
         This lock is passed to each adapter when it's started. It's supposed to be used to ensure
         that the device is only accessed from one thread at a time, for example during network IO.
         :class:`~lewis.core.simulation.Simulation` uses this lock to block the device during the
-        simulation cycle calculations.
+        simulation cycle calculations. It is a :class:`DeviceLock`, so that releasing it wakes up
+        a simulation that waits while its device is quiescent.
+
+        The lock can only be replaced while none of the adapters are running, for example to
+        share it with another collection whose device depends on the same data.
         """
         return self._lock
 
+    @device_lock.setter
+    def device_lock(self, new_lock):
+        if self._running:
+            raise RuntimeError("Can not replace the device lock of running adapters.")
+
+        self._lock = new_lock
+
     def set_device(self, new_device):
         """Bind the new device to all interfaces managed by the adapters in the collection."""
         for adapter in self._adapters.values():
@@ -286,16 +737,42 @@ class AdapterCollection:
 
     def connect(self, *args):
         """
-        This method starts an adapter for each specified protocol in a separate thread, if the
-        adapter is not already running.
+        This method starts an adapter for each specified protocol on the shared event loop or in
+        a separate thread, if the adapter is not already running.
 
         :param args: List of protocols for which to start adapters or empty for all.
         """
         for adapter in self._get_adapters(args):
-            self._start_server(adapter)
+            if adapter.uses_event_loop:
+                self._start_event_loop_server(adapter)
+            else:
+                self._start_server(adapter)
+
+    def _start_event_loop_server(self, adapter):
+        if adapter.protocol not in self._running:
+            self.log.info(
+                "Connecting device interface for protocol '%s' to event loop",
+                adapter.protocol,
+            )
+
+            adapter.device_lock = self._lock
+            adapter.event_loop = self._event_loop
+
+            self._event_loop.start()
+
+            try:
+                self._event_loop.call(adapter.start_server)
+            except Exception as e:
+                self._event_loop.stop()
+                raise LewisException(
+                    "Adapter for '{}' failed to start: {}".format(adapter.protocol, e)
+                )
+
+            self._running[adapter.protocol] = threading.Event()
+            self._running[adapter.protocol].set()
 
     def _start_server(self, adapter):
-        if adapter.protocol not in self._threads:
+        if adapter.protocol not in self._running:
             self.log.info(
                 "Connecting device interface for protocol '%s'", adapter.protocol
             )
@@ -327,7 +804,12 @@ class AdapterCollection:
 
         self.log.debug("Starting adapter loop for protocol %s.", adapter.protocol)
         while self._running[adapter.protocol].is_set():
-            adapter.handle(dt)
+            until_update = adapter.seconds_until_update
+
+            if until_update is None:
+                adapter.handle(dt)
+            else:
+                adapter.handle(min(max(until_update, dt), self.max_cycle_delay))
 
         adapter.stop_server()
 
@@ -339,7 +821,22 @@ class AdapterCollection:
         :param args: List of protocols for which to stop adapters or empty for all.
         """
         for adapter in self._get_adapters(args):
-            self._stop_server(adapter)
+            if adapter.uses_event_loop:
+                self._stop_event_loop_server(adapter)
+            else:
+                self._stop_server(adapter)
+
+    def _stop_event_loop_server(self, adapter):
+        if adapter.protocol in self._running:
+            self.log.info(
+                "Disconnecting device interface for protocol '%s' from event loop",
+                adapter.protocol,
+            )
+
+            self._event_loop.call(adapter.stop_server)
+            self._event_loop.stop()
+
+            del self._running[adapter.protocol]
 
     def _stop_server(self, adapter):
         if adapter.protocol in self._threads:
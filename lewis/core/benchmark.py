@@ -0,0 +1,581 @@
+# -*- coding: utf-8 -*-
+# *********************************************************************
+# lewis - a library for creating hardware device simulators
+# Copyright (C) 2016-2020 European Spallation Source ERIC
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# *********************************************************************
+
+"""
+This module contains :class:`StreamBenchmark`, a load generator for devices that are exposed
+via :class:`~lewis.adapters.stream.StreamAdapter`, and :class:`EpicsBenchmark`, which measures
+the PV update path of :class:`~lewis.adapters.epics.EpicsAdapter` with the in-process
+ChannelAccess backend. They are used by ``lewis-bench`` to measure throughput and latency of a
+simulation, so that changes to the networking, dispatch or locking code can be compared with
+numbers instead of impressions.
+"""
+
+import asyncio
+import itertools
+import random
+import threading
+import time
+from collections import Counter
+
+from lewis import __version__
+from lewis.adapters.epics_inprocess import InProcessClient
+from lewis.core.clock import get_clock
+from lewis.core.exceptions import LewisException
+from lewis.core.logging import has_log
+
+
+def percentile(sorted_values, percent):
+    """
+    Returns the specified percentile of a sorted list of values, using the nearest-rank method.
+
+    :param sorted_values: Values in ascending order.
+    :param percent: Percentile between 0 and 100.
+    :return: Value at the percentile or 0 if there are no values.
+    """
+    if not sorted_values:
+        return 0.0
+
+    rank = max(int(-(-percent * len(sorted_values) // 100)), 1)
+
+    return sorted_values[rank - 1]
+
+
+def summarize_latencies(latencies):
+    """
+    Returns a dictionary with count, mean, p50, p95, p99 and max of the latencies.
+
+    :param latencies: List of latencies in seconds.
+    :return: Dictionary with the summary.
+    """
+    values = sorted(latencies)
+
+    return {
+        "count": len(values),
+        "mean": sum(values) / len(values) if values else 0.0,
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": values[-1] if values else 0.0,
+    }
+
+
+class BenchmarkCommand:
+    """
+    A request that is part of the command mix of a :class:`StreamBenchmark`.
+
+    :param request: The request without terminator.
+    :param weight: Relative frequency of the request in the mix.
+    :param reply: False if the device does not reply to the request. The latency of such
+                  requests is the time until the request has been written.
+    """
+
+    def __init__(self, request, weight=1.0, reply=True):
+        if weight <= 0:
+            raise LewisException(
+                "The weight of request '{}' must be positive.".format(request)
+            )
+
+        self.request = request
+        self.weight = weight
+        self.reply = reply
+        self.latencies = []
+        self.timeouts = 0
+
+    @classmethod
+    def from_mix(cls, mix):
+        """
+        Creates commands from a dictionary that maps requests either to their weight or to a
+        dictionary with the constructor arguments ``weight`` and ``reply``:
+
+        .. sourcecode:: Python
+
+            BenchmarkCommand.from_mix({"IN_PV_00": 9, "OUT_SP_00 25.0": {"weight": 1}})
+
+        :param mix: Dictionary with requests and their specification.
+        :return: List of :class:`BenchmarkCommand`.
+        """
+        if not isinstance(mix, dict) or not mix:
+            raise LewisException("The command mix must map requests to weights.")
+
+        commands = []
+
+        for request, spec in mix.items():
+            if isinstance(spec, dict):
+                commands.append(cls(str(request), **spec))
+            else:
+                commands.append(cls(str(request), float(spec)))
+
+        return commands
+
+
+@has_log
+class StreamBenchmark:
+    """
+    Opens a number of concurrent connections to a stream device and sends requests that are
+    chosen randomly from a weighted command mix. Each connection waits for the reply to a
+    request before it sends the next one.
+
+    If a target rate is specified, it is distributed evenly across the connections and the
+    requests are sent according to a fixed schedule. In that case, latencies are measured from
+    the time at which a request was scheduled to be sent, so that a slow server is not hidden
+    by requests that are sent late (coordinated omission). Without a target rate, each
+    connection sends requests as fast as possible.
+
+    .. sourcecode:: Python
+
+        benchmark = StreamBenchmark(
+            "127.0.0.1", 9999, BenchmarkCommand.from_mix({"IN_PV_00": 1}),
+            connections=10, rate=1000, duration=5.0)
+
+        results = benchmark.run()
+
+    Requests that are not answered within the timeout are counted and the connection is
+    re-established, because a late reply could otherwise be mistaken for the reply to the
+    next request.
+
+    :param host: Host of the stream device.
+    :param port: Port of the stream device.
+    :param commands: List of :class:`BenchmarkCommand`.
+    :param connections: Number of concurrent connections.
+    :param rate: Target rate in requests per second across all connections or None.
+    :param duration: Duration of the benchmark in seconds.
+    :param request_terminator: Terminator that is appended to requests.
+    :param reply_terminator: Terminator that ends replies.
+    :param timeout: Time in seconds to wait for a reply.
+    :param seed: Seed for the random choice of requests.
+    """
+
+    def __init__(
+        self,
+        host,
+        port,
+        commands,
+        connections=1,
+        rate=None,
+        duration=10.0,
+        request_terminator="\r",
+        reply_terminator="\r",
+        timeout=1.0,
+        seed=None,
+    ):
+        if connections < 1:
+            raise LewisException("At least one connection is required.")
+
+        self._host = host
+        self._port = int(port)
+        self._commands = commands
+        self._connections = connections
+        self._rate = rate or None
+        self._duration = duration
+        self._request_terminator = request_terminator.encode()
+        self._reply_terminator = reply_terminator.encode()
+        self._timeout = timeout
+        self._random = random.Random(seed)
+
+        self._clock = get_clock()
+        self._reconnects = 0
+
+    def run(self):
+        """
+        Runs the benchmark and returns the results.
+
+        :return: Dictionary with configuration, throughput and latencies, see :meth:`results`.
+        """
+        for command in self._commands:
+            command.latencies = []
+            command.timeouts = 0
+
+        self._reconnects = 0
+
+        # Not asyncio.run, which does not exist in Python 3.6
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+
+        try:
+            return loop.run_until_complete(self._run())
+        finally:
+            asyncio.set_event_loop(None)
+            loop.close()
+
+    async def _run(self):
+        # Connect all clients first, so that connecting is not part of the measurement
+        streams = [await self._connect() for _ in range(self._connections)]
+
+        self.log.info(
+            "Connected %d client(s) to %s:%s", self._connections, self._host, self._port
+        )
+
+        start = self._clock.time_ns()
+        end = start + round(self._duration * 1e9)
+
+        await asyncio.gather(
+            *(
+                self._client(index, stream, start, end)
+                for index, stream in enumerate(streams)
+            )
+        )
+
+        elapsed = self._clock.seconds_since(start)
+
+        return self.results(elapsed)
+
+    async def _connect(self):
+        try:
+            return await asyncio.open_connection(self._host, self._port)
+        except OSError as e:
+            raise LewisException(
+                "Could not connect to {}:{}: {}".format(self._host, self._port, e)
+            )
+
+    async def _client(self, index, stream, start, end):
+        reader, writer = stream
+
+        interval = round(self._connections / self._rate * 1e9) if self._rate else 0
+
+        # Spread the first requests of the connections over one interval
+        scheduled = start + interval * index // self._connections
+
+        weights = [command.weight for command in self._commands]
+        rng = random.Random(self._random.random())
+
+        try:
+            while scheduled < end:
+                now = self._clock.time_ns()
+
+                if interval and scheduled > now:
+                    await asyncio.sleep((scheduled - now) * 1e-9)
+                    now = self._clock.time_ns()
+
+                    if now >= end:
+                        break
+
+                sent = scheduled if interval else now
+                command = rng.choices(self._commands, weights)[0]
+
+                writer.write(command.request.encode() + self._request_terminator)
+
+                if command.reply:
+                    try:
+                        await asyncio.wait_for(
+                            reader.readuntil(self._reply_terminator), self._timeout
+                        )
+                    except (asyncio.TimeoutError, asyncio.IncompleteReadError):
+                        command.timeouts += 1
+
+                        writer.close()
+                        reader, writer = await self._connect()
+                        self._reconnects += 1
+                else:
+                    await writer.drain()
+
+                command.latencies.append(self._clock.seconds_since(sent))
+
+                scheduled = scheduled + interval if interval else self._clock.time_ns()
+        finally:
+            writer.close()
+
+    def results(self, elapsed):
+        """
+        Returns the results of the last run as a dictionary that can be stored as JSON. It
+        contains the configuration of the benchmark, the number of requests, timeouts and
+        reconnects, the throughput in requests per second and summaries of the latencies in
+        seconds, both overall and for each request of the command mix. Requests that timed
+        out are included in the latencies with the time until the timeout.
+
+        :param elapsed: Duration of the run in seconds.
+        :return: Dictionary with the results.
+        """
+        latencies = [
+            latency for command in self._commands for latency in command.latencies
+        ]
+
+        return {
+            "version": __version__,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "protocol": "stream",
+            "host": self._host,
+            "port": self._port,
+            "connections": self._connections,
+            "target_rate": self._rate,
+            "duration": elapsed,
+            "requests": len(latencies),
+            "timeouts": sum(command.timeouts for command in self._commands),
+            "reconnects": self._reconnects,
+            "throughput": len(latencies) / elapsed if elapsed > 0 else 0.0,
+            "latency": summarize_latencies(latencies),
+            "commands": {
+                command.request: {
+                    "weight": command.weight,
+                    "timeouts": command.timeouts,
+                    "latency": summarize_latencies(command.latencies),
+                }
+                for command in self._commands
+            },
+        }
+
+
+@has_log
+class EpicsBenchmark:
+    """
+    Runs a simulation whose :class:`~lewis.adapters.epics.EpicsAdapter` uses the ``inprocess``
+    backend and measures the PV update path without pcaspy or EPICS base. All PVs are
+    monitored to measure the rate of updates and their latency, which is the time from
+    posting an update in the server until the callback of the client is called. At the same
+    time, values are put to PVs from a number of client threads to measure put throughput and
+    latency, like the requests of :class:`StreamBenchmark`.
+
+    The puts map PV names to a value or a list of values that are put in turn, PVs are chosen
+    randomly with equal weights. Initial puts are done in order before the measurement
+    starts, for example to bring the device into a state in which it changes continuously:
+
+    .. sourcecode:: Python
+
+        simulation = SimulationFactory("lewis.devices").create(
+            "chopper", protocols={"epics": {"backend": "inprocess"}})
+
+        benchmark = EpicsBenchmark(
+            simulation, puts={"Spd": [10.0, 20.0]},
+            initial_puts=[("CmdS", "init")], duration=5.0)
+
+        results = benchmark.run()
+
+    The simulation is started by :meth:`run` in a thread and stopped when the benchmark is
+    done. Puts that are not processed within the timeout are counted, as are puts that are
+    rejected, for example because of a limit violation.
+
+    :param simulation: :class:`~lewis.core.simulation.Simulation` to benchmark.
+    :param puts: Dictionary that maps PV names to values to put or None.
+    :param initial_puts: List of PV name and value pairs to put before the measurement.
+    :param clients: Number of threads that put values concurrently.
+    :param rate: Target rate in puts per second across all clients or None.
+    :param duration: Duration of the benchmark in seconds.
+    :param timeout: Time in seconds to wait for a put to be processed.
+    :param seed: Seed for the random choice of PVs.
+    :param startup_timeout: Time in seconds to wait for the simulation to serve PVs.
+    """
+
+    def __init__(
+        self,
+        simulation,
+        puts=None,
+        initial_puts=None,
+        clients=1,
+        rate=None,
+        duration=10.0,
+        timeout=1.0,
+        seed=None,
+        startup_timeout=5.0,
+    ):
+        if clients < 1:
+            raise LewisException("At least one client is required.")
+
+        if puts is not None and not isinstance(puts, dict):
+            raise LewisException("The puts must map PV names to values.")
+
+        self._simulation = simulation
+        self._commands = [BenchmarkCommand(str(pv)) for pv in puts or {}]
+        self._values = {
+            str(pv): values if isinstance(values, list) else [values]
+            for pv, values in (puts or {}).items()
+        }
+        self._initial_puts = list(initial_puts or [])
+        self._clients = clients
+        self._rate = rate or None
+        self._duration = duration
+        self._timeout = timeout
+        self._random = random.Random(seed)
+        self._startup_timeout = startup_timeout
+
+        self._clock = get_clock()
+        self._rejected = Counter()
+        self._start = None
+        self._updates = {}
+
+    def run(self):
+        """
+        Starts the simulation, runs the benchmark and returns the results.
+
+        :return: Dictionary with configuration, throughput and latencies, see :meth:`results`.
+        """
+        for command in self._commands:
+            command.latencies = []
+            command.timeouts = 0
+
+        self._rejected = Counter()
+        self._start = None
+
+        thread = threading.Thread(target=self._simulation.start, name="lewis-bench")
+        thread.daemon = True
+        thread.start()
+
+        client = InProcessClient()
+
+        try:
+            names = self._wait_for_pvs(client)
+
+            for pv, value in self._initial_puts:
+                if not client.put(pv, value, timeout=self._timeout):
+                    raise LewisException(
+                        "Initial put of {!r} to {} was rejected.".format(value, pv)
+                    )
+
+            self._updates = {name: [] for name in names}
+
+            for name in names:
+                client.monitor(name, self._monitor_callback)
+
+            return self._run(client)
+        finally:
+            client.close()
+            self._simulation.stop()
+            thread.join()
+
+    def _wait_for_pvs(self, client):
+        deadline = self._clock.time_ns() + round(self._startup_timeout * 1e9)
+
+        while self._clock.time_ns() < deadline:
+            # The device should have been processed once before values are put
+            if self._simulation.cycles > 0 and client.pv_names:
+                return client.pv_names
+
+            time.sleep(0.01)
+
+        raise LewisException(
+            "The simulation does not serve in-process PVs, the EPICS adapter must "
+            "use the backend 'inprocess'."
+        )
+
+    def _monitor_callback(self, name, value, timestamp):
+        if self._start is not None and timestamp >= self._start:
+            self._updates[name].append(self._clock.seconds_since(timestamp))
+
+    def _run(self, client):
+        start = self._clock.time_ns()
+        end = start + round(self._duration * 1e9)
+        self._start = start
+
+        self.log.info("Started benchmark of %d PV(s)", len(self._updates))
+
+        if self._commands:
+            threads = [
+                threading.Thread(target=self._client, args=(client, index, start, end))
+                for index in range(self._clients)
+            ]
+
+            for thread in threads:
+                thread.start()
+
+            for thread in threads:
+                thread.join()
+        else:
+            time.sleep(self._duration)
+
+        elapsed = self._clock.seconds_since(start)
+
+        # Updates that have been posted during the run are still delivered
+        client.flush(self._timeout)
+        self._start = None
+
+        return self.results(elapsed)
+
+    def _client(self, client, index, start, end):
+        interval = round(self._clients / self._rate * 1e9) if self._rate else 0
+        scheduled = start + interval * index // self._clients
+
+        values = {pv: itertools.cycle(values) for pv, values in self._values.items()}
+        rng = random.Random(self._random.random())
+
+        while scheduled < end:
+            now = self._clock.time_ns()
+
+            if interval and scheduled > now:
+                time.sleep((scheduled - now) * 1e-9)
+                now = self._clock.time_ns()
+
+                if now >= end:
+                    break
+
+            sent = scheduled if interval else now
+            command = rng.choice(self._commands)
+
+            try:
+                if not client.put(
+                    command.request,
+                    next(values[command.request]),
+                    timeout=self._timeout,
+                ):
+                    self._rejected[command.request] += 1
+            except TimeoutError:
+                command.timeouts += 1
+
+            command.latencies.append(self._clock.seconds_since(sent))
+
+            scheduled = scheduled + interval if interval else self._clock.time_ns()
+
+    def results(self, elapsed):
+        """
+        Returns the results of the last run as a dictionary that can be stored as JSON. Like
+        the results of :meth:`StreamBenchmark.results`, it contains the configuration, the
+        number of puts, timeouts and rejected puts, the put throughput and latencies, both
+        overall and for each PV. In addition, the number of monitor updates, their rate in
+        updates per second and their latencies are reported, overall and for each PV.
+
+        :param elapsed: Duration of the run in seconds.
+        :return: Dictionary with the results.
+        """
+        latencies = [
+            latency for command in self._commands for latency in command.latencies
+        ]
+        updates = [latency for pv in self._updates.values() for latency in pv]
+
+        def rate(count):
+            return count / elapsed if elapsed > 0 else 0.0
+
+        return {
+            "version": __version__,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "protocol": "epics",
+            "pvs": len(self._updates),
+            "clients": self._clients,
+            "target_rate": self._rate,
+            "duration": elapsed,
+            "puts": len(latencies),
+            "timeouts": sum(command.timeouts for command in self._commands),
+            "rejected": sum(self._rejected.values()),
+            "throughput": rate(len(latencies)),
+            "latency": summarize_latencies(latencies),
+            "commands": {
+                command.request: {
+                    "timeouts": command.timeouts,
+                    "rejected": self._rejected[command.request],
+                    "latency": summarize_latencies(command.latencies),
+                }
+                for command in self._commands
+            },
+            "updates": len(updates),
+            "update_rate": rate(len(updates)),
+            "update_latency": summarize_latencies(updates),
+            "monitors": {
+                pv: {
+                    "updates": len(pv_updates),
+                    "latency": summarize_latencies(pv_updates),
+                }
+                for pv, pv_updates in self._updates.items()
+            },
+        }
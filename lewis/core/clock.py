@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+# *********************************************************************
+# lewis - a library for creating hardware device simulators
+# Copyright (C) 2016-2020 European Spallation Source ERIC
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# *********************************************************************
+
+"""
+This module contains the clocks that are used for all timing in Lewis, such as the time steps
+of the simulation and the poll intervals of adapters. Timestamps are integer nanoseconds on a
+monotonic time scale, so that they are not affected by changes of the system time and the
+difference of two timestamps is exact:
+
+.. sourcecode:: Python
+
+    from lewis.core.clock import get_clock
+
+    clock = get_clock()
+
+    start = clock.time_ns()
+    ...
+    elapsed = clock.seconds_since(start)
+
+By default, :class:`MonotonicClock` is used. In tests, :class:`VirtualClock` can be used
+instead to control the passing of time explicitly, either by passing it to the constructor of
+:class:`~lewis.core.simulation.Simulation` or by making it the default clock via
+:func:`set_clock`.
+"""
+
+try:
+    from time import perf_counter_ns
+except ImportError:  # Python 3.6
+    from time import perf_counter
+
+    def perf_counter_ns():
+        return int(perf_counter() * 1e9)
+
+
+class Clock:
+    """
+    Base class for clocks. Sub-classes have to implement :meth:`time_ns`, which returns the
+    current time in nanoseconds as an integer. The origin of the time scale is arbitrary, only
+    differences between timestamps are meaningful.
+    """
+
+    def time_ns(self):
+        """
+        Returns the current time in nanoseconds.
+
+        :return: Current time as integer nanoseconds.
+        """
+        raise NotImplementedError("Clocks must implement time_ns.")
+
+    def time(self):
+        """
+        Returns the current time in seconds.
+
+        :return: Current time as float seconds.
+        """
+        return self.time_ns() * 1e-9
+
+    def seconds_since(self, start):
+        """
+        Returns the elapsed seconds since start, which must have been obtained from
+        :meth:`time_ns` of the same clock.
+
+        :param start: Start time in nanoseconds.
+        :return: Elapsed seconds since start.
+        """
+        return (self.time_ns() - start) * 1e-9
+
+
+class MonotonicClock(Clock):
+    """
+    The default clock, which is based on ``time.perf_counter_ns``. It has the highest
+    resolution that is available and does not jump when the system time is adjusted. On
+    Python 3.6, where that function does not exist, ``time.perf_counter`` is used instead.
+    """
+
+    def time_ns(self):
+        return perf_counter_ns()
+
+
+class VirtualClock(Clock):
+    """
+    A clock that only advances when :meth:`advance` is called, which is useful for testing
+    time dependent behavior without actually waiting:
+
+    .. sourcecode:: Python
+
+        clock = VirtualClock()
+        start = clock.time_ns()
+
+        clock.advance(0.5)
+        clock.seconds_since(start)  # 0.5
+
+    :param start: Initial time in seconds.
+    """
+
+    def __init__(self, start=0.0):
+        self._time_ns = round(start * 1e9)
+
+    def time_ns(self):
+        return self._time_ns
+
+    def advance(self, seconds):
+        """
+        Advances the clock by the specified time.
+
+        :param seconds: Time in seconds, can not be negative.
+        """
+        if seconds < 0:
+            raise ValueError("A clock can not go backwards.")
+
+        self._time_ns += round(seconds * 1e9)
+
+
+_clock = MonotonicClock()
+
+
+def get_clock():
+    """
+    Returns the default clock, which is used unless a different clock is specified explicitly.
+
+    :return: The default :class:`Clock`.
+    """
+    return _clock
+
+
+def set_clock(clock):
+    """
+    Replaces the default clock. Objects that have already obtained the default clock keep using
+    the previous one, so this should be done before the simulation is created.
+
+    :param clock: New default :class:`Clock` or None to restore :class:`MonotonicClock`.
+    """
+    global _clock
+    _clock = clock if clock is not None else MonotonicClock()
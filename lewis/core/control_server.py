@@ -35,6 +35,7 @@ import socket
 import zmq
 from jsonrpc import JSONRPCResponseManager
 
+from lewis.core.adapters import DeviceLock
 from lewis.core.exceptions import LewisException
 from lewis.core.logging import has_log
 
@@ -69,6 +70,9 @@ class ExposedObject:
     for example when multiple threads are accessing it on the server side. For this purpose,
     the ``lock``-parameter can be used. If it is not ``None``, the exposed methods are wrapped
     in a function that acquires the lock before accessing ``obj``, and releases it afterwards.
+    If the lock is a :class:`~lewis.core.adapters.DeviceLock`, property getters only acquire
+    it for reading (see :meth:`DeviceLock.read <lewis.core.adapters.DeviceLock.read>`), or
+    return the value from the latest published snapshot if there is one.
 
     :param obj: The object to expose.
     :param members: This list of methods will be exposed. (defaults to all public members)
@@ -146,27 +150,45 @@ class ExposedObject:
         return item in self._function_map
 
     def _add_property(self, name):
-        self._add_function("{}:get".format(name), lambda: getattr(self._object, name))
+        self._add_function(
+            "{}:get".format(name), lambda: getattr(self._object, name), read_only=True
+        )
         self._add_function(
             "{}:set".format(name), lambda value: setattr(self._object, name, value)
         )
 
-    def _add_function(self, name, function):
+    def _add_function(self, name, function, read_only=False):
         if not callable(function):
             raise TypeError("Only callable objects can be exposed.")
 
         if self._lock is not None:
+            if read_only and isinstance(self._lock, DeviceLock):
+                function = self._create_reading_wrapper(function)
+            else:
+                function = self._create_locking_wrapper(function)
 
-            def create_locking_wrapper(f):
-                def locking_wrapper_function(*args, **kwargs):
-                    with self._lock:
-                        return f(*args, **kwargs)
+        self._function_map[name] = function
 
-                return locking_wrapper_function
+    def _create_locking_wrapper(self, f):
+        def locking_wrapper_function(*args, **kwargs):
+            with self._lock:
+                return f(*args, **kwargs)
 
-            function = create_locking_wrapper(function)
+        return locking_wrapper_function
 
-        self._function_map[name] = function
+    def _create_reading_wrapper(self, getter):
+        self._lock.register_getter(getter)
+
+        def reading_wrapper_function():
+            snapshot = self._lock.snapshot
+
+            if snapshot is not None and getter in snapshot:
+                return snapshot[getter]
+
+            with self._lock.read():
+                return getter()
+
+        return reading_wrapper_function
 
     def _remove_function(self, name):
         del self._function_map[name]
@@ -258,7 +280,11 @@ class ControlServer:
     instance of :class:`ExposedObject`, that is used directly.
 
     Each time process is called, the server tries to get request data and responds to that.
-    If there is no data, the method does nothing.
+    If there is no data, the method does nothing. Sub-classes can change how requests are
+    handled by overriding :meth:`_handle_request`.
+
+    If the port is 0, the server binds to a free port when it is started, which is then
+    available in ``port``.
 
     Please note that this RPC-service comes without any security, authentication, etc.
     Only use it to expose objects on a trusted network and be aware that anyone on that
@@ -322,8 +348,23 @@ class ControlServer:
             self._socket.setsockopt(zmq.RCVTIMEO, 100)
             self._socket.bind("tcp://{0}:{1}".format(self.host, self.port))
 
+            if str(self.port) == "0":
+                self.port = self._socket.getsockopt_string(zmq.LAST_ENDPOINT).rsplit(
+                    ":", 1
+                )[1]
+
             self.log.info("Listening on %s:%s", self.host, self.port)
 
+    def stop_server(self):
+        """
+        Closes the socket of the server, it can be started again with :meth:`start_server`.
+        """
+        if self._socket is not None:
+            self._socket.close(linger=0)
+            self._socket = None
+
+            self.log.info("Stopped listening on %s:%s", self.host, self.port)
+
     def _unhandled_exception_response(self, request_id, exception):
         return {
             "jsonrpc": "2.0",
@@ -369,13 +410,23 @@ class ControlServer:
             self.log.debug("Got request %s", request)
 
             try:
-                response = JSONRPCResponseManager.handle(request, self._exposed_object)
-                self._socket.send_unicode(response.json)
+                response = self._handle_request(request)
+                self._socket.send_unicode(response)
 
-                self.log.debug("Sent response %s", response.json)
+                self.log.debug("Sent response %s", response)
             except TypeError as e:
                 self._socket.send_json(
                     self._unhandled_exception_response(json.loads(request)["id"], e)
                 )
         except zmq.Again:
             pass
+
+    def _handle_request(self, request):
+        """
+        Passes the request to the JSONRPCResponseManager, which calls the method on the
+        exposed object.
+
+        :param request: JSON-RPC request string.
+        :return: JSON-RPC response string.
+        """
+        return JSONRPCResponseManager.handle(request, self._exposed_object).json
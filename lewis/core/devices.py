@@ -28,7 +28,58 @@ import importlib
 
 from lewis.core.exceptions import LewisException
 from lewis.core.logging import has_log
-from lewis.core.utils import get_members, get_submodules
+from lewis.core.utils import IMMUTABLE_TYPES, get_members, get_submodules
+
+
+class _AttributeChangeCounter:
+    """
+    Descriptor that stores an instance attribute in the instance and counts assignments of
+    different values to it, see :attr:`DeviceBase.tracked_attributes`.
+    """
+
+    def __init__(self, name):
+        self._name = name
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+
+        try:
+            return instance.__dict__[self._name]
+        except KeyError:
+            raise AttributeError(
+                "'{}' object has no attribute '{}'".format(owner.__name__, self._name)
+            )
+
+    def __set__(self, instance, value):
+        state = instance.__dict__
+        name = self._name
+        old = state.get(name, value)
+        state[name] = value
+
+        # Only immutable values are compared, comparing arrays can be expensive
+        if old is not value and (
+            not isinstance(value, IMMUTABLE_TYPES)
+            or not isinstance(old, IMMUTABLE_TYPES)
+            or old != value
+        ):
+            self._count(state)
+
+    def __delete__(self, instance):
+        try:
+            del instance.__dict__[self._name]
+        except KeyError:
+            raise AttributeError(self._name)
+
+        self._count(instance.__dict__)
+
+    def _count(self, state):
+        changes = state.get("_attribute_changes")
+
+        if changes is None:
+            changes = state["_attribute_changes"] = {}
+
+        changes[self._name] = changes.get(self._name, 0) + 1
 
 
 @has_log
@@ -37,8 +88,82 @@ class DeviceBase:
     This class is a common base for :class:`~lewis.devices.Device` and
     :class:`~lewis.devices.StateMachineDevice`. It is mainly used in the device
     discovery process.
+
+    Devices can list instance attributes in ``tracked_attributes`` to count how often a
+    different value is assigned to them (see :meth:`get_attribute_changes`). Adapters use
+    this to avoid reading values that have not changed:
+
+    .. sourcecode:: Python
+
+        class SimpleDevice(Device):
+            tracked_attributes = ('target_speed',)
+
+            def __init__(self):
+                super(SimpleDevice, self).__init__()
+                self.target_speed = 0.0
+
+    Only immutable values such as numbers and strings are compared, assigning any other value
+    counts as a change. Modifying a mutable value in place, for example appending to a list,
+    is not detected, :class:`~lewis.core.waveform.Waveform` counts its own modifications
+    instead. Assigning a tracked attribute is slower than assigning other attributes, so
+    attributes that change in every cycle should usually not be tracked. Attributes that
+    are defined in the class, such as properties, can not be tracked.
     """
 
+    tracked_attributes = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super(DeviceBase, cls).__init_subclass__(**kwargs)
+
+        for name in cls.__dict__.get("tracked_attributes", ()):
+            if cls.tracks_attribute_changes(name):
+                continue
+
+            if any(name in vars(base) for base in cls.__mro__):
+                raise RuntimeError(
+                    "Attribute '{}' of {} is defined in the class and can not be "
+                    "tracked.".format(name, cls.__name__)
+                )
+
+            setattr(cls, name, _AttributeChangeCounter(name))
+
+    @classmethod
+    def tracks_attribute_changes(cls, name):
+        """
+        Returns True if changes of the attribute are counted, because it is listed in
+        ``tracked_attributes`` of this class or a base class.
+
+        :param name: Name of the attribute.
+        :return: True if the attribute is tracked.
+        """
+        return isinstance(getattr(cls, name, None), _AttributeChangeCounter)
+
+    def get_attribute_changes(self, name):
+        """
+        Returns how often a different value has been assigned to an instance attribute that
+        is listed in ``tracked_attributes``.
+
+        :param name: Name of the attribute.
+        :return: Number of changes, 0 if the attribute has never been changed.
+        """
+        changes = self.__dict__.get("_attribute_changes")
+
+        return changes.get(name, 0) if changes is not None else 0
+
+    def get_quiescent_time(self):
+        """
+        Returns the simulated time in seconds for which the device will not change unless it is
+        accessed from outside, for example through an adapter or the control server. While a
+        device is quiescent, :class:`~lewis.core.simulation.Simulation` does not process it in
+        every cycle, but waits until that time has passed or the device is accessed.
+
+        The default implementation returns 0, so that the device is processed in every cycle.
+        Devices that only change in response to external input can return ``float('inf')``.
+
+        :return: Quiescent time in seconds.
+        """
+        return 0.0
+
 
 @has_log
 class InterfaceBase:
@@ -0,0 +1,360 @@
+# -*- coding: utf-8 -*-
+# *********************************************************************
+# lewis - a library for creating hardware device simulators
+# Copyright (C) 2016-2020 European Spallation Source ERIC
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# *********************************************************************
+
+"""
+This module contains :class:`EventLoop`, a selector driven event loop that runs in a background
+thread and is shared by all socket based adapters of a process. Instead of polling each
+adapter in a thread of its own, the loop blocks until one of the sockets is ready or a timer
+expires, so idle adapters do not use any CPU time.
+
+Adapters that support the event loop set ``uses_event_loop`` to True, they are then started
+by :class:`~lewis.core.adapters.AdapterCollection` on the loop returned by
+:func:`get_event_loop`.
+"""
+
+import asyncio
+import socket
+import threading
+from concurrent.futures import Future
+
+from lewis.core.logging import has_log
+from lewis.core.utils import FromOptionalDependency
+
+# asyncore is not available in newer Python versions, only dispatchers depend on it
+asyncore_read, asyncore_write = FromOptionalDependency("asyncore").do_import(
+    "read", "write"
+)
+
+
+class _DispatcherMap(dict):
+    """
+    A socket map for ``asyncore`` dispatchers that registers the sockets with the selector of
+    an asyncio event loop. Dispatchers add and remove themselves when they are created and
+    closed, after each event the registration is updated according to ``readable`` and
+    ``writable`` of the dispatcher.
+    """
+
+    def __init__(self, loop):
+        super(_DispatcherMap, self).__init__()
+        self._loop = loop
+        self._reading = set()
+        self._writing = set()
+
+    def __setitem__(self, fd, dispatcher):
+        super(_DispatcherMap, self).__setitem__(fd, dispatcher)
+        self.refresh(fd)
+
+    def __delitem__(self, fd):
+        super(_DispatcherMap, self).__delitem__(fd)
+
+        if fd in self._reading:
+            self._loop.remove_reader(fd)
+            self._reading.discard(fd)
+
+        if fd in self._writing:
+            self._loop.remove_writer(fd)
+            self._writing.discard(fd)
+
+    def refresh(self, fd):
+        dispatcher = self.get(fd)
+
+        if dispatcher is None:
+            return
+
+        reading = dispatcher.readable()
+        writing = dispatcher.writable() and not dispatcher.accepting
+
+        if reading and fd not in self._reading:
+            self._loop.add_reader(fd, self._handle, fd, asyncore_read)
+            self._reading.add(fd)
+        elif not reading and fd in self._reading:
+            self._loop.remove_reader(fd)
+            self._reading.discard(fd)
+
+        if writing and fd not in self._writing:
+            self._loop.add_writer(fd, self._handle, fd, asyncore_write)
+            self._writing.add(fd)
+        elif not writing and fd in self._writing:
+            self._loop.remove_writer(fd)
+            self._writing.discard(fd)
+
+    def refresh_all(self):
+        for fd in list(self.keys()):
+            self.refresh(fd)
+
+    def _handle(self, fd, event):
+        dispatcher = self.get(fd)
+
+        if dispatcher is not None:
+            event(dispatcher)
+            self.refresh(fd)
+
+
+@has_log
+class EventLoop:
+    """
+    An asyncio event loop that runs in a daemon thread. The loop is started when the first user
+    calls :meth:`start` and stopped when the last user has called :meth:`stop`, so that
+    adapters of several devices, for example in a :class:`~lewis.core.simulation.SimulationHost`,
+    share one thread.
+
+    Code that runs on the loop must not be called from other threads directly, instead
+    :meth:`call` runs a function on the loop and waits for its result, while :meth:`call_soon`
+    schedules it without waiting:
+
+    .. sourcecode:: Python
+
+        event_loop = get_event_loop()
+        event_loop.start()
+
+        server = event_loop.call(create_server)
+
+    Dispatchers of the ``asyncore`` module can be used on the loop by passing
+    :attr:`socket_map` as their map. Servers based on asyncio use :attr:`loop` directly.
+    """
+
+    def __init__(self):
+        self._loop = None
+        self._socket_map = None
+        self._thread = None
+        self._users = 0
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self):
+        """The asyncio event loop or None if the loop is not running."""
+        return self._loop
+
+    @property
+    def socket_map(self):
+        """Socket map for ``asyncore`` dispatchers or None if the loop is not running."""
+        return self._socket_map
+
+    @property
+    def is_running(self):
+        """True if the loop thread is running."""
+        return self._thread is not None
+
+    @property
+    def in_loop_thread(self):
+        """True if the calling code runs on the loop thread."""
+        return self._thread is threading.current_thread()
+
+    def start(self):
+        """
+        Starts the loop thread if it is not running yet. Each call must be matched by a call to
+        :meth:`stop`.
+        """
+        with self._lock:
+            self._users += 1
+
+            if self._thread is not None:
+                return
+
+            self._loop = asyncio.new_event_loop()
+            self._socket_map = _DispatcherMap(self._loop)
+
+            started = threading.Event()
+
+            self._thread = threading.Thread(
+                target=self._run, args=(started,), name="lewis-event-loop"
+            )
+            self._thread.daemon = True
+            self._thread.start()
+
+            started.wait()
+
+        self.log.debug("Started event loop.")
+
+    def _run(self, started):
+        asyncio.set_event_loop(self._loop)
+        self._loop.call_soon(started.set)
+
+        try:
+            self._loop.run_forever()
+        finally:
+            self._loop.close()
+
+    def stop(self):
+        """
+        Stops the loop thread after the last user has called this method. Sockets that are still
+        registered with the loop are closed.
+        """
+        with self._lock:
+            if self._users == 0:
+                return
+
+            self._users -= 1
+
+            if self._users > 0 or self._thread is None:
+                return
+
+            self.call(self._close_dispatchers)
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+
+            self._thread = None
+            self._loop = None
+            self._socket_map = None
+
+        self.log.debug("Stopped event loop.")
+
+    def _close_dispatchers(self):
+        for dispatcher in list(self._socket_map.values()):
+            dispatcher.close()
+
+    def call(self, func, *args):
+        """
+        Runs func with the supplied arguments on the loop and returns the result. Exceptions
+        raised by func are re-raised in the calling thread.
+
+        :param func: Function to run on the loop.
+        :param args: Arguments to pass to func.
+        :return: Return value of func.
+        """
+        if self.in_loop_thread:
+            return self._call(func, *args)
+
+        future = Future()
+
+        def run():
+            try:
+                future.set_result(self._call(func, *args))
+            except BaseException as e:
+                future.set_exception(e)
+
+        self._loop.call_soon_threadsafe(run)
+
+        return future.result()
+
+    def call_soon(self, func, *args):
+        """
+        Schedules func with the supplied arguments to run on the loop without waiting for it.
+        This method can be called from any thread.
+
+        :param func: Function to run on the loop.
+        :param args: Arguments to pass to func.
+        """
+        self._loop.call_soon_threadsafe(self._call, func, *args)
+
+    def call_later(self, delay, func, *args):
+        """
+        Schedules func with the supplied arguments to run on the loop after delay seconds. This
+        method must be called on the loop thread. Unlike :meth:`call` and :meth:`call_soon`,
+        the registration of dispatchers is not updated afterwards, if func modifies a
+        dispatcher it should call :meth:`refresh`.
+
+        :param delay: Delay in seconds.
+        :param func: Function to run on the loop.
+        :param args: Arguments to pass to func.
+        :return: ``asyncio.TimerHandle`` that can be used to cancel the call.
+        """
+        return self._loop.call_later(delay, func, *args)
+
+    def refresh(self, dispatcher):
+        """
+        Updates the registration of an ``asyncore`` dispatcher with the selector, for example
+        after data has been queued for sending outside of the dispatcher's event handlers.
+        This method must be called on the loop thread.
+
+        :param dispatcher: Dispatcher in :attr:`socket_map`.
+        """
+        self._socket_map.refresh(dispatcher._fileno)
+
+    def listen(self, protocol_factory, host, port, backlog=100):
+        """
+        Creates an asyncio TCP server on the loop for the specified address. The socket is bound
+        immediately, so that errors such as a port that is already in use are raised by this
+        method instead of being reported asynchronously. This method must be called on the
+        loop thread.
+
+        :param protocol_factory: Callable that returns an ``asyncio.Protocol`` per connection.
+        :param host: Address to bind to.
+        :param port: Port to listen on, 0 selects a free port.
+        :param backlog: Maximum number of pending connections.
+        :return: :class:`Listener` that can be used to close the server.
+        """
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            sock.bind((host, port))
+            sock.listen(backlog)
+            sock.setblocking(False)
+        except OSError:
+            sock.close()
+            raise
+
+        return Listener(self._loop, protocol_factory, sock)
+
+    def _call(self, func, *args):
+        try:
+            return func(*args)
+        finally:
+            # The function might have created or modified dispatchers
+            self._socket_map.refresh_all()
+
+
+class Listener:
+    """
+    A listening socket that is served by an asyncio server, as returned by
+    :meth:`EventLoop.listen`.
+
+    :param loop: The asyncio event loop.
+    :param protocol_factory: Callable that returns an ``asyncio.Protocol`` per connection.
+    :param sock: Bound and listening socket.
+    """
+
+    def __init__(self, loop, protocol_factory, sock):
+        self._socket = sock
+        self._server = None
+        self._task = loop.create_task(loop.create_server(protocol_factory, sock=sock))
+        self._task.add_done_callback(self._started)
+
+    def _started(self, task):
+        if not task.cancelled() and task.exception() is None:
+            self._server = task.result()
+
+    @property
+    def address(self):
+        """Host and port the socket is bound to."""
+        return self._socket.getsockname()[:2]
+
+    def close(self):
+        """
+        Stops accepting connections. Connections that have already been accepted are not
+        affected. This method must be called on the loop thread.
+        """
+        if self._server is not None:
+            self._server.close()
+        else:
+            self._task.cancel()
+            self._socket.close()
+
+
+_event_loop = EventLoop()
+
+
+def get_event_loop():
+    """
+    Returns the event loop that is shared by all adapters of the process.
+
+    :return: The shared :class:`EventLoop`.
+    """
+    return _event_loop
@@ -0,0 +1,430 @@
+# -*- coding: utf-8 -*-
+# *********************************************************************
+# lewis - a library for creating hardware device simulators
+# Copyright (C) 2016-2020 European Spallation Source ERIC
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# *********************************************************************
+
+"""
+This module contains :class:`SimulationFleet`, which distributes a large number of simulations
+over a pool of worker processes, each running a :class:`~lewis.core.simulation.SimulationHost`.
+All workers are accessible through one aggregated control endpoint, provided by
+:class:`FleetControlServer`.
+"""
+
+import json
+import multiprocessing
+import os
+import signal
+from collections import OrderedDict
+
+from lewis.core.control_client import ControlClient, ProtocolException
+from lewis.core.control_server import ControlServer, ExposedObject
+from lewis.core.exceptions import LewisException
+from lewis.core.logging import has_log
+from lewis.core.simulation import SimulationFactory
+
+
+def _run_worker(devices_package, simulations, connection, cpu, cycle_delay, scheduler):
+    """
+    Entry point of a fleet worker process. The simulations are created in a
+    :class:`~lewis.core.simulation.SimulationHost`, which runs until the process receives
+    SIGTERM or SIGINT. The control server of the host binds to a free port, which is sent
+    through connection before the host is started.
+    """
+    if cpu is not None:
+        os.sched_setaffinity(0, {cpu})
+
+    host = SimulationFactory(devices_package).create_host(simulations, "127.0.0.1:0")
+    host.cycle_delay = cycle_delay
+    host.scheduler = scheduler
+
+    # Binding here instead of in the control server thread makes the port known in advance
+    host.control_server.start_server()
+    connection.send(host.control_server.port)
+    connection.close()
+
+    signal.signal(signal.SIGTERM, lambda signum, frame: host.stop())
+
+    try:
+        host.start()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        host.stop()
+
+
+@has_log
+class FleetControlServer(ControlServer):
+    """
+    A control server that acts as the single control endpoint of a :class:`SimulationFleet`.
+    Requests for objects of a simulation are forwarded to the control server of the worker that
+    hosts the simulation, so the objects are accessible with the same names as in a
+    :class:`~lewis.core.simulation.SimulationHost`, for example via ``lewis-control``:
+
+    ::
+
+        $ lewis-control -r 127.0.0.1:10000 chopper1.device speed
+
+    The host of each worker, which is named ``simulation`` on the worker, is exposed as
+    ``worker0``, ``worker1`` and so on. All other requests are handled by the objects passed
+    in ``object_map``, like in :class:`~lewis.core.control_server.ControlServer`.
+
+    :param object_map: Dictionary with name: object-pairs that are handled locally.
+    :param connection_string: String with host:port pair for binding control server.
+    :param workers: List of host:port strings of the worker control servers.
+    :param routes: Dict with simulation names as keys and worker indices as values.
+    :param timeout: Timeout in milliseconds for forwarded requests.
+    """
+
+    def __init__(self, object_map, connection_string, workers, routes, timeout=3000):
+        super(FleetControlServer, self).__init__(object_map, connection_string)
+
+        self._workers = [
+            ControlClient(*worker.split(":"), timeout=timeout) for worker in workers
+        ]
+        self._routes = routes
+
+    def _get_worker_and_method(self, method):
+        """
+        Returns the index of the worker responsible for the method and the method name on that
+        worker or None if the method is handled locally.
+        """
+        name = method.split(".", 1)[0].split(":", 1)[0]
+
+        if name in self._routes:
+            return self._routes[name], method
+
+        if name.startswith("worker") and name[6:].isdigit():
+            worker = int(name[6:])
+
+            if worker < len(self._workers):
+                return worker, "simulation" + method[len(name) :]
+
+        return None
+
+    def _forward(self, worker, method, params):
+        response, _ = self._workers[worker].json_rpc(method, *params)
+        return response
+
+    def _get_objects(self):
+        objects = self._exposed_object.get_objects()
+
+        for worker in range(len(self._workers)):
+            worker_objects = self._forward(worker, "get_objects", []).get("result", [])
+
+            objects.append("worker{}".format(worker))
+            objects += [obj for obj in worker_objects if obj != "simulation"]
+
+        return objects
+
+    def _handle_request(self, request):
+        """
+        Forwards requests for objects on workers to the corresponding worker and merges the
+        objects of all workers into the response to ``get_objects``. All other requests are
+        handled like in :class:`~lewis.core.control_server.ControlServer`.
+
+        :param request: JSON-RPC request string.
+        :return: JSON-RPC response string.
+        """
+        try:
+            request_data = json.loads(request)
+        except ValueError:
+            request_data = None
+
+        if not isinstance(request_data, dict) or "method" not in request_data:
+            return super(FleetControlServer, self)._handle_request(request)
+
+        request_id = request_data.get("id")
+        method = request_data["method"]
+
+        try:
+            if method == "get_objects":
+                response = {
+                    "jsonrpc": "2.0",
+                    "id": request_id,
+                    "result": self._get_objects(),
+                }
+            else:
+                route = self._get_worker_and_method(method)
+
+                if route is None:
+                    return super(FleetControlServer, self)._handle_request(request)
+
+                response = self._forward(
+                    route[0], route[1], request_data.get("params", [])
+                )
+                response["id"] = request_id
+        except ProtocolException as e:
+            response = self._unhandled_exception_response(request_id, e)
+
+        return json.dumps(response)
+
+
+@has_log
+class SimulationFleet:
+    """
+    A SimulationFleet distributes a large number of simulations over a pool of worker processes.
+    Each worker runs a :class:`~lewis.core.simulation.SimulationHost` with a share of the
+    simulations, so that the processing of device cycles is not limited by the GIL of a single
+    process. The simulations are specified like in
+    :meth:`SimulationFactory.create_host <lewis.core.simulation.SimulationFactory.create_host>`:
+
+    .. sourcecode:: Python
+
+        fleet = SimulationFleet({
+            'chopper{}'.format(i): {
+                'device': 'chopper',
+                'protocols': {'epics': {'prefix': 'CHOP{}:'.format(i)}}
+            } for i in range(100)
+        }, workers=4, control_server='127.0.0.1:10000')
+
+        fleet.start()
+
+    The simulations are split into contiguous shards of (almost) equal size, one per worker. If
+    ``pin_workers`` is True and the platform supports it, each worker is pinned to one of the
+    CPU cores available to the fleet process.
+
+    Each worker has its own control server on a free local port, which the worker reports
+    back when it has started. If ``control_server`` is specified, :meth:`start` runs a
+    :class:`FleetControlServer` on that address that routes requests to the correct worker,
+    otherwise it waits until the workers have ended.
+
+    :param simulations: Dictionary of name: simulation specification pairs.
+    :param workers: Number of worker processes, defaults to the number of CPU cores.
+    :param devices_package: Name of the package where devices are found.
+    :param control_server: 'host:port'-string for the aggregated control endpoint or None.
+    :param pin_workers: Pin each worker process to one CPU core.
+    :param cycle_delay: Cycle delay of the simulation hosts.
+    :param scheduler: Scheduler of the simulation hosts.
+    :param startup_timeout: Time in seconds to wait for each worker to report its control
+                            server.
+    """
+
+    def __init__(
+        self,
+        simulations,
+        workers=None,
+        devices_package="lewis.devices",
+        control_server=None,
+        pin_workers=True,
+        cycle_delay=0.1,
+        scheduler="delay",
+        startup_timeout=30.0,
+    ):
+        if not simulations:
+            raise LewisException("A fleet requires at least one simulation.")
+
+        workers = min(workers or os.cpu_count() or 1, len(simulations))
+
+        self._shards = self._create_shards(simulations, workers)
+        self._devices_package = devices_package
+        self._control_server = control_server
+        self._pin_workers = pin_workers
+        self._cycle_delay = cycle_delay
+        self._scheduler = scheduler
+        self._startup_timeout = startup_timeout
+
+        self._processes = []
+        self._worker_control_servers = []
+        self._server = None
+        self._serving = False
+        self._stop_commanded = False
+
+    def _create_shards(self, simulations, workers):
+        names = list(simulations.keys())
+        shard_size, remainder = divmod(len(names), workers)
+
+        shards = []
+        start = 0
+        for worker in range(workers):
+            end = start + shard_size + (1 if worker < remainder else 0)
+            shards.append(
+                OrderedDict((name, simulations[name]) for name in names[start:end])
+            )
+            start = end
+
+        return shards
+
+    def _get_cpus(self):
+        if not self._pin_workers:
+            return [None] * len(self._shards)
+
+        if not hasattr(os, "sched_setaffinity"):
+            self.log.warning("Pinning workers to CPU cores is not supported.")
+            return [None] * len(self._shards)
+
+        cpus = sorted(os.sched_getaffinity(0))
+
+        return [cpus[worker % len(cpus)] for worker in range(len(self._shards))]
+
+    @property
+    def workers(self):
+        """Number of worker processes."""
+        return len(self._shards)
+
+    @property
+    def shards(self):
+        """List with the names of the simulations on each worker."""
+        return [list(shard.keys()) for shard in self._shards]
+
+    @property
+    def is_alive(self):
+        """List with the liveness status of each worker process."""
+        return [process.is_alive() for process in self._processes]
+
+    def start(self):
+        """
+        Starts the worker processes and blocks until :meth:`stop` is called or, if there is no
+        aggregated control endpoint, all workers have ended. Before returning, the workers are
+        joined and the aggregated control endpoint is closed.
+        """
+        self._stop_commanded = False
+
+        try:
+            connections = [
+                self._start_worker(worker, shard, cpu)
+                for worker, (shard, cpu) in enumerate(
+                    zip(self._shards, self._get_cpus())
+                )
+            ]
+
+            for worker, connection in enumerate(connections):
+                self._worker_control_servers.append(
+                    "127.0.0.1:{}".format(self._receive_port(worker, connection))
+                )
+
+            self._server = self._create_control_server()
+
+            if self._server is not None:
+                self._server.start_server()
+
+            while not self._stop_commanded and any(self.is_alive):
+                if self._server is not None:
+                    self._serving = True
+
+                    try:
+                        self._server.process(blocking=True)
+                    finally:
+                        self._serving = False
+                else:
+                    self._processes[0].join(0.1)
+        finally:
+            self.stop()
+
+    def _start_worker(self, worker, shard, cpu):
+        """
+        Starts a worker process for the shard and returns the connection on which the worker
+        sends the port of its control server.
+        """
+        connection, worker_connection = multiprocessing.Pipe(duplex=False)
+
+        process = multiprocessing.Process(
+            target=_run_worker,
+            args=(
+                self._devices_package,
+                shard,
+                worker_connection,
+                cpu,
+                self._cycle_delay,
+                self._scheduler,
+            ),
+            name="lewis-worker{}".format(worker),
+        )
+        process.start()
+
+        # Only the worker writes, so that the connection is closed when the worker ends
+        worker_connection.close()
+
+        self._processes.append(process)
+
+        self.log.info(
+            "Started worker %s (pid: %s, cpu: %s) with %s simulations",
+            worker,
+            process.pid,
+            cpu,
+            len(shard),
+        )
+
+        return connection
+
+    def _receive_port(self, worker, connection):
+        try:
+            if not connection.poll(self._startup_timeout):
+                raise LewisException(
+                    "Worker {} did not start its control server within {} s.".format(
+                        worker, self._startup_timeout
+                    )
+                )
+
+            port = connection.recv()
+        except EOFError:
+            raise LewisException(
+                "Worker {} ended before starting its control server.".format(worker)
+            )
+        finally:
+            connection.close()
+
+        self.log.info("Worker %s listens on control server port %s", worker, port)
+
+        return port
+
+    def _create_control_server(self):
+        if self._control_server is None:
+            return None
+
+        routes = {
+            name: worker for worker, shard in enumerate(self._shards) for name in shard
+        }
+
+        return FleetControlServer(
+            {
+                "fleet": ExposedObject(
+                    self, members=("workers", "shards", "is_alive", "stop")
+                )
+            },
+            self._control_server,
+            self._worker_control_servers,
+            routes,
+        )
+
+    def stop(self):
+        """
+        Stops all worker processes and joins them. Workers that do not end within a few seconds
+        are killed. The aggregated control endpoint is closed as well, if :meth:`start` is
+        currently processing a request with it, for example the request to stop the fleet, it
+        is closed when :meth:`start` returns.
+        """
+        self._stop_commanded = True
+
+        for process in self._processes:
+            if process.is_alive():
+                process.terminate()
+
+        for process in self._processes:
+            process.join(5.0)
+
+            if process.is_alive():
+                self.log.warning("Killing worker %s", process.name)
+                # Not process.kill, which does not exist in Python 3.6
+                os.kill(process.pid, signal.SIGKILL)
+                process.join()
+
+        self._processes = []
+        self._worker_control_servers = []
+
+        if self._server is not None and not self._serving:
+            self._server.stop_server()
+            self._server = None
@@ -22,15 +22,17 @@ A :class:`~Simulation` combines a :mod:`Device <lewis.devices>` and its interfac
 an :mod:`Adapter <lewis.adapters>`).
 """
 
-from datetime import datetime
+from collections import OrderedDict
+from math import ceil, isinf
 from threading import Thread
 from time import sleep
 
 from lewis.core.adapters import AdapterCollection
+from lewis.core.clock import get_clock
 from lewis.core.control_server import ControlServer, ExposedObject
-from lewis.core.devices import DeviceRegistry
+from lewis.core.devices import DeviceBase, DeviceRegistry
 from lewis.core.logging import has_log
-from lewis.core.utils import seconds_since
+from lewis.core.statistics import Histogram
 
 
 @has_log
@@ -60,11 +62,37 @@ class Simulation:
     adapters continue to work. This can be used to simulate that a device is "hanging".
     The simulation can be continued using the resume-method.
 
+    By default, the simulation sleeps for cycle_delay before each cycle, so that the actual
+    cycle period is cycle_delay plus the time it takes to process the device. For small cycle
+    delays this can make the simulation run noticeably slower than configured. Setting the
+    scheduler-property to ``'deadline'`` changes this behavior: the simulation then targets
+    absolute cycle deadlines on a monotonic clock and only sleeps for the remaining time until
+    the next deadline. Cycles that finish after the following deadline are counted in the
+    overruns-property. What happens after an overrun depends on overrun_policy: with
+    ``'catch_up'`` (default), the missed cycles are processed without sleeping until the
+    simulation is back on schedule, with ``'skip'`` the missed deadlines are dropped (and counted
+    in skipped_cycles) and the next cycle is aligned to the first deadline in the future.
+
+    For offline use, for example in automated tests, :meth:`run_virtual` runs the simulation
+    on a virtual clock instead. The device is processed with a fixed simulated time step and no
+    sleeping at all, so that runtime advances as fast as the CPU allows, until a simulated
+    end time is reached or a stop condition becomes true.
+
+    Devices can report that they will not change for a certain time unless they are accessed
+    from outside (see :meth:`DeviceBase.get_quiescent_time
+    <lewis.core.devices.DeviceBase.get_quiescent_time>`), for example a chopper that is phase
+    locked. While the device is quiescent, the simulation does not process it in every cycle,
+    but waits until the quiescent time has passed or the device lock is released by an adapter
+    or the control server, and then advances the device by the entire elapsed time in one
+    cycle. On the virtual clock, the quiescent time is skipped in a single cycle. This
+    behavior can be switched off with the quiescence-property.
+
     A number of status properties provide information about the simulation.
     The total uptime (in actually elapsed time) can be obtained through the
     uptime-property, whereas the runtime-property contains the simulated time.
     The cycles-property indicates the total number of simulation cycles, which
-    does not increase when the simulation is paused.
+    does not increase when the simulation is paused. Timing statistics of the cycles
+    and of the device lock are available in the stats-property.
 
     Finally, the simulation can be stopped entirely with the stop-method.
 
@@ -79,11 +107,22 @@ class Simulation:
     :param device_builder: :class:`~lewis.core.devices.DeviceBuilder` instance to enable setup-
                            switching at runtime.
     :param control_server: 'host:port'-string to construct control server or None.
+    :param clock: :class:`~lewis.core.clock.Clock` for all timing, defaults to the clock
+                  returned by :func:`~lewis.core.clock.get_clock`.
     """
 
-    def __init__(self, device, adapters=(), device_builder=None, control_server=None):
+    def __init__(
+        self,
+        device,
+        adapters=(),
+        device_builder=None,
+        control_server=None,
+        clock=None,
+    ):
         super(Simulation, self).__init__()
 
+        self._clock = clock if clock is not None else get_clock()
+
         self._device_builder = device_builder
 
         self._device = device
@@ -92,7 +131,36 @@ class Simulation:
         self._speed = 1.0  # Multiplier for delta t
         self._cycle_delay = 0.1  # Target time between cycles
 
-        self._start_time = None  # Real time when the simulation started
+        self._scheduler = "delay"  # How the time between cycles is determined
+        self._overrun_policy = "catch_up"  # What to do when deadlines are missed
+        self._next_deadline = None  # Clock time of the next cycle deadline
+        self._overruns = 0  # Number of cycles that missed their deadline
+        self._skipped_cycles = 0  # Number of deadlines dropped by the skip-policy
+
+        self._virtual_dt = None  # Fixed simulated time step of a virtual run
+        self._virtual_until = None  # Simulated time after which a virtual run ends
+        self._virtual_cycles = 0  # Number of cycles processed in a virtual run
+        self._virtual_stop_condition = None  # Callable that ends a virtual run
+
+        self._quiescence = True  # Wait instead of processing quiescent devices
+        self._quiescent_time = 0.0  # Time for which the device will not change
+        self._quiescent_cycles = 0  # Cycles that waited for a quiescent device
+        self._wake_event = self._adapters.device_lock.wake_event
+        self._idle_start = None  # Clock time in ns when waiting for the device started
+        self._idle_delta = 0.0  # Simulated time that was not processed before waiting
+        self._idle_scale = 1.0  # Simulated seconds per second of waiting
+        self._idle_credit = 0.0  # Simulated time processed before a write while waiting
+        self._idle_handle = (
+            None  # Handle of _process_idle_time registered with the device lock
+        )
+        self._host = None  # SimulationHost that processes this simulation
+
+        self._last_cycle_start = None  # Used to determine the cycle period
+        self._cycle_period = Histogram()
+        self._processing_time = Histogram()
+        self._sleep_time = Histogram()
+
+        self._start_time = None  # Clock time in ns when the simulation started
         self._cycles = 0  # Number of cycles processed
         self._runtime = 0.0  # Total simulation time processed
 
@@ -121,32 +189,36 @@ class Simulation:
         if control_server is None:
             return None
 
-        return ControlServer(
-            {
-                "device": ExposedObject(
-                    self._device,
-                    exclude_inherited=True,
-                    lock=self._adapters.device_lock,
-                ),
-                "simulation": ExposedObject(
-                    self,
-                    exclude=("start", "control_server", "log"),
-                    exclude_inherited=True,
-                ),
-                "interface": ExposedObject(
-                    self._adapters,
-                    exclude=(
-                        "device_lock",
-                        "add_adapter",
-                        "remove_adapter",
-                        "handle",
-                        "log",
-                    ),
-                    exclude_inherited=True,
+        return ControlServer(self._get_exposed_objects(), control_server)
+
+    def _get_exposed_objects(self):
+        """
+        Returns the objects that are exposed via the control server, with the names under which
+        they are exposed as keys.
+        """
+        return {
+            "device": ExposedObject(
+                self._device,
+                exclude_inherited=True,
+                lock=self._adapters.device_lock,
+            ),
+            "simulation": ExposedObject(
+                self,
+                exclude=("start", "run_virtual", "control_server", "log"),
+                exclude_inherited=True,
+            ),
+            "interface": ExposedObject(
+                self._adapters,
+                exclude=(
+                    "device_lock",
+                    "add_adapter",
+                    "remove_adapter",
+                    "handle",
+                    "log",
                 ),
-            },
-            control_server,
-        )
+                exclude_inherited=True,
+            ),
+        }
 
     @property
     def setups(self):
@@ -167,11 +239,19 @@ class Simulation:
 
         If any error occurs during setup switching it is logged and re-raised.
 
+        The new device is processed in the next cycle, even if the previous device was
+        quiescent, so that it is initialized before it is accessed by adapters.
+
         :param new_setup: Name of the new setup to load.
         """
         try:
-            self._device = self._device_builder.create_device(new_setup)
-            self._adapters.set_device(self._device)
+            device = self._device_builder.create_device(new_setup)
+
+            with self._adapters.device_lock.silent():
+                self._device = device
+                self._adapters.set_device(device)
+
+            self._wake()
             self.log.info("Switched setup to '%s'", new_setup)
         except Exception as e:
             self.log.error(
@@ -195,7 +275,11 @@ class Simulation:
 
         self._adapters.connect()
 
-        self._start_time = datetime.now()
+        self._start_time = self._clock.time_ns()
+        self._next_deadline = None
+        self._quiescent_time = 0.0
+        self._idle_credit = 0.0
+        self._last_cycle_start = None
 
         delta = 0.0
 
@@ -207,6 +291,49 @@ class Simulation:
 
         self.log.info("Simulation has ended.")
 
+    def run_virtual(self, until=None, stop_condition=None, dt=None):
+        """
+        Starts the simulation on a virtual clock. Instead of sleeping between cycles and measuring
+        the elapsed time, the device's process-method is called back to back with a fixed
+        simulated time step, so that runtime advances as fast as possible. The speed-property
+        does not affect the time step while running on a virtual clock.
+
+        Like :meth:`start`, this method blocks until the simulation has ended. This happens
+        when ``until`` seconds of simulated time have been processed in this run, when
+        ``stop_condition`` returns ``True`` after a cycle or when :meth:`stop` is called.
+        Control server and adapters are started and stopped as usual. To spin up a chopper
+        without waiting in real time:
+
+        .. sourcecode:: Python
+
+            simulation.run_virtual(
+                until=600.0, stop_condition=lambda: device.state == 'phase_locked')
+
+        :param until: Simulated time in seconds after which the run ends or None.
+        :param stop_condition: Callable without arguments that ends the run when True or None.
+        :param dt: Simulated time step per cycle, defaults to cycle_delay multiplied by speed.
+        """
+        dt = dt if dt is not None else self._cycle_delay * self._speed
+
+        if dt <= 0.0:
+            raise ValueError("The time step of a virtual run must be positive.")
+
+        self._virtual_dt = dt
+        self._virtual_until = until
+        self._virtual_cycles = 0
+        self._virtual_stop_condition = stop_condition
+
+        self.log.info(
+            "Running simulation on virtual clock (dt=%s, until=%s)", dt, until
+        )
+
+        try:
+            self.start()
+        finally:
+            self._virtual_dt = None
+            self._virtual_until = None
+            self._virtual_stop_condition = None
+
     def _start_control_server(self):
         if self._control_server is not None and self._control_server_thread is None:
 
@@ -237,15 +364,113 @@ class Simulation:
         :param delta: Elapsed time in last cycle, passed to simulation.
         :return: Elapsed time in this cycle.
         """
-        start = datetime.now()
+        if self._virtual_dt is not None:
+            return self._process_virtual_cycle()
+
+        if self._scheduler == "deadline":
+            return self._process_deadline_cycle(delta)
+
+        start = self._clock.time_ns()
 
         self._process_simulation_cycle(delta)
 
-        delta = seconds_since(start)
+        delta = self._clock.seconds_since(start)
 
         return delta
 
-    def _process_simulation_cycle(self, delta):
+    def _process_deadline_cycle(self, delta):
+        """
+        Processes one cycle like :meth:`_process_cycle`, but instead of sleeping for the full
+        cycle_delay, the method only sleeps until the current cycle deadline, so that the time
+        spent processing the device is not added to the cycle period. Afterwards the next
+        deadline is determined, taking into account overruns and the overrun_policy.
+
+        :param delta: Elapsed time in last cycle, passed to simulation.
+        :return: Elapsed time in this cycle.
+        """
+        start = self._clock.time()
+
+        if self._next_deadline is None:
+            self._next_deadline = start + self._cycle_delay
+
+        quiescent = self._is_quiescent()
+
+        self._process_simulation_cycle(delta, max(0.0, self._next_deadline - start))
+
+        now = self._clock.time()
+
+        if quiescent:
+            # Waiting for a quiescent device is not an overrun, the schedule starts over
+            self._next_deadline = now + self._cycle_delay
+            return now - start
+
+        self._next_deadline += self._cycle_delay
+
+        if self._cycle_delay > 0.0 and now > self._next_deadline:
+            self._overruns += 1
+
+            if self._overrun_policy == "skip":
+                missed = int((now - self._next_deadline) // self._cycle_delay) + 1
+
+                self._next_deadline += missed * self._cycle_delay
+                self._skipped_cycles += missed
+
+        return now - start
+
+    def _process_virtual_cycle(self):
+        """
+        Processes one cycle on the virtual clock, which advances the device by the fixed time
+        step of the virtual run without sleeping. If the end of the run is reached, the
+        simulation is stopped. While the simulation is paused, the method sleeps for the
+        duration of one cycle_delay instead, so that it does not spin.
+
+        :return: Simulated time step of this cycle.
+        """
+        if not self._running:
+            sleep(self._cycle_delay)
+            return 0.0
+
+        start = self._start_cycle()
+        steps = 1
+
+        if self._is_quiescent() and self._virtual_until is not None:
+            # Skip the quiescent time, but not beyond the end of the run
+            remaining = (
+                ceil(self._virtual_until / self._virtual_dt - 1e-9)
+                - self._virtual_cycles
+            )
+            steps = (
+                remaining
+                if isinf(self._quiescent_time)
+                else int(self._quiescent_time // self._virtual_dt)
+            )
+            steps = max(1, min(steps, remaining))
+
+        self._advance(self._virtual_dt * steps)
+        self._virtual_cycles += steps
+
+        self._processing_time.add(self._clock.seconds_since(start))
+
+        # Counting cycles avoids an extra cycle due to rounding errors in accumulated runtime
+        end_reached = (
+            self._virtual_until is not None
+            and self._virtual_cycles * self._virtual_dt
+            >= self._virtual_until - 1e-9 * self._virtual_dt
+        )
+
+        if end_reached or (
+            self._virtual_stop_condition is not None and self._virtual_stop_condition()
+        ):
+            self.log.info(
+                "Virtual run ended after %s cycles, runtime: %s",
+                self._cycles,
+                self._runtime,
+            )
+            self.stop()
+
+        return self._virtual_dt
+
+    def _process_simulation_cycle(self, delta, delay=None):
         """
         If the simulation is not paused, the device's process-method is
         called with the supplied delta, multiplied by the simulation speed.
@@ -254,19 +479,167 @@ class Simulation:
         of one cycle_delay.
 
         :param delta: Time delta passed to simulation.
+        :param delay: Time to sleep before processing, defaults to cycle_delay.
         """
-        self.log.debug("Cycle, dt=%s", delta)
+        start = self._start_cycle()
+        delay = self._cycle_delay if delay is None else delay
+
+        if self._is_quiescent():
+            self._wait_quiescent(delay, delta)
+        else:
+            sleep(delay)
 
-        sleep(self._cycle_delay)
+        processing_start = self._clock.time_ns()
+        self._sleep_time.add((processing_start - start) * 1e-9)
+
+        self._wake_event.clear()
 
         if self._running:
-            delta_simulation = delta * self._speed
+            self._advance(delta * self._speed)
+            self._processing_time.add(self._clock.seconds_since(processing_start))
+
+    def _start_cycle(self):
+        """
+        Records the period since the start of the previous cycle and returns the start time of
+        the current cycle in nanoseconds.
+        """
+        start = self._clock.time_ns()
+
+        if self._last_cycle_start is not None:
+            self._cycle_period.add((start - self._last_cycle_start) * 1e-9)
+
+        self._last_cycle_start = start
 
-            with self._adapters.device_lock:
-                self._device.process(delta_simulation)
+        return start
 
-            self._cycles += 1
-            self._runtime += delta_simulation
+    def _wake(self):
+        """
+        Makes the simulation process the device in the next cycle instead of waiting while it
+        is quiescent. A hosted simulation wakes its host.
+        """
+        self._quiescent_time = 0.0
+        self._wake_event.set()
+
+        if self._host is not None:
+            self._host._wake()
+
+    def _is_quiescent(self):
+        return self._running and self._quiescent_time > 0.0
+
+    def _wait_quiescent(self, delay, delta):
+        """
+        Waits until the quiescent time of the device has passed or the wake event is set, for
+        example because the device lock has been released by an adapter. To not process the
+        device more often than usual, the method waits for at least delay.
+
+        If the device is written to while waiting, it is first processed up to the time of the
+        write (see :meth:`_arm_idle_processing`), so that the write does not act as if it had
+        happened before the time spent waiting.
+
+        :param delay: Minimum time to wait.
+        :param delta: Elapsed time in last cycle, which has not been processed yet.
+        """
+        start = self._clock.time_ns()
+
+        self._arm_idle_processing(start, delta * self._speed, self._speed)
+
+        if self._speed > 0.0 and not isinf(self._quiescent_time):
+            self._wake_event.wait(max(delay, self._quiescent_time / self._speed))
+        else:
+            self._wake_event.wait()
+
+        self._quiescent_cycles += 1
+
+        remaining = delay - self._clock.seconds_since(start)
+        if remaining > 0.0:
+            sleep(remaining)
+
+        self._disarm_idle_processing()
+
+    def _arm_idle_processing(self, start, pending, scale):
+        """
+        Registers :meth:`_process_idle_time` with the device lock, so that the device is
+        processed up to the time of the next write before the writer can access it.
+
+        :param start: Clock time in nanoseconds when waiting started.
+        :param pending: Simulated time that has not been processed before waiting.
+        :param scale: Simulated seconds per second of waiting.
+        """
+        self._idle_start = start
+        self._idle_delta = pending
+        self._idle_scale = scale
+
+        self._idle_handle = self._adapters.device_lock.call_before_write(
+            self._process_idle_time
+        )
+
+    def _disarm_idle_processing(self):
+        if self._idle_handle is not None:
+            self._adapters.device_lock.cancel_before_write(self._idle_handle)
+            self._idle_handle = None
+
+    def _process_idle_time(self):
+        """
+        Processes the device for the time that has passed since waiting started, while the
+        device lock is held by a writer. The processed time is subtracted from the next time
+        step in :meth:`_advance`.
+        """
+        if not self._running or (self._host is not None and not self._host._running):
+            return
+
+        delta_simulation = (
+            self._idle_delta
+            + self._clock.seconds_since(self._idle_start) * self._idle_scale
+        )
+
+        self._process_device(delta_simulation)
+        self._idle_credit += delta_simulation
+
+    def _get_quiescent_time(self):
+        """
+        Returns the quiescent time of the device or 0 if quiescence is switched off or the
+        device is not derived from :class:`~lewis.core.devices.DeviceBase`.
+        """
+        if not self._quiescence or not isinstance(self._device, DeviceBase):
+            return 0.0
+
+        return self._device.get_quiescent_time()
+
+    def _advance(self, delta_simulation):
+        """
+        Calls the device's process-method with the supplied simulated time step while holding
+        the device lock, publishes a snapshot for readers and updates cycles and runtime.
+
+        :param delta_simulation: Simulated time step passed to the device.
+        """
+        device_lock = self._adapters.device_lock
+
+        with device_lock.silent():
+            self._process_device(self._take_idle_credit(delta_simulation))
+            device_lock.publish_snapshot()
+
+        self._cycles += 1
+        self._runtime += delta_simulation
+
+    def _process_device(self, delta_simulation):
+        """
+        Calls the device's process-method and updates the quiescent time, the device lock must
+        be held by the caller.
+
+        :param delta_simulation: Simulated time step passed to the device.
+        """
+        self._device.process(delta_simulation)
+        self._quiescent_time = self._get_quiescent_time()
+
+    def _take_idle_credit(self, delta_simulation):
+        """
+        Returns the part of the time step that has not already been processed by
+        :meth:`_process_idle_time`.
+        """
+        credit = min(delta_simulation, self._idle_credit)
+        self._idle_credit -= credit
+
+        return delta_simulation - credit
 
     @property
     def cycle_delay(self):
@@ -282,9 +655,155 @@ class Simulation:
             raise ValueError("Cycle delay can not be negative.")
 
         self._cycle_delay = delay
+        self._next_deadline = None
+        self._wake_event.set()
 
         self.log.info("Changed cycle delay to %s", self._cycle_delay)
 
+    @property
+    def scheduler(self):
+        """
+        Determines how the time between cycles is handled. With ``'delay'`` (default), the
+        simulation sleeps for cycle_delay before each cycle. With ``'deadline'``, cycles are
+        scheduled at fixed intervals of cycle_delay on a monotonic clock, so that the time spent
+        processing the device is subtracted from the sleep time.
+        """
+        return self._scheduler
+
+    @scheduler.setter
+    def scheduler(self, new_scheduler):
+        if new_scheduler not in ("delay", "deadline"):
+            raise ValueError("Scheduler must be either 'delay' or 'deadline'.")
+
+        self._scheduler = new_scheduler
+        self._next_deadline = None
+
+        self.log.info("Changed scheduler to %s", self._scheduler)
+
+    @property
+    def overrun_policy(self):
+        """
+        Determines how missed deadlines are handled when the scheduler is ``'deadline'``.
+        With ``'catch_up'`` (default), missed cycles are processed without sleeping until the
+        simulation is back on schedule. With ``'skip'``, missed deadlines are dropped and the next
+        cycle is aligned to the first deadline in the future.
+        """
+        return self._overrun_policy
+
+    @overrun_policy.setter
+    def overrun_policy(self, new_policy):
+        if new_policy not in ("catch_up", "skip"):
+            raise ValueError("Overrun policy must be either 'catch_up' or 'skip'.")
+
+        self._overrun_policy = new_policy
+
+        self.log.info("Changed overrun policy to %s", self._overrun_policy)
+
+    @property
+    def overruns(self):
+        """
+        Number of cycles that finished after the following cycle deadline. This is only
+        counted when the scheduler is ``'deadline'``.
+        """
+        return self._overruns
+
+    @property
+    def skipped_cycles(self):
+        """
+        Number of cycle deadlines that were dropped due to overruns with the ``'skip'``
+        overrun policy.
+        """
+        return self._skipped_cycles
+
+    @property
+    def quiescence(self):
+        """
+        If True (default), the simulation waits instead of processing the device in every cycle
+        while the device is quiescent. The wait ends when the device lock is released, for
+        example by an adapter, or when the simulation is paused, resumed or stopped.
+        """
+        return self._quiescence
+
+    @quiescence.setter
+    def quiescence(self, value):
+        self._quiescence = bool(value)
+        self._quiescent_time = 0.0
+        self._wake_event.set()
+
+        self.log.info("Changed quiescence to %s", self._quiescence)
+
+    @property
+    def quiescent_cycles(self):
+        """
+        Number of cycles in which the simulation waited for a quiescent device.
+        """
+        return self._quiescent_cycles
+
+    @property
+    def shared_reads(self):
+        """
+        If True, read-only access to the device by adapters and the control server, such as
+        PV updates, stream Var reads or property getters, can happen concurrently. Processing
+        the device and writes are always exclusive. The effect is visible in the device_lock
+        statistics (see :attr:`stats`).
+        """
+        return self._adapters.device_lock.shared_reads
+
+    @shared_reads.setter
+    def shared_reads(self, value):
+        self._adapters.device_lock.shared_reads = value
+
+        self.log.info("Changed shared_reads to %s", self.shared_reads)
+
+    @property
+    def snapshots(self):
+        """
+        If True, the values that adapters and the control server read from the device are
+        published as a snapshot after each cycle, so that reads do not have to wait for the
+        device lock. Writes still acquire the lock and discard the snapshot until the device
+        has been processed again, so reads are never older than the last write.
+        """
+        return self._adapters.device_lock.snapshots
+
+    @snapshots.setter
+    def snapshots(self, value):
+        self._adapters.device_lock.snapshots = value
+
+        self.log.info("Changed snapshots to %s", self.snapshots)
+
+    @property
+    def stats(self):
+        """
+        Timing statistics of the simulation cycles, in seconds. For the cycle period (time
+        between the starts of two cycles), the time spent processing the device and the time
+        spent sleeping or waiting for a quiescent device, there is a summary with count, mean,
+        p50, p99 and max. The device_lock-entry contains the statistics of the device lock (see
+        :class:`~lewis.core.adapters.DeviceLock`), which include the time that adapters and the
+        simulation had to wait for each other. The statistics are collected in constant memory,
+        they can be reset with :meth:`reset_stats`.
+        """
+        return {
+            "cycles": self._cycles,
+            "overruns": self._overruns,
+            "skipped_cycles": self._skipped_cycles,
+            "quiescent_cycles": self._quiescent_cycles,
+            "cycle_period": self._cycle_period.summary(),
+            "processing_time": self._processing_time.summary(),
+            "sleep_time": self._sleep_time.summary(),
+            "device_lock": self._adapters.device_lock.stats,
+        }
+
+    def reset_stats(self):
+        """
+        Resets the timing statistics in :attr:`stats` and of the device lock.
+        """
+        self._cycle_period.reset()
+        self._processing_time.reset()
+        self._sleep_time.reset()
+        self._adapters.device_lock.reset_stats()
+
+        self._last_cycle_start = None
+
     @property
     def cycles(self):
         """
@@ -299,7 +818,7 @@ class Simulation:
         """
         if not self._started:
             return 0.0
-        return seconds_since(self._start_time)
+        return self._clock.seconds_since(self._start_time)
 
     @property
     def speed(self):
@@ -317,6 +836,7 @@ class Simulation:
             raise ValueError("Speed can not be negative.")
 
         self._speed = new_speed
+        self._wake_event.set()
 
         self.log.info("Changed speed to %s", self._speed)
 
@@ -364,6 +884,7 @@ class Simulation:
         self.log.info("Pausing simulation")
 
         self._running = False
+        self._wake_event.set()
 
     def resume(self):
         """
@@ -376,6 +897,7 @@ class Simulation:
         self.log.info("Resuming simulation")
 
         self._running = True
+        self._wake_event.set()
 
     def stop(self):
         """
@@ -385,6 +907,7 @@ class Simulation:
             self.log.warning("Stopping simulation")
 
             self._stop_commanded = True
+            self._wake_event.set()
 
             self._stop_control_server()
             self._adapters.disconnect()
@@ -426,6 +949,235 @@ class Simulation:
             self._control_server.start_server()
 
 
+@has_log
+class SimulationHost(Simulation):
+    """
+    A SimulationHost runs several simulations in a single process, for example all choppers of a
+    chopper cascade. Instead of running a cycle loop, a control server and an interpreter per
+    device, all member simulations are processed in the cycle loop of the host and exposed through
+    one shared control server.
+
+    Member simulations are added with :meth:`add_simulation` under a unique name. They are
+    usually created by :class:`SimulationFactory` without a control server of their own, so
+    that each device keeps its own adapters with their own options (ports, EPICS prefix and so
+    on):
+
+    .. sourcecode:: Python
+
+        factory = SimulationFactory('lewis.devices')
+
+        host = SimulationHost(control_server='127.0.0.1:10000')
+        host.add_simulation('chopper1', factory.create(
+            'chopper', protocols={'epics': {'prefix': 'CHOP1:'}}))
+        host.add_simulation('chopper2', factory.create(
+            'chopper', protocols={'epics': {'prefix': 'CHOP2:'}}))
+
+        host.start()
+
+    Timing is controlled by the host, so that cycle_delay, scheduler and the virtual clock
+    (:meth:`run_virtual`) apply to all devices. Speed and pause/resume of the host apply to
+    all devices as well, while each member simulation can additionally be paused or given a
+    different speed individually. Each device is processed while holding the device lock of
+    its own adapters, so adapters of one device do not block access to the other devices.
+    Members whose devices are views of the shared device (see below) must use the device lock
+    of the host instead, this is requested when they are added.
+
+    In the control server, the host is exposed as ``simulation``. The device, simulation and
+    interface objects of each member are exposed with the member name as prefix, for example
+    ``chopper1.device``, ``chopper1.simulation`` and ``chopper1.interface``.
+
+    Optionally, the host can process a shared device of its own in each cycle, before the member
+    simulations are processed. This is meant for vectorized devices such as
+    :class:`~lewis.devices.chopper.fleet.ChopperFleet`, which simulate many devices at once and
+    whose members are exposed as light-weight views in the member simulations. The shared
+    device is processed while holding the device lock of the host, it is not exposed in the
+    control server.
+
+    :param simulations: Dict of name: :class:`Simulation` pairs to add on construction.
+    :param control_server: 'host:port'-string to construct control server or None.
+    :param device: Shared device that is processed in each cycle or None.
+    :param clock: :class:`~lewis.core.clock.Clock` of the host, which is also used by all
+                  member simulations.
+    """
+
+    def __init__(self, simulations=None, control_server=None, device=None, clock=None):
+        self._simulations = OrderedDict()
+
+        super(SimulationHost, self).__init__(
+            device=device, control_server=control_server, clock=clock
+        )
+
+        for name, simulation in (simulations or {}).items():
+            self.add_simulation(name, simulation)
+
+    def _get_exposed_objects(self):
+        exposed_objects = {
+            "simulation": ExposedObject(
+                self,
+                exclude=(
+                    "start",
+                    "run_virtual",
+                    "control_server",
+                    "log",
+                    "add_simulation",
+                    "setups",
+                    "switch_setup",
+                    "set_device_parameters",
+                ),
+            )
+        }
+
+        for name, simulation in self._simulations.items():
+            exposed_objects.update(self._get_member_exposed_objects(name, simulation))
+
+        return exposed_objects
+
+    def _get_member_exposed_objects(self, name, simulation):
+        return {
+            "{}.{}".format(name, object_name): exposed_object
+            for object_name, exposed_object in simulation._get_exposed_objects().items()
+        }
+
+    @property
+    def simulations(self):
+        """Names of the member simulations in the order they are processed."""
+        return list(self._simulations.keys())
+
+    def add_simulation(self, name, simulation, share_device_lock=False):
+        """
+        Adds a simulation to the host. Simulations can only be added before the host has been
+        started. The simulation should not have a control server of its own, its objects are
+        exposed through the control server of the host instead.
+
+        If the device of the simulation stores its data in the shared device of the host,
+        share_device_lock must be True, so that the adapters of the member use the device lock
+        of the host and can not modify the data while the shared device is processed.
+
+        :param name: Unique name of the member, used as prefix for exposed objects.
+        :param simulation: :class:`Simulation` to add.
+        :param share_device_lock: Use the device lock of the host for the simulation.
+        """
+        if self.is_started:
+            raise RuntimeError("Can not add simulations to a running host.")
+
+        if name in self._simulations or "." in name:
+            raise RuntimeError(
+                "Invalid or duplicate simulation name '{}'.".format(name)
+            )
+
+        if simulation.control_server is not None:
+            raise RuntimeError(
+                "Simulation '{}' has its own control server, hosted simulations are exposed "
+                "via the control server of the host.".format(name)
+            )
+
+        self._simulations[name] = simulation
+
+        # Members share the clock of the host, which processes them in its own cycles
+        simulation._clock = self._clock
+        simulation._host = self
+
+        if share_device_lock:
+            simulation._adapters.device_lock = self._adapters.device_lock
+
+        # Accessing any of the devices or member simulations must wake the host
+        simulation._wake_event = self._wake_event
+        simulation._adapters.device_lock.wake_event = self._wake_event
+
+        if self._control_server is not None:
+            exposed_objects = self._control_server.exposed_object
+
+            for object_name, exposed_object in self._get_member_exposed_objects(
+                name, simulation
+            ).items():
+                exposed_objects.add_object(exposed_object, object_name)
+
+        self.log.info(
+            "Added simulation '%s' (device type: %s)",
+            name,
+            type(simulation._device).__name__,
+        )
+
+    def start(self):
+        start_time = self._clock.time_ns()
+
+        for simulation in self._simulations.values():
+            simulation._start_time = start_time
+            simulation._idle_credit = 0.0
+            simulation._running = True
+            simulation._started = True
+
+            simulation._adapters.connect()
+
+        try:
+            super(SimulationHost, self).start()
+        finally:
+            for simulation in self._simulations.values():
+                simulation._running = False
+                simulation._started = False
+
+    def stop(self):
+        if self.is_started:
+            super(SimulationHost, self).stop()
+
+            for simulation in self._simulations.values():
+                simulation._adapters.disconnect()
+
+    def _advance(self, delta_simulation):
+        quiescent_time = float("inf")
+
+        if self._device is not None:
+            with self._adapters.device_lock.silent():
+                self._device.process(self._take_idle_credit(delta_simulation))
+                quiescent_time = self._get_quiescent_time()
+
+        for simulation in self._simulations.values():
+            if simulation._running:
+                simulation._advance(delta_simulation * simulation._speed)
+
+                if simulation._speed > 0.0:
+                    quiescent_time = min(
+                        quiescent_time,
+                        simulation._quiescent_time / simulation._speed,
+                    )
+
+        self._quiescent_time = quiescent_time if self._quiescence else 0.0
+
+        self._cycles += 1
+        self._runtime += delta_simulation
+
+    def _process_device(self, delta_simulation):
+        # Only the shared device, the quiescent time is determined in _advance
+        self._device.process(delta_simulation)
+
+    def _arm_idle_processing(self, start, pending, scale):
+        if self._device is not None:
+            super(SimulationHost, self)._arm_idle_processing(start, pending, scale)
+
+        for simulation in self._simulations.values():
+            if simulation._running:
+                simulation._arm_idle_processing(
+                    start, pending * simulation._speed, scale * simulation._speed
+                )
+
+    def _disarm_idle_processing(self):
+        super(SimulationHost, self)._disarm_idle_processing()
+
+        for simulation in self._simulations.values():
+            simulation._disarm_idle_processing()
+
+    def switch_setup(self, new_setup):
+        # Member simulations wake the host via _wake when their setup is switched
+        raise RuntimeError(
+            "Setups can only be switched for individual member simulations."
+        )
+
+    def set_device_parameters(self, parameters):
+        raise RuntimeError(
+            "Device parameters can only be set for individual member simulations."
+        )
+
+
 class SimulationFactory:
     """
     This class is used to create :class:`Simulation`-objects according to a certain
@@ -493,3 +1245,27 @@ class SimulationFactory:
             device_builder=device_builder,
             control_server=control_server,
         )
+
+    def create_host(self, simulations, control_server=None):
+        """
+        Creates a :class:`SimulationHost` that runs multiple simulations in one process. The
+        simulations are specified as a dictionary with member names as keys and dictionaries
+        with the arguments of :meth:`create` (except control_server) as values:
+
+        .. sourcecode:: Python
+
+            host = factory.create_host({
+                'chopper1': {'device': 'chopper', 'protocols': {'epics': {'prefix': 'C1:'}}},
+                'chopper2': {'device': 'chopper', 'protocols': {'epics': {'prefix': 'C2:'}}},
+            }, control_server='127.0.0.1:10000')
+
+        :param simulations: Dictionary of name: simulation specification pairs.
+        :param control_server: String to construct a shared control server (host:port).
+        :return: SimulationHost object with all simulations added.
+        """
+        host = SimulationHost(control_server=control_server)
+
+        for name, specification in simulations.items():
+            host.add_simulation(name, self.create(**specification))
+
+        return host
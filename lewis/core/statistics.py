@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+# *********************************************************************
+# lewis - a library for creating hardware device simulators
+# Copyright (C) 2016-2020 European Spallation Source ERIC
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# *********************************************************************
+
+"""
+This module contains :class:`Histogram`, which is used to collect timing statistics, for example
+of the simulation cycles, in constant memory.
+"""
+
+from math import log2
+
+
+class Histogram:
+    """
+    A histogram of durations with logarithmically spaced bins. Adding a value takes constant
+    time and the memory does not grow with the number of values, so it's suitable for recording
+    a value in every simulation cycle:
+
+    .. sourcecode:: Python
+
+        histogram = Histogram()
+        histogram.add(0.0012)
+        histogram.add(0.0031)
+
+        histogram.percentile(50)  # Upper edge of the bin that contains the median
+
+    Count, mean and maximum are exact, percentiles are the upper edge of the bin that
+    contains the requested percentile (but never more than the maximum), so their relative
+    error is bounded by the bin width, which is about 9% with the default of 8 bins per
+    factor of two. Values below ``minimum`` are counted in the first bin, values above
+    ``maximum`` in the last one.
+
+    :param minimum: Lower edge of the second bin, smaller values end up in the first bin.
+    :param maximum: Values larger than this are counted in the last bin.
+    :param bins_per_octave: Number of bins per factor of two.
+    """
+
+    def __init__(self, minimum=1e-6, maximum=1e3, bins_per_octave=8):
+        self._minimum = minimum
+        self._bins_per_octave = bins_per_octave
+        self._bins = [0] * (int(log2(maximum / minimum) * bins_per_octave) + 2)
+
+        self._count = 0
+        self._sum = 0.0
+        self._max = 0.0
+
+    def add(self, value):
+        """
+        Adds a value to the histogram.
+
+        :param value: Value to add, usually a duration in seconds.
+        """
+        if value < self._minimum:
+            index = 0
+        else:
+            index = min(
+                int(log2(value / self._minimum) * self._bins_per_octave) + 1,
+                len(self._bins) - 1,
+            )
+
+        self._bins[index] += 1
+        self._count += 1
+        self._sum += value
+
+        if value > self._max:
+            self._max = value
+
+    def reset(self):
+        """Removes all values from the histogram."""
+        self._bins = [0] * len(self._bins)
+        self._count = 0
+        self._sum = 0.0
+        self._max = 0.0
+
+    @property
+    def count(self):
+        """Number of values in the histogram."""
+        return self._count
+
+    @property
+    def mean(self):
+        """Mean of all values or 0 if the histogram is empty."""
+        return self._sum / self._count if self._count else 0.0
+
+    @property
+    def max(self):
+        """Largest value in the histogram or 0 if the histogram is empty."""
+        return self._max
+
+    def percentile(self, percent):
+        """
+        Returns an upper bound for the specified percentile of the values in the histogram.
+
+        :param percent: Percentile between 0 and 100.
+        :return: Upper edge of the bin that contains the percentile or 0 if the histogram is
+                 empty.
+        """
+        if not self._count:
+            return 0.0
+
+        rank = percent / 100.0 * self._count
+        cumulative = 0
+
+        for index, count in enumerate(self._bins):
+            cumulative += count
+
+            if count and cumulative >= rank:
+                if index == len(self._bins) - 1:
+                    break
+
+                upper_edge = self._minimum * 2 ** (index / self._bins_per_octave)
+                return min(upper_edge, self._max)
+
+        return self._max
+
+    def summary(self):
+        """
+        Returns a dictionary with count, mean, p50, p99 and max of the values.
+        """
+        return {
+            "count": self._count,
+            "mean": self.mean,
+            "p50": self.percentile(50),
+            "p99": self.percentile(99),
+            "max": self._max,
+        }
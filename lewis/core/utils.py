@@ -30,9 +30,14 @@ from datetime import datetime
 from os import listdir
 from os import path as osp
 
+from lewis.core.clock import get_clock
 from lewis.core.exceptions import LewisException, LimitViolationException
 from lewis.core.logging import has_log
 
+# Types of values that can not be modified in place, so they can be shared and compared
+# without copying them.
+IMMUTABLE_TYPES = (type(None), bool, int, float, complex, str, bytes, tuple, frozenset)
+
 
 @has_log
 def get_submodules(module):
@@ -155,11 +160,16 @@ def dict_strict_update(base_dict, update_dict):
 def seconds_since(start):
     """
     This is a small helper function that returns the elapsed seconds
-    since start using datetime.datetime.now().
+    since start. The start time is either a timestamp in nanoseconds that
+    has been obtained from the default clock (see :mod:`lewis.core.clock`)
+    or a datetime object, in which case datetime.datetime.now() is used.
 
     :param start: Start time.
     :return: Elapsed seconds since start time.
     """
+    if isinstance(start, int):
+        return get_clock().seconds_since(start)
+
     return (datetime.now() - start).total_seconds()
 
 
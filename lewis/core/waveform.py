@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+# *********************************************************************
+# lewis - a library for creating hardware device simulators
+# Copyright (C) 2016-2020 European Spallation Source ERIC
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# *********************************************************************
+
+"""
+This module contains :class:`Waveform`, an array of values for devices that expose data such
+as histories, traces or histograms, for example via waveform PVs of the EPICS adapter. It
+requires NumPy.
+"""
+
+from itertools import count
+
+from lewis.core.utils import FromOptionalDependency
+
+asarray, ndarray, zeros = FromOptionalDependency("numpy").do_import(
+    "asarray", "ndarray", "zeros"
+)
+
+
+class Waveform:
+    """
+    A one-dimensional NumPy array with a version that is incremented each time the values are
+    modified, so that readers can detect changes without comparing the values:
+
+    .. sourcecode:: Python
+
+        class SomeDevice(Device):
+            def __init__(self):
+                super(SomeDevice, self).__init__()
+                self.speed_trace = Waveform(1000)
+                self.phase_errors = Waveform(100, dtype=int)
+
+            def doProcess(self, dt):
+                self.speed_trace.append(self.speed)
+                self.phase_errors[self._get_bin()] += 1
+
+    All modifications must go through the methods of this class. Reading via :attr:`values`,
+    indexing or ``numpy.asarray`` returns read-only views instead of copies. The values are
+    copied the next time the waveform is modified after such a view has been created, so
+    views and copies of the waveform made with ``copy.copy`` keep the values they had at that
+    time.
+
+    :param data: Initial values or the length of a waveform that is filled with zeros.
+    :param dtype: NumPy data type of the values.
+    """
+
+    _ids = count()
+
+    def __init__(self, data, dtype=float):
+        if isinstance(data, int):
+            self._array = zeros(data, dtype=dtype)
+        else:
+            self._array = asarray(data, dtype=dtype).flatten()
+
+        self._shared = False
+        self._id = next(self._ids)
+        self._version = 0
+
+    @property
+    def version(self):
+        """
+        Tuple that identifies the waveform and the number of times it has been modified. It
+        is different for waveforms that are not unmodified copies of each other. A waveform
+        that shares its values with a copy or a view takes a new identity when it is modified,
+        so that copies which are modified independently do not report the same version.
+        """
+        return self._id, self._version
+
+    @property
+    def values(self):
+        """Read-only view of the current values."""
+        self._shared = True
+
+        view = self._array.view()
+        view.flags.writeable = False
+
+        return view
+
+    def __len__(self):
+        return len(self._array)
+
+    def __getitem__(self, key):
+        item = self._array[key]
+
+        # Single values are copies, slices are views that must not be modified
+        if isinstance(item, ndarray):
+            self._shared = True
+            item.flags.writeable = False
+
+        return item
+
+    def __setitem__(self, key, value):
+        self._get_writable()[key] = value
+
+    def __array__(self, dtype=None, copy=None):
+        if dtype is None and not copy:
+            return self.values
+
+        return self._array.astype(dtype or self._array.dtype)
+
+    def __copy__(self):
+        self._shared = True
+
+        other = type(self).__new__(type(self))
+        other.__dict__.update(self.__dict__)
+
+        return other
+
+    def fill(self, value):
+        """
+        Sets all values.
+
+        :param value: New value.
+        """
+        self._get_writable().fill(value)
+
+    def append(self, values):
+        """
+        Moves the values towards the start of the waveform and stores the new values at the end,
+        the oldest values are discarded. This can be used to record a history of values.
+
+        :param values: Single value or sequence of values.
+        """
+        values = asarray(values, dtype=self._array.dtype).reshape(-1)
+        array = self._get_writable()
+
+        if len(values) >= len(array):
+            array[:] = values[len(values) - len(array) :]
+        elif len(values):
+            array[: -len(values)] = array[len(values) :]
+            array[-len(values) :] = values
+
+    def _get_writable(self):
+        if self._shared:
+            self._array = self._array.copy()
+            self._shared = False
+            self._id = next(self._ids)
+
+        self._version += 1
+
+        return self._array
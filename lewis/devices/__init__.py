@@ -75,6 +75,10 @@ class StateMachineDevice(DeviceBase, CanProcessComposite):
     Having this in a separate method from ``__init__`` has the advantage that it can be used
     to reset those variables at a later stage, without having to write the same code again.
 
+    Devices that spend a lot of time in states where nothing happens until a command is
+    received can additionally override :meth:`_get_steady_states`, so that the simulation
+    does not need to process them in every cycle while they are in one of those states.
+
     Following this scheme, inheriting from StateMachineDevice also provides the possibility
     for users of the class to override the states, the transitions, the initial state and
     even the data. For states, transitions and data, dicts need to be passed to the
@@ -127,6 +131,12 @@ class StateMachineDevice(DeviceBase, CanProcessComposite):
 
         self.add_processor(self._csm)
 
+        overridden_states = set(override_states or {}) | {
+            source for source, _ in (override_transitions or {})
+        }
+        self._steady_states = set(self._get_steady_states()) - overridden_states
+        self._state_unchanged = False
+
     def _get_state_handlers(self):
         """
         Implement this method to return a dict-like object with state handlers
@@ -163,6 +173,37 @@ class StateMachineDevice(DeviceBase, CanProcessComposite):
             "_get_transition_handlers must be implemented in a StateMachineDevice."
         )
 
+    def _get_steady_states(self):
+        """
+        Implement this method to return the states in which the device does not change until it
+        is accessed from outside. In these states, the in_state handlers must not do anything
+        and all outgoing transitions must only depend on data that is modified via the device's
+        interfaces, such as commands or setpoints. States for which handlers or transitions are
+        overridden on construction are not considered steady. The default implementation
+        returns an empty tuple.
+
+        :return: An iterable with the names of the steady states.
+        """
+        return ()
+
+    def get_quiescent_time(self):
+        """
+        A StateMachineDevice is quiescent indefinitely if it is in one of the states returned by
+        :meth:`_get_steady_states` and did not enter that state in the last cycle, because
+        the on_entry handler may have triggered the next transition.
+        """
+        if self._state_unchanged and self._csm.state in self._steady_states:
+            return float("inf")
+
+        return 0.0
+
+    def process(self, dt=0):
+        state = self._csm.state
+
+        super(StateMachineDevice, self).process(dt)
+
+        self._state_unchanged = self._csm.state == state
+
     def _initialize_data(self):
         """
         Implement this method to initialize data members of the device, such as temperature,
@@ -78,6 +78,14 @@ class SimulatedBearings(CanProcess, MagneticBearings):
 class SimulatedChopper(StateMachineDevice):
     _bearings = None
 
+    # Setpoints only change on request, speed and phase change in every cycle while moving
+    tracked_attributes = (
+        "target_speed",
+        "target_phase",
+        "target_parking_position",
+        "auto_park",
+    )
+
     def _initialize_data(self):
         self.speed = 0.0
         self.target_speed = 0.0
@@ -117,6 +125,9 @@ class SimulatedChopper(StateMachineDevice):
     def _get_initial_state(self):
         return "init"
 
+    def _get_steady_states(self):
+        return "init", "stopped", "parked", "phase_locked"
+
     def _get_transition_handlers(self):
         return OrderedDict(
             [
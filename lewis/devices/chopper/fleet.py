@@ -0,0 +1,557 @@
+# -*- coding: utf-8 -*-
+# *********************************************************************
+# lewis - a library for creating hardware device simulators
+# Copyright (C) 2016-2020 European Spallation Source ERIC
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# *********************************************************************
+
+"""
+This module contains :class:`ChopperFleet`, a vectorized counterpart of
+:class:`~lewis.devices.chopper.devices.device.SimulatedChopper` that simulates a large number of
+chopper discs with NumPy array operations, and :class:`ChopperDisc`, which exposes a single disc
+of the fleet with the same interface as a SimulatedChopper.
+"""
+
+from lewis.core.devices import DeviceBuilder
+from lewis.core.simulation import Simulation, SimulationHost
+from lewis.core.utils import FromOptionalDependency
+from lewis.devices import Device, chopper
+
+full, isin, sign, where, zeros = FromOptionalDependency(
+    "numpy",
+    "NumPy is required for the ChopperFleet, install it with 'pip install lewis[numpy]'.",
+).do_import("full", "isin", "sign", "where", "zeros")
+
+# State codes of the discs, _NOT_STARTED corresponds to a state machine that has not been
+# processed yet.
+_NOT_STARTED = -1
+(
+    _INIT,
+    _BEARINGS,
+    _STOPPED,
+    _STOPPING,
+    _ACCELERATING,
+    _PHASE_LOCKING,
+    _PHASE_LOCKED,
+    _IDLE,
+    _PARKING,
+    _PARKED,
+) = range(10)
+
+_STATE_NAMES = (
+    "init",
+    "bearings",
+    "stopped",
+    "stopping",
+    "accelerating",
+    "phase_locking",
+    "phase_locked",
+    "idle",
+    "parking",
+    "parked",
+)
+
+# State codes of the magnetic bearings, see SimulatedBearings
+_BEARINGS_NOT_STARTED = -1
+_RESTING, _LEVITATING, _LEVITATED, _DELEVITATING = range(4)
+
+# Same order as SimulatedChopper._get_transition_handlers, the conditions are the names of the
+# boolean arrays that ChopperFleet._get_conditions returns.
+_TRANSITIONS = (
+    (_INIT, _BEARINGS, "initialized"),
+    (_BEARINGS, _STOPPED, "bearings_ready"),
+    (_BEARINGS, _INIT, "bearings_idle"),
+    (_PARKING, _PARKED, "parking_position_reached"),
+    (_PARKING, _STOPPING, "stop_commanded"),
+    (_PARKED, _STOPPING, "stop_commanded"),
+    (_PARKED, _ACCELERATING, "start_commanded"),
+    (_STOPPED, _ACCELERATING, "start_commanded"),
+    (_STOPPED, _PARKING, "park_commanded"),
+    (_STOPPED, _BEARINGS, "shutdown_commanded"),
+    (_ACCELERATING, _STOPPING, "stop_commanded"),
+    (_ACCELERATING, _IDLE, "idle_commanded"),
+    (_ACCELERATING, _PHASE_LOCKING, "speed_reached"),
+    (_IDLE, _ACCELERATING, "start_commanded"),
+    (_IDLE, _STOPPING, "stop_commanded"),
+    (_PHASE_LOCKING, _STOPPING, "stop_commanded"),
+    (_PHASE_LOCKING, _PHASE_LOCKED, "phase_reached"),
+    (_PHASE_LOCKING, _IDLE, "idle_commanded"),
+    (_PHASE_LOCKED, _ACCELERATING, "start_commanded"),
+    (_PHASE_LOCKED, _PHASE_LOCKING, "phase_commanded"),
+    (_PHASE_LOCKED, _STOPPING, "stop_commanded"),
+    (_PHASE_LOCKED, _IDLE, "idle_commanded"),
+    (_STOPPING, _ACCELERATING, "start_commanded"),
+    (_STOPPING, _STOPPED, "speed_zero"),
+    (_STOPPING, _IDLE, "idle_commanded"),
+)
+
+# Same as SimulatedChopper._get_steady_states
+_STEADY_STATES = (_INIT, _STOPPED, _PARKED, _PHASE_LOCKED)
+
+_TARGET_STATES = {
+    state: {target for source, target, _ in _TRANSITIONS if source == state}
+    for state in range(len(_STATE_NAMES))
+}
+
+
+def _linear(current, target, rate, dt):
+    """Vectorized version of :func:`lewis.core.approaches.linear`."""
+    direction = sign(target - current)
+    new_value = current + direction * rate * dt
+
+    return where(direction * new_value > direction * target, target, new_value)
+
+
+class ChopperFleet(Device):
+    """
+    This device simulates a number of chopper discs that behave exactly like
+    :class:`~lewis.devices.chopper.devices.device.SimulatedChopper`, but instead of one state
+    machine per disc, the state, speed, phase and parking position of all discs and their
+    setpoints are stored in NumPy arrays. Each call to :meth:`process` advances all discs
+    at once with a few array operations, which makes it possible to simulate hundreds of
+    choppers in a single process.
+
+    The individual discs are available in :attr:`discs` as :class:`ChopperDisc` objects, which
+    provide the same interface as SimulatedChopper, so that the chopper's adapters can be
+    used with them. The easiest way to run a fleet is :meth:`create_host`, which creates a
+    :class:`~lewis.core.simulation.SimulationHost` that processes the fleet and has one member
+    simulation per disc:
+
+    .. sourcecode:: Python
+
+        fleet = ChopperFleet(200)
+        host = fleet.create_host(
+            [{'epics': {'prefix': 'CHOP{}:'.format(i)}} for i in range(200)],
+            control_server='127.0.0.1:10000')
+
+        host.start()
+
+    The rates correspond to the default parameters of the states in
+    :mod:`lewis.devices.chopper.devices.states`. This device requires NumPy.
+
+    :param discs: Number of discs in the fleet.
+    :param acceleration: Rate of speed change when accelerating and stopping.
+    :param idle_acceleration: Rate of speed change in the idle state.
+    :param parking_speed: Rate at which the parking position changes.
+    :param phase_locking_speed: Rate at which the phase changes.
+    """
+
+    _float_data = (
+        "speed",
+        "target_speed",
+        "phase",
+        "target_phase",
+        "parking_position",
+        "target_parking_position",
+    )
+
+    _bool_data = (
+        "auto_park",
+        "_park_commanded",
+        "_stop_commanded",
+        "_start_commanded",
+        "_idle_commanded",
+        "_phase_commanded",
+        "_shutdown_commanded",
+        "_initialized",
+    )
+
+    def __init__(
+        self,
+        discs,
+        acceleration=5.0,
+        idle_acceleration=0.05,
+        parking_speed=5.0,
+        phase_locking_speed=5.0,
+    ):
+        super(ChopperFleet, self).__init__()
+
+        self._acceleration = acceleration
+        self._idle_acceleration = idle_acceleration
+        self._parking_speed = parking_speed
+        self._phase_locking_speed = phase_locking_speed
+
+        self._state = full(discs, _NOT_STARTED, dtype=int)
+        self._bearings_state = full(discs, _BEARINGS_NOT_STARTED, dtype=int)
+        self._levitate = zeros(discs, dtype=bool)
+        self._state_unchanged = False
+
+        for name in self._float_data:
+            setattr(self, name, zeros(discs, dtype=float))
+
+        for name in self._bool_data:
+            setattr(self, name, zeros(discs, dtype=bool))
+
+        self._discs = [ChopperDisc(self, index) for index in range(discs)]
+
+    def _initialize_data(self, mask):
+        """Resets the data of the discs selected by mask, like SimulatedChopper does in init."""
+        for name in self._float_data:
+            getattr(self, name)[mask] = 0.0
+
+        for name in self._bool_data:
+            getattr(self, name)[mask] = False
+
+    @property
+    def discs(self):
+        """List of :class:`ChopperDisc` objects, one for each disc of the fleet."""
+        return self._discs
+
+    @property
+    def states(self):
+        """List with the current state of each disc."""
+        return [disc.state for disc in self._discs]
+
+    def get_quiescent_time(self):
+        """
+        The fleet is quiescent if all discs are in steady states and no disc changed its state
+        in the last cycle, in the same way as a SimulatedChopper.
+        """
+        if self._state_unchanged and isin(self._state, _STEADY_STATES).all():
+            return float("inf")
+
+        return 0.0
+
+    def _get_conditions(self):
+        bearings_ready = (self._bearings_state == _LEVITATED) & self._levitate
+        bearings_idle = (self._bearings_state == _RESTING) & ~self._levitate
+
+        return {
+            "initialized": self._initialized,
+            "bearings_ready": bearings_ready,
+            "bearings_idle": bearings_idle,
+            "parking_position_reached": self.parking_position
+            == self.target_parking_position,
+            "stop_commanded": self._stop_commanded,
+            "start_commanded": self._start_commanded,
+            "park_commanded": self._park_commanded,
+            "shutdown_commanded": self._shutdown_commanded,
+            "idle_commanded": self._idle_commanded,
+            "phase_commanded": self._phase_commanded,
+            "speed_reached": self.speed == self.target_speed,
+            "phase_reached": self.phase == self.target_phase,
+            "speed_zero": self.speed == 0.0,
+        }
+
+    def doProcess(self, dt):
+        entering = self._state == _NOT_STARTED
+        self._state[entering] = _INIT
+        self._initialize_data(entering)
+
+        # At most one transition per disc and cycle, the first matching one wins
+        conditions = self._get_conditions()
+        new_state = self._state.copy()
+        transitioned = entering.copy()
+
+        for source, target, condition in _TRANSITIONS:
+            fire = (self._state == source) & conditions[condition] & ~transitioned
+            new_state[fire] = target
+            transitioned |= fire
+
+        changed = new_state != self._state
+        self._state = new_state
+        self._state_unchanged = not (changed.any() or entering.any())
+
+        self._on_entry(changed)
+        self._in_state(~entering, dt)
+
+    def _on_entry(self, changed):
+        state = self._state
+
+        self._initialize_data(changed & (state == _INIT))
+        self._park_commanded[changed & (state == _PARKING)] = False
+        self._stop_commanded[changed & (state == _STOPPING)] = False
+        self._park_commanded[changed & (state == _STOPPED) & self.auto_park] = True
+        self._start_commanded[changed & (state == _ACCELERATING)] = False
+        self._phase_commanded[changed & (state == _PHASE_LOCKING)] = False
+
+        # DefaultIdleState does not reset the idle command on entry, so it is not reset here
+        # either to keep the behavior identical.
+
+    def _in_state(self, active, dt):
+        state = self._state
+
+        bearings = active & (state == _BEARINGS)
+        if bearings.any():
+            self._process_bearings(bearings)
+
+        parking = active & (state == _PARKING)
+        self.parking_position = where(
+            parking,
+            _linear(
+                self.parking_position,
+                self.target_parking_position,
+                self._parking_speed,
+                dt,
+            ),
+            self.parking_position,
+        )
+
+        stopping = active & (state == _STOPPING)
+        accelerating = active & (state == _ACCELERATING)
+        idle = active & (state == _IDLE)
+
+        speed = where(
+            stopping, _linear(self.speed, 0.0, self._acceleration, dt), self.speed
+        )
+        speed = where(
+            accelerating,
+            _linear(self.speed, self.target_speed, self._acceleration, dt),
+            speed,
+        )
+        self.speed = where(
+            idle,
+            _linear(self.speed, self.target_speed, self._idle_acceleration, dt),
+            speed,
+        )
+
+        phase_locking = active & (state == _PHASE_LOCKING)
+        self.phase = where(
+            phase_locking,
+            _linear(self.phase, self.target_phase, self._phase_locking_speed, dt),
+            self.phase,
+        )
+
+    def _process_bearings(self, mask):
+        bearings_state = self._bearings_state
+
+        entering = mask & (bearings_state == _BEARINGS_NOT_STARTED)
+        mask = mask & ~entering
+
+        new_state = bearings_state.copy()
+        new_state[entering] = _RESTING
+        new_state[mask & (bearings_state == _RESTING) & self._levitate] = _LEVITATING
+        new_state[mask & (bearings_state == _LEVITATING)] = _LEVITATED
+        new_state[mask & (bearings_state == _LEVITATED) & ~self._levitate] = (
+            _DELEVITATING
+        )
+        new_state[mask & (bearings_state == _DELEVITATING)] = _RESTING
+
+        self._bearings_state = new_state
+
+    def create_host(self, protocols=None, control_server=None, name_format="disc{}"):
+        """
+        Creates a :class:`~lewis.core.simulation.SimulationHost` that processes this fleet. Each
+        disc is added as a member simulation, named according to name_format, with adapters
+        for the chopper's protocols, which use the device lock of the host.
+
+        :param protocols: List with one dictionary of protocol options per disc, in the format
+                          of :meth:`SimulationFactory.create
+                          <lewis.core.simulation.SimulationFactory.create>`, or None.
+        :param control_server: 'host:port'-string for the control server of the host or None.
+        :param name_format: Format string for the member names, formatted with the disc index.
+        :return: SimulationHost with the fleet as device and one member simulation per disc.
+        """
+        if protocols is not None and len(protocols) != len(self._discs):
+            raise RuntimeError(
+                "Protocols must be specified for each of the {} discs.".format(
+                    len(self._discs)
+                )
+            )
+
+        device_builder = DeviceBuilder(chopper)
+
+        host = SimulationHost(control_server=control_server, device=self)
+
+        for index, disc in enumerate(self._discs):
+            adapters = []
+            disc_protocols = protocols[index] if protocols is not None else {}
+
+            for protocol, options in disc_protocols.items():
+                interface = device_builder.create_interface(protocol)
+                interface.device = disc
+
+                adapter = interface.adapter(options=options or {})
+                adapter.interface = interface
+
+                adapters.append(adapter)
+
+            # The discs are views of the fleet, which is processed under the lock of the host
+            host.add_simulation(
+                name_format.format(index),
+                Simulation(device=disc, adapters=adapters),
+                share_device_lock=True,
+            )
+
+        return host
+
+
+class ChopperDisc(Device):
+    """
+    A single disc of a :class:`ChopperFleet`. It has the same properties and methods as
+    :class:`~lewis.devices.chopper.devices.device.SimulatedChopper`, but all values are stored
+    in the arrays of the fleet. Processing a disc does nothing, the discs are advanced by
+    processing the fleet.
+
+    :param fleet: The fleet the disc belongs to.
+    :param index: Index of the disc in the fleet.
+    """
+
+    def __init__(self, fleet, index):
+        super(ChopperDisc, self).__init__()
+
+        self._fleet = fleet
+        self._index = index
+
+    def get_quiescent_time(self):
+        """The discs do not change on their own, only the fleet does."""
+        return float("inf")
+
+    def _get_float(self, name):
+        return float(getattr(self._fleet, name)[self._index])
+
+    def _set_float(self, name, value):
+        getattr(self._fleet, name)[self._index] = value
+
+    def _get_flag(self, name):
+        return bool(getattr(self._fleet, name)[self._index])
+
+    def _set_flag(self, name, value=True):
+        getattr(self._fleet, name)[self._index] = value
+
+    def _can(self, state):
+        current = self._fleet._state[self._index]
+
+        if current == _NOT_STARTED:
+            return state == _INIT
+
+        return state in _TARGET_STATES[current]
+
+    @property
+    def index(self):
+        """Index of the disc in the fleet."""
+        return self._index
+
+    @property
+    def speed(self):
+        return self._get_float("speed")
+
+    @speed.setter
+    def speed(self, value):
+        self._set_float("speed", value)
+
+    @property
+    def target_speed(self):
+        return self._get_float("target_speed")
+
+    @target_speed.setter
+    def target_speed(self, value):
+        self._set_float("target_speed", value)
+
+    @property
+    def phase(self):
+        return self._get_float("phase")
+
+    @phase.setter
+    def phase(self, value):
+        self._set_float("phase", value)
+
+    @property
+    def target_phase(self):
+        return self._get_float("target_phase")
+
+    @target_phase.setter
+    def target_phase(self, value):
+        self._set_float("target_phase", value)
+
+    @property
+    def parking_position(self):
+        return self._get_float("parking_position")
+
+    @parking_position.setter
+    def parking_position(self, value):
+        self._set_float("parking_position", value)
+
+    @property
+    def target_parking_position(self):
+        return self._get_float("target_parking_position")
+
+    @target_parking_position.setter
+    def target_parking_position(self, value):
+        self._set_float("target_parking_position", value)
+
+    @property
+    def auto_park(self):
+        return self._get_flag("auto_park")
+
+    @auto_park.setter
+    def auto_park(self, value):
+        self._set_flag("auto_park", bool(value))
+
+    @property
+    def state(self):
+        """
+        The current state of the chopper. This parameter is read-only, it is
+        determined by the state of the disc in the fleet.
+        """
+        state = self._fleet._state[self._index]
+
+        return _STATE_NAMES[state] if state != _NOT_STARTED else None
+
+    @property
+    def initialized(self):
+        return self._get_flag("_initialized")
+
+    def initialize(self):
+        if self._can(_BEARINGS) and not self.initialized:
+            self._set_flag("_initialized")
+            self._set_flag("_levitate")
+
+    def deinitialize(self):
+        if self._can(_BEARINGS) and self.initialized:
+            self._set_flag("_shutdown_commanded")
+            self._set_flag("_levitate", False)
+
+    def park(self):
+        if self._can(_PARKING):
+            self._set_flag("_park_commanded")
+
+    @property
+    def parked(self):
+        return self.state == "parked"
+
+    def stop(self):
+        if self._can(_STOPPING):
+            self._set_flag("_stop_commanded")
+
+    @property
+    def stopped(self):
+        return self.state == "stopped"
+
+    def start(self):
+        if self._can(_ACCELERATING) and self.target_speed > 0.0:
+            self._set_flag("_start_commanded")
+        else:
+            self.stop()
+
+    @property
+    def started(self):
+        return self.state == "accelerating"
+
+    def unlock(self):
+        if self._can(_IDLE):
+            self._set_flag("_idle_commanded")
+
+    @property
+    def idle(self):
+        return self.state == "idle"
+
+    def lock_phase(self):
+        if self._can(_PHASE_LOCKING):
+            self._set_flag("_phase_commanded")
+
+    @property
+    def phase_locked(self):
+        return self.state == "phase_locked"
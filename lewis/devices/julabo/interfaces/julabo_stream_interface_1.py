@@ -29,13 +29,24 @@ class JulaboStreamInterfaceV1(StreamInterface):
     protocol = "julabo-version-1"
 
     commands = {
-        Var("temperature", read_pattern="^IN_PV_00$", doc="The bath temperature."),
+        Var(
+            "temperature",
+            read_pattern="^IN_PV_00$",
+            doc="The bath temperature.",
+            cached=True,
+        ),
         Var(
             "external_temperature",
             read_pattern="^IN_PV_01$",
             doc="The external temperature.",
+            cached=True,
+        ),
+        Var(
+            "heating_power",
+            read_pattern="^IN_PV_02$",
+            doc="The heating power.",
+            cached=True,
         ),
-        Var("heating_power", read_pattern="^IN_PV_02$", doc="The heating power."),
         Var(
             "set_point_temperature",
             read_pattern="^IN_SP_00$",
@@ -0,0 +1,396 @@
+# -*- coding: utf-8 -*-
+# *********************************************************************
+# lewis - a library for creating hardware device simulators
+# Copyright (C) 2016-2020 European Spallation Source ERIC
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# *********************************************************************
+
+import argparse
+import codecs
+import json
+import sys
+
+import yaml
+
+from lewis import __version__
+from lewis.core.benchmark import BenchmarkCommand, EpicsBenchmark, StreamBenchmark
+from lewis.core.exceptions import LewisException
+from lewis.core.logging import default_log_format, logging
+from lewis.core.simulation import SimulationFactory
+from lewis.scripts import get_usage_text
+
+presets = {
+    "julabo": {
+        "mix": {"IN_PV_00": 8, "IN_SP_00": 1, "OUT_SP_00 25.0": 1},
+        "request_terminator": "\\r",
+        "reply_terminator": "\\r\\n",
+    },
+    "linkam": {
+        "mix": {"T": 1},
+        "request_terminator": "\\r",
+        "reply_terminator": "\\r",
+    },
+    "chopper": {
+        "protocol": "epics",
+        "mix": {"Spd": [10.0, 20.0, 30.0], "CmdS": "start"},
+        "initial_puts": [["CmdS", "init"]],
+    },
+}
+
+parser = argparse.ArgumentParser(
+    description="This script benchmarks a simulation. For stream devices, it opens a number "
+    "of concurrent connections to a running simulation and sends requests from a weighted "
+    "command mix, optionally at a target rate. For EPICS devices, it runs the simulation "
+    "with the in-process ChannelAccess backend, monitors all PVs and puts values from the "
+    "mix, so that neither pcaspy nor EPICS base are required. Throughput and latency "
+    "percentiles are printed and can be stored as JSON to compare runs, for example:\n\n"
+    "lewis-bench stream 127.0.0.1:9999 -p julabo -c 10 -r 500 -j results.json\n"
+    "lewis-bench stream 127.0.0.1:9999 -m \"{IN_PV_00: 9, 'OUT_SP_00 25.0': 1}\"\n"
+    "lewis-bench epics chopper -p chopper -d 5\n"
+    'lewis-bench epics chopper -i "[[CmdS, init]]" -m "{Spd: [10, 20], Phs: 5}"',
+    formatter_class=argparse.RawDescriptionHelpFormatter,
+    add_help=False,
+    prog="lewis-bench",
+)
+
+positional_args = parser.add_argument_group("Positional arguments")
+positional_args.add_argument(
+    "protocol",
+    nargs="?",
+    choices=["stream", "epics"],
+    help="Protocol of the device to benchmark.",
+)
+positional_args.add_argument(
+    "target",
+    nargs="?",
+    help="HOST:PORT of the device adapter to benchmark for stream, "
+    "name of the device to simulate for epics.",
+)
+
+load_args = parser.add_argument_group("Load related parameters")
+load_args.add_argument(
+    "-p",
+    "--preset",
+    choices=sorted(presets.keys()),
+    default=None,
+    help="Command mix and terminators or puts for one of the included devices.",
+)
+load_args.add_argument(
+    "-m",
+    "--mix",
+    default=None,
+    help="For stream, YAML dictionary that maps requests to weights or to dictionaries "
+    "with the keys weight and reply, where reply is false for requests without reply. "
+    "For epics, YAML dictionary that maps PV names to a value or a list of values to put.",
+)
+load_args.add_argument(
+    "-i",
+    "--initial-puts",
+    default=None,
+    help="For epics, YAML list of PV name and value pairs to put before the benchmark.",
+)
+load_args.add_argument(
+    "-c",
+    "--connections",
+    type=int,
+    default=1,
+    help="Number of concurrent connections or clients that put values.",
+)
+load_args.add_argument(
+    "-r",
+    "--rate",
+    type=float,
+    default=0.0,
+    help="Target rate in requests or puts per second across all connections. "
+    "With the default of 0, requests are sent as fast as possible.",
+)
+load_args.add_argument(
+    "-d", "--duration", type=float, default=10.0, help="Duration in seconds."
+)
+load_args.add_argument(
+    "-t",
+    "--timeout",
+    type=float,
+    default=1.0,
+    help="Time in seconds to wait for a reply before the request is counted as timed out.",
+)
+load_args.add_argument(
+    "--request-terminator",
+    default=None,
+    help="Terminator to append to requests, escape sequences are supported. "
+    "Defaults to \\r.",
+)
+load_args.add_argument(
+    "--reply-terminator",
+    default=None,
+    help="Terminator that ends replies, escape sequences are supported. Defaults to \\r.",
+)
+load_args.add_argument(
+    "-s", "--seed", type=int, default=None, help="Seed for the choice of requests."
+)
+
+simulation_args = parser.add_argument_group(
+    "Simulation related parameters (epics only)"
+)
+simulation_args.add_argument(
+    "-k",
+    "--device-package",
+    default="lewis.devices",
+    help="Name of packages where devices are found.",
+)
+simulation_args.add_argument("--setup", default=None, help="Name of the setup to load.")
+
+other_args = parser.add_argument_group("Other arguments")
+other_args.add_argument(
+    "-j",
+    "--json",
+    default=None,
+    help="File to write the results to as JSON, use - for standard output.",
+)
+other_args.add_argument(
+    "-o",
+    "--output-level",
+    default="warning",
+    choices=["none", "critical", "error", "warning", "info", "debug"],
+    help="Level of detail for logging to stderr.",
+)
+other_args.add_argument(
+    "-v", "--version", action="store_true", help="Prints the version and exits."
+)
+other_args.add_argument(
+    "-h", "--help", action="help", help="Shows this help message and exits."
+)
+
+__doc__ = (
+    "To measure the throughput and latency of a simulation, use this script. "
+    "Usage:\n\n.. code-block:: none\n\n{}".format(get_usage_text(parser, indent=4))
+)
+
+
+def _load_yaml(value, name):
+    try:
+        return yaml.safe_load(value)
+    except yaml.YAMLError as e:
+        raise LewisException("Could not parse {}: {}".format(name, e))
+
+
+def get_benchmark(arguments):
+    """
+    Creates a :class:`~lewis.core.benchmark.StreamBenchmark` or an
+    :class:`~lewis.core.benchmark.EpicsBenchmark` from the parsed arguments.
+
+    :param arguments: Arguments parsed by the argument parser declared in this module.
+    :return: The benchmark.
+    """
+    if not arguments.protocol or not arguments.target:
+        raise LewisException(
+            "Please specify the protocol and HOST:PORT or name of the device."
+        )
+
+    preset = presets.get(arguments.preset, {})
+
+    if preset and preset.get("protocol", "stream") != arguments.protocol:
+        raise LewisException(
+            "The preset '{}' can not be used with {}.".format(
+                arguments.preset, arguments.protocol
+            )
+        )
+
+    if arguments.mix is not None:
+        mix = _load_yaml(arguments.mix, "command mix")
+    elif preset:
+        mix = preset["mix"]
+    else:
+        raise LewisException("Please specify a command mix or a preset.")
+
+    if arguments.protocol == "epics":
+        return get_epics_benchmark(arguments, preset, mix)
+
+    host, _, port = arguments.target.rpartition(":")
+
+    if not host or not port.isdigit():
+        raise LewisException(
+            "The address '{}' is not of the form HOST:PORT.".format(arguments.target)
+        )
+
+    def terminator(value, name):
+        if value is None:
+            value = preset.get(name, "\\r")
+
+        return codecs.decode(value, "unicode_escape")
+
+    return StreamBenchmark(
+        host,
+        int(port),
+        BenchmarkCommand.from_mix(mix),
+        connections=arguments.connections,
+        rate=arguments.rate,
+        duration=arguments.duration,
+        request_terminator=terminator(
+            arguments.request_terminator, "request_terminator"
+        ),
+        reply_terminator=terminator(arguments.reply_terminator, "reply_terminator"),
+        timeout=arguments.timeout,
+        seed=arguments.seed,
+    )
+
+
+def get_epics_benchmark(arguments, preset, mix):
+    """
+    Creates an :class:`~lewis.core.benchmark.EpicsBenchmark` for a simulation of the device
+    that is specified in the arguments, using the in-process ChannelAccess backend.
+
+    :param arguments: Arguments parsed by the argument parser declared in this module.
+    :param preset: Preset that was selected in the arguments or an empty dictionary.
+    :param mix: Dictionary that maps PV names to values.
+    :return: The benchmark.
+    """
+    if arguments.initial_puts is not None:
+        initial_puts = _load_yaml(arguments.initial_puts, "initial puts")
+    else:
+        initial_puts = preset.get("initial_puts", [])
+
+    if not isinstance(initial_puts, list) or not all(
+        isinstance(put, list) and len(put) == 2 for put in initial_puts
+    ):
+        raise LewisException("The initial puts must be a list of PV and value pairs.")
+
+    simulation_factory = SimulationFactory(arguments.device_package)
+
+    if arguments.target not in simulation_factory.devices:
+        raise LewisException(
+            "No device with name '{}' could be found.".format(arguments.target)
+        )
+
+    simulation = simulation_factory.create(
+        arguments.target,
+        arguments.setup,
+        protocols={"epics": {"backend": "inprocess"}},
+    )
+
+    return EpicsBenchmark(
+        simulation,
+        puts=mix,
+        initial_puts=initial_puts,
+        clients=arguments.connections,
+        rate=arguments.rate,
+        duration=arguments.duration,
+        timeout=arguments.timeout,
+        seed=arguments.seed,
+    )
+
+
+def format_latencies(latency):
+    return "p50 {:.3f} ms, p95 {:.3f} ms, p99 {:.3f} ms, max {:.3f} ms".format(
+        *(latency[key] * 1e3 for key in ("p50", "p95", "p99", "max"))
+    )
+
+
+def print_results(results):
+    if results["protocol"] == "epics":
+        print_epics_results(results)
+        return
+
+    print(
+        "{} requests in {:.2f} s over {} connection(s): {:.1f} requests/s".format(
+            results["requests"],
+            results["duration"],
+            results["connections"],
+            results["throughput"],
+        )
+    )
+    print("Timeouts: {}".format(results["timeouts"]))
+    print("Latency: {}".format(format_latencies(results["latency"])))
+
+    for request, command in results["commands"].items():
+        print(
+            "    {!r}: {} requests, {}".format(
+                request,
+                command["latency"]["count"],
+                format_latencies(command["latency"]),
+            )
+        )
+
+
+def print_epics_results(results):
+    print(
+        "{} puts in {:.2f} s from {} client(s): {:.1f} puts/s".format(
+            results["puts"],
+            results["duration"],
+            results["clients"],
+            results["throughput"],
+        )
+    )
+    print("Timeouts: {}, rejected: {}".format(results["timeouts"], results["rejected"]))
+    print("Put latency: {}".format(format_latencies(results["latency"])))
+
+    for pv, command in results["commands"].items():
+        print(
+            "    {}: {} puts, {}".format(
+                pv, command["latency"]["count"], format_latencies(command["latency"])
+            )
+        )
+
+    print(
+        "{} monitor updates of {} PV(s): {:.1f} updates/s".format(
+            results["updates"], results["pvs"], results["update_rate"]
+        )
+    )
+    print("Monitor latency: {}".format(format_latencies(results["update_latency"])))
+
+    for pv, monitor in results["monitors"].items():
+        if monitor["updates"]:
+            print(
+                "    {}: {} updates, {}".format(
+                    pv, monitor["updates"], format_latencies(monitor["latency"])
+                )
+            )
+
+
+def run_benchmark(argument_list=None):
+    """
+    This is the main function of ``lewis-bench``. Arguments passed in are parsed and used to
+    construct and run a :class:`~lewis.core.benchmark.StreamBenchmark` or an
+    :class:`~lewis.core.benchmark.EpicsBenchmark`.
+
+    :param argument_list: Argument list to pass to the argument parser declared in this module.
+    """
+    try:
+        arguments = parser.parse_args(argument_list or sys.argv[1:])
+
+        if arguments.version:
+            print(__version__)
+            return
+
+        if arguments.output_level != "none":
+            logging.basicConfig(
+                level=getattr(logging, arguments.output_level.upper()),
+                format=default_log_format,
+            )
+
+        benchmark = get_benchmark(arguments)
+        results = benchmark.run()
+
+        if arguments.json == "-":
+            print(json.dumps(results, indent=4))
+        else:
+            print_results(results)
+
+            if arguments.json is not None:
+                with open(arguments.json, "w") as fh:
+                    json.dump(results, fh, indent=4)
+
+    except LewisException as e:
+        print("\n".join(("An error occurred:", str(e))))
@@ -20,6 +20,7 @@
 
 import argparse
 import ast
+import json
 import sys
 
 from lewis import __version__
@@ -147,6 +148,13 @@ optional_args.add_argument(
     help="By default, no output is generated if the remote function returns None. "
     "Specifying this flag will force the client to print those None-values.",
 )
+optional_args.add_argument(
+    "-j",
+    "--json",
+    action="store_true",
+    help="Prints the value returned by the remote function as JSON, which is useful for "
+    "nested values such as the statistics of the simulation.",
+)
 optional_args.add_argument(
     "-v", "--version", action="store_true", help="Prints the version and exits."
 )
@@ -181,6 +189,6 @@ def control_simulation(argument_list=None):
                 response = call_method(remote, args.object, args.member, args.arguments)
 
                 if response is not None or args.print_none:
-                    print(response)
+                    print(json.dumps(response, indent=4) if args.json else response)
     except ProtocolException as e:
         print("\n".join(("An error occurred:", str(e))))
@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+# *********************************************************************
+# lewis - a library for creating hardware device simulators
+# Copyright (C) 2016-2020 European Spallation Source ERIC
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# *********************************************************************
+
+import argparse
+import os
+import sys
+
+import yaml
+
+from lewis import __version__
+from lewis.core.exceptions import LewisException
+from lewis.core.fleet import SimulationFleet
+from lewis.core.logging import default_log_format, logging
+from lewis.scripts import get_usage_text
+
+parser = argparse.ArgumentParser(
+    description="This script starts a fleet of simulated devices, distributed over a pool of "
+    "worker processes. The devices are specified in a YAML file, which maps a unique name "
+    "for each simulation to the device, setup and protocols to use, for example:\n\n"
+    "chopper1: {device: chopper, protocols: {epics: {prefix: 'CHOP1:'}}}\n"
+    "chopper2: {device: chopper, setup: default, protocols: {epics: {prefix: 'CHOP2:'}}}",
+    formatter_class=argparse.RawDescriptionHelpFormatter,
+    add_help=False,
+    prog="lewis-fleet",
+)
+
+positional_args = parser.add_argument_group("Positional arguments")
+positional_args.add_argument(
+    "config", nargs="?", help="YAML file with the specification of the simulations."
+)
+
+fleet_args = parser.add_argument_group("Fleet related parameters")
+fleet_args.add_argument(
+    "-w",
+    "--workers",
+    type=int,
+    default=None,
+    help="Number of worker processes. Defaults to the number of CPU cores.",
+)
+fleet_args.add_argument(
+    "-P",
+    "--no-pinning",
+    action="store_true",
+    help="Do not pin worker processes to CPU cores.",
+)
+fleet_args.add_argument(
+    "-r",
+    "--rpc-host",
+    default=None,
+    help="HOST:PORT format string for the aggregated control endpoint of the fleet. "
+    "Use lewis-control to access this service from the command line.",
+)
+fleet_args.add_argument(
+    "-k",
+    "--device-package",
+    default="lewis.devices",
+    help="Name of packages where devices are found.",
+)
+fleet_args.add_argument(
+    "-a",
+    "--add-path",
+    default=None,
+    help="Path where the device package exists. Is added to the path.",
+)
+fleet_args.add_argument(
+    "-c",
+    "--cycle-delay",
+    type=float,
+    default=0.1,
+    help="Approximate time to spend in each cycle of the simulation hosts.",
+)
+fleet_args.add_argument(
+    "--scheduler",
+    default="delay",
+    choices=["delay", "deadline"],
+    help="How the time between cycles is determined, see lewis --help.",
+)
+
+other_args = parser.add_argument_group("Other arguments")
+other_args.add_argument(
+    "-o",
+    "--output-level",
+    default="info",
+    choices=["none", "critical", "error", "warning", "info", "debug"],
+    help="Level of detail for logging to stderr.",
+)
+other_args.add_argument(
+    "-v", "--version", action="store_true", help="Prints the version and exits."
+)
+other_args.add_argument(
+    "-h", "--help", action="help", help="Shows this help message and exits."
+)
+
+__doc__ = (
+    "To run a large number of simulated devices in a pool of worker processes, use this "
+    "script. Usage:\n\n.. code-block:: none\n\n{}".format(
+        get_usage_text(parser, indent=4)
+    )
+)
+
+
+def load_simulations(config_file):
+    try:
+        with open(config_file) as fh:
+            simulations = yaml.safe_load(fh)
+    except (OSError, yaml.YAMLError) as e:
+        raise LewisException(
+            "Could not read fleet configuration '{}': {}".format(config_file, e)
+        )
+
+    if not isinstance(simulations, dict) or not all(
+        isinstance(spec, dict) and "device" in spec for spec in simulations.values()
+    ):
+        raise LewisException(
+            "The fleet configuration must map simulation names to specifications "
+            "that contain at least the device name."
+        )
+
+    return simulations
+
+
+def run_fleet(argument_list=None):
+    """
+    This is the main function of ``lewis-fleet``. Arguments passed in are parsed and used to
+    construct and run a :class:`~lewis.core.fleet.SimulationFleet`.
+
+    :param argument_list: Argument list to pass to the argument parser declared in this module.
+    """
+    try:
+        arguments = parser.parse_args(argument_list or sys.argv[1:])
+
+        if arguments.version:
+            print(__version__)
+            return
+
+        if not arguments.config:
+            raise LewisException("Please specify a fleet configuration file.")
+
+        if arguments.output_level != "none":
+            logging.basicConfig(
+                level=getattr(logging, arguments.output_level.upper()),
+                format=default_log_format,
+            )
+
+        if arguments.add_path is not None:
+            sys.path.append(os.path.abspath(arguments.add_path))
+
+        fleet = SimulationFleet(
+            load_simulations(arguments.config),
+            workers=arguments.workers,
+            devices_package=arguments.device_package,
+            control_server=arguments.rpc_host,
+            pin_workers=not arguments.no_pinning,
+            cycle_delay=arguments.cycle_delay,
+            scheduler=arguments.scheduler,
+        )
+
+        try:
+            fleet.start()
+        except KeyboardInterrupt:
+            print("\nInterrupt received; shutting down the fleet.")
+        finally:
+            fleet.stop()
+
+    except LewisException as e:
+        print("\n".join(("An error occurred:", str(e))))
@@ -20,6 +20,7 @@
 import argparse
 import os
 import sys
+from math import isfinite
 
 import yaml
 
@@ -123,6 +124,33 @@ simulation_args.add_argument(
     help="Approximate time to spend in each cycle of the simulation. "
     "0 for maximum simulation rate.",
 )
+simulation_args.add_argument(
+    "--scheduler",
+    default="delay",
+    choices=["delay", "deadline"],
+    help="How the time between cycles is determined. With 'delay', the simulation sleeps for "
+    "the cycle delay before each cycle, with 'deadline' cycles are scheduled at fixed "
+    "intervals so that processing time does not add to the cycle period.",
+)
+simulation_args.add_argument(
+    "--overrun-policy",
+    default="catch_up",
+    choices=["catch_up", "skip"],
+    help="How missed cycle deadlines are handled by the 'deadline' scheduler. Missed cycles "
+    "are either processed without sleeping until back on schedule or skipped.",
+)
+simulation_args.add_argument(
+    "--shared-reads",
+    action="store_true",
+    help="Allow read-only requests of adapters and control server to access the device "
+    "concurrently, only writes and device processing are exclusive.",
+)
+simulation_args.add_argument(
+    "--snapshots",
+    action="store_true",
+    help="Serve read-only requests of adapters and control server from a snapshot of the "
+    "device that is published after each cycle, without waiting for the device lock.",
+)
 simulation_args.add_argument(
     "-e",
     "--speed",
@@ -131,6 +159,15 @@ simulation_args.add_argument(
     help="Simulation speed. The actually elapsed time between two cycles is "
     "multiplied with this speed to determine the simulated time.",
 )
+simulation_args.add_argument(
+    "-u",
+    "--until",
+    default=None,
+    help="Run the simulation on a virtual clock as fast as possible until the specified "
+    "simulated time has passed, then exit. Units ms, s, m and h are supported, "
+    "for example 600s or 10m. Each cycle advances the simulation by the cycle "
+    "delay multiplied with the speed.",
+)
 simulation_args.add_argument(
     "-r",
     "--rpc-host",
@@ -216,6 +253,30 @@ def parse_adapter_options(raw_adapter_options):
     return protocols
 
 
+def parse_duration(raw_duration):
+    units = (("ms", 1e-3), ("s", 1.0), ("m", 60.0), ("h", 3600.0))
+
+    for unit, factor in units:
+        if raw_duration.endswith(unit) and raw_duration[: -len(unit)][-1:].isdigit():
+            raw_duration, scale = raw_duration[: -len(unit)], factor
+            break
+    else:
+        scale = 1.0
+
+    try:
+        duration = float(raw_duration) * scale
+    except ValueError:
+        raise LewisException(
+            "It was not possible to parse this duration: {}\n"
+            "Valid examples are: 600, 600s, 250ms, 10m, 1h".format(raw_duration)
+        )
+
+    if not isfinite(duration) or duration <= 0.0:
+        raise LewisException("The duration must be finite and positive.")
+
+    return duration
+
+
 def run_simulation(argument_list=None):  # noqa: C901
     """
     This is effectively the main function of a typical simulation run. Arguments passed in are
@@ -290,11 +351,27 @@ def run_simulation(argument_list=None):  # noqa: C901
             return
 
         simulation.cycle_delay = arguments.cycle_delay
+        simulation.scheduler = arguments.scheduler
+        simulation.overrun_policy = arguments.overrun_policy
         simulation.speed = arguments.speed
+        simulation.shared_reads = arguments.shared_reads
+        simulation.snapshots = arguments.snapshots
+
+        until = parse_duration(arguments.until) if arguments.until else None
+
+        if until is not None and arguments.cycle_delay * arguments.speed <= 0.0:
+            raise LewisException(
+                "Running until a simulated time requires a positive time step per cycle, "
+                "which is the cycle delay multiplied with the speed. Please specify a "
+                "positive cycle delay and speed, for example: -c 0.1 -e 1 -u 10m"
+            )
 
         if not arguments.verify:
             try:
-                simulation.start()
+                if until is not None:
+                    simulation.run_virtual(until=until)
+                else:
+                    simulation.start()
             except KeyboardInterrupt:
                 print("\nInterrupt received; shutting down. Goodbye, cruel world!")
                 simulation.log.critical("Simulation aborted by user interaction")
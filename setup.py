@@ -52,6 +52,7 @@ setup(
     install_requires=["pyzmq", "json-rpc", "semantic_version", "PyYAML", "scanf"],
     extras_require={
         "epics": ["pcaspy"],
+        "numpy": ["numpy"],
         "dev": [
             "flake8",
             "mock",
@@ -69,6 +70,8 @@ setup(
         "console_scripts": [
             "lewis=lewis.scripts.run:run_simulation",
             "lewis-control=lewis.scripts.control:control_simulation",
+            "lewis-fleet=lewis.scripts.fleet:run_fleet",
+            "lewis-bench=lewis.scripts.bench:run_benchmark",
         ],
     },
 )
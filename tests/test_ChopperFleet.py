@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+# *********************************************************************
+# lewis - a library for creating hardware device simulators
+# Copyright (C) 2016-2020 European Spallation Source ERIC
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# *********************************************************************
+
+import importlib.util
+import random
+import sys
+import unittest
+from threading import Event, Thread
+
+from mock import patch
+
+from lewis.core.exceptions import LewisException
+from lewis.core.simulation import SimulationHost
+from lewis.devices.chopper.devices.device import SimulatedChopper
+from lewis.devices.chopper.fleet import ChopperFleet
+
+
+class TestChopperFleet(unittest.TestCase):
+    def _start_disc(self, fleet, disc):
+        fleet.process(0.1)
+        disc.initialize()
+
+        for _ in range(4):
+            fleet.process(0.1)
+
+        self.assertEqual(disc.state, "stopped")
+
+        disc.target_speed = 10.0
+        disc.target_phase = 3.0
+        disc.start()
+        fleet.process(0.1)
+
+    def test_discs_are_independent(self):
+        fleet = ChopperFleet(3)
+
+        self._start_disc(fleet, fleet.discs[1])
+
+        self.assertEqual(fleet.states, ["init", "accelerating", "init"])
+
+        for _ in range(30):
+            fleet.process(0.1)
+
+        self.assertEqual(fleet.discs[1].state, "phase_locked")
+        self.assertEqual(fleet.discs[1].speed, 10.0)
+        self.assertEqual(fleet.discs[1].phase, 3.0)
+        self.assertEqual(fleet.discs[0].speed, 0.0)
+
+    def test_commands_are_ignored_in_invalid_states(self):
+        fleet = ChopperFleet(1)
+        disc = fleet.discs[0]
+
+        disc.initialize()
+        self.assertFalse(disc.initialized)
+
+        fleet.process(0.1)
+        disc.park()
+        disc.lock_phase()
+        fleet.process(0.1)
+
+        self.assertEqual(disc.state, "init")
+
+    def test_behaves_like_simulated_chopper(self):
+        rng = random.Random(42)
+
+        choppers = [SimulatedChopper() for _ in range(10)]
+        fleet = ChopperFleet(len(choppers))
+
+        commands = [
+            "initialize",
+            "deinitialize",
+            "park",
+            "stop",
+            "start",
+            "unlock",
+            "lock_phase",
+        ]
+        setpoints = ["target_speed", "target_phase", "target_parking_position"]
+
+        for cycle in range(1000):
+            for chopper, disc in zip(choppers, fleet.discs):
+                if rng.random() < 0.05:
+                    command = rng.choice(commands)
+                    getattr(chopper, command)()
+                    getattr(disc, command)()
+
+                if rng.random() < 0.03:
+                    setpoint = rng.choice(setpoints)
+                    value = rng.choice([0.0, 1.25, 3.0, 10.5])
+                    setattr(chopper, setpoint, value)
+                    setattr(disc, setpoint, value)
+
+                if rng.random() < 0.01:
+                    chopper.auto_park = disc.auto_park = not chopper.auto_park
+
+            dt = rng.choice([0.05, 0.1, 0.3])
+
+            for chopper in choppers:
+                chopper.process(dt)
+            fleet.process(dt)
+
+            for chopper, disc in zip(choppers, fleet.discs):
+                for name in ["state", "speed", "phase", "parking_position"]:
+                    self.assertEqual(
+                        getattr(chopper, name),
+                        getattr(disc, name),
+                        "{} differs in cycle {}".format(name, cycle),
+                    )
+
+    def test_create_host(self):
+        fleet = ChopperFleet(3)
+        host = fleet.create_host(name_format="chopper{}")
+
+        self.assertIsInstance(host, SimulationHost)
+        self.assertEqual(host.simulations, ["chopper0", "chopper1", "chopper2"])
+
+        host.run_virtual(until=0.5, dt=0.1)
+
+        self.assertEqual(fleet.states, ["init"] * 3)
+        self.assertAlmostEqual(host.runtime, 0.5)
+
+    def test_member_writes_wait_for_fleet_processing(self):
+        fleet = ChopperFleet(2)
+        host = fleet.create_host()
+
+        processing = Event()
+        proceed = Event()
+        do_process = fleet.doProcess
+
+        def blocking_process(dt):
+            processing.set()
+            proceed.wait(1.0)
+            do_process(dt)
+
+        fleet.doProcess = blocking_process
+
+        def write():
+            # This is how the adapters of the member simulation access the disc
+            with host._simulations["disc1"]._adapters.device_lock:
+                fleet.discs[1].speed = 5.0
+
+        advance = Thread(target=host._advance, args=(0.1,))
+        advance.start()
+        self.assertTrue(processing.wait(1.0))
+
+        writer = Thread(target=write)
+        writer.start()
+        writer.join(0.1)
+        self.assertTrue(writer.is_alive())
+
+        proceed.set()
+        advance.join(1.0)
+        writer.join(1.0)
+
+        self.assertEqual(fleet.discs[1].speed, 5.0)
+
+    def test_quiescent_in_steady_states(self):
+        fleet = ChopperFleet(2)
+
+        fleet.process(0.1)
+        self.assertEqual(fleet.get_quiescent_time(), 0.0)
+
+        fleet.process(0.1)
+        self.assertEqual(fleet.get_quiescent_time(), float("inf"))
+
+        fleet.discs[0].initialize()
+        fleet.process(0.1)
+        self.assertEqual(fleet.get_quiescent_time(), 0.0)
+
+    def test_create_host_requires_protocols_for_each_disc(self):
+        fleet = ChopperFleet(3)
+
+        self.assertRaises(RuntimeError, fleet.create_host, [{}])
+
+    def test_missing_numpy_raises_lewis_exception(self):
+        # Load a separate copy of the module while NumPy can not be imported
+        spec = importlib.util.find_spec("lewis.devices.chopper.fleet")
+        module = importlib.util.module_from_spec(spec)
+
+        with patch.dict(sys.modules, {"numpy": None}):
+            spec.loader.exec_module(module)
+
+        with self.assertRaises(LewisException) as context:
+            module.ChopperFleet(3)
+
+        self.assertIn("NumPy", str(context.exception))
@@ -49,3 +49,26 @@ class TestSimulatedChopper(unittest.TestCase):
         )
 
         self.assertIsInstance(chopper, SimulatedChopper)
+
+    def test_quiescent_in_steady_states(self):
+        chopper = SimulatedChopper()
+
+        chopper.process(0.1)
+        self.assertEqual(chopper.get_quiescent_time(), 0.0)
+
+        chopper.process(0.1)
+        self.assertEqual(chopper.get_quiescent_time(), float("inf"))
+
+        chopper.initialize()
+        chopper.process(0.1)
+        self.assertEqual(chopper.state, "bearings")
+        self.assertEqual(chopper.get_quiescent_time(), 0.0)
+
+    def test_overridden_states_are_not_steady(self):
+        chopper = SimulatedChopper(
+            override_transitions={("init", "bearings"): lambda: False}
+        )
+
+        chopper.process(0.1)
+        chopper.process(0.1)
+        self.assertEqual(chopper.get_quiescent_time(), 0.0)
@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+# *********************************************************************
+# lewis - a library for creating hardware device simulators
+# Copyright (C) 2016-2020 European Spallation Source ERIC
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# *********************************************************************
+
+import unittest
+
+from lewis.adapters.stream import StreamAdapter
+from lewis.core.adapters import DeviceLock
+from lewis.core.benchmark import (
+    BenchmarkCommand,
+    EpicsBenchmark,
+    StreamBenchmark,
+    percentile,
+    summarize_latencies,
+)
+from lewis.core.exceptions import LewisException
+from lewis.core.simulation import SimulationFactory
+from lewis.scripts.bench import get_benchmark, parser
+
+from .test_stream import DummyDevice, DummyInterface
+
+
+class TestLatencySummary(unittest.TestCase):
+    def test_percentile_is_nearest_rank(self):
+        values = list(range(1, 101))
+
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile(values, 100), 100)
+        self.assertEqual(percentile(values, 0), 1)
+        self.assertEqual(percentile([3.0], 95), 3.0)
+
+    def test_summary(self):
+        summary = summarize_latencies([0.4, 0.1, 0.3, 0.2])
+
+        self.assertEqual(summary["count"], 4)
+        self.assertAlmostEqual(summary["mean"], 0.25)
+        self.assertEqual(summary["p50"], 0.2)
+        self.assertEqual(summary["p99"], 0.4)
+        self.assertEqual(summary["max"], 0.4)
+
+    def test_empty_summary(self):
+        summary = summarize_latencies([])
+
+        self.assertEqual(summary["count"], 0)
+        self.assertEqual(summary["p95"], 0.0)
+
+
+class TestBenchmarkCommand(unittest.TestCase):
+    def test_from_mix(self):
+        commands = BenchmarkCommand.from_mix(
+            {"IN_PV_00": 9, "OUT_SP_00 25.0": {"weight": 1, "reply": False}}
+        )
+
+        self.assertEqual(
+            [(c.request, c.weight, c.reply) for c in commands],
+            [("IN_PV_00", 9.0, True), ("OUT_SP_00 25.0", 1.0, False)],
+        )
+
+    def test_invalid_mix(self):
+        self.assertRaises(LewisException, BenchmarkCommand.from_mix, {})
+        self.assertRaises(LewisException, BenchmarkCommand.from_mix, {"T": 0})
+        self.assertRaises(LewisException, BenchmarkCommand.from_mix, ["T"])
+
+
+class TestBenchmarkArguments(unittest.TestCase):
+    def test_preset_and_terminators(self):
+        benchmark = get_benchmark(
+            parser.parse_args(
+                [
+                    "stream",
+                    "localhost:9999",
+                    "-p",
+                    "julabo",
+                    "--reply-terminator",
+                    "\\n",
+                ]
+            )
+        )
+
+        self.assertEqual(benchmark._port, 9999)
+        self.assertEqual(benchmark._request_terminator, b"\r")
+        self.assertEqual(benchmark._reply_terminator, b"\n")
+        self.assertIn("IN_PV_00", [c.request for c in benchmark._commands])
+
+    def test_invalid_arguments(self):
+        for arguments in (
+            ["stream", "localhost:9999"],
+            ["stream", "localhost", "-m", "{T: 1}"],
+            ["stream", "localhost:9999", "-m", "{T: [1"],
+            ["stream", "localhost:9999", "-p", "chopper"],
+            ["epics", "chopper", "-p", "julabo"],
+            ["epics", "chopper", "-m", "{Spd: 1}", "-i", "{CmdS: init}"],
+            ["epics", "unknown", "-m", "{Spd: 1}"],
+        ):
+            self.assertRaises(
+                LewisException, get_benchmark, parser.parse_args(arguments)
+            )
+
+    def test_epics_preset(self):
+        benchmark = get_benchmark(
+            parser.parse_args(["epics", "chopper", "-p", "chopper"])
+        )
+
+        self.assertIsInstance(benchmark, EpicsBenchmark)
+        self.assertEqual(benchmark._initial_puts, [["CmdS", "init"]])
+        self.assertEqual(benchmark._values["Spd"], [10.0, 20.0, 30.0])
+
+
+class TestStreamBenchmark(unittest.TestCase):
+    def setUp(self):
+        self.interface = DummyInterface()
+        self.interface.device = DummyDevice()
+
+        self.adapter = StreamAdapter(options={"bind_address": "127.0.0.1", "port": 0})
+        self.adapter.interface = self.interface
+        self.adapter.device_lock = DeviceLock()
+        self.adapter.start_server()
+
+        self.port = self.adapter._server._listener.address[1]
+
+    def tearDown(self):
+        self.adapter.stop_server()
+
+    def test_run_at_target_rate(self):
+        benchmark = StreamBenchmark(
+            "127.0.0.1",
+            self.port,
+            BenchmarkCommand.from_mix({"S?": 3, "S=4": {"weight": 1, "reply": False}}),
+            connections=2,
+            rate=200,
+            duration=0.2,
+            request_terminator="\r\n",
+            reply_terminator="\n",
+            seed=1,
+        )
+
+        results = benchmark.run()
+
+        self.assertEqual(results["timeouts"], 0)
+        self.assertEqual(results["connections"], 2)
+        self.assertGreater(results["requests"], 20)
+        self.assertLessEqual(results["requests"], 40)
+        self.assertEqual(
+            results["requests"],
+            sum(c["latency"]["count"] for c in results["commands"].values()),
+        )
+        self.assertLessEqual(results["latency"]["p50"], results["latency"]["max"])
+
+    def test_unanswered_request_times_out_and_reconnects(self):
+        benchmark = StreamBenchmark(
+            "127.0.0.1",
+            self.port,
+            BenchmarkCommand.from_mix({"S?": 1}),
+            duration=0.1,
+            request_terminator="\r\n",
+            reply_terminator="\r",
+            timeout=0.05,
+        )
+
+        results = benchmark.run()
+
+        self.assertGreater(results["timeouts"], 0)
+        self.assertEqual(results["reconnects"], results["timeouts"])
+
+    def test_connection_refused(self):
+        port = self.port
+        self.adapter.stop_server()
+
+        benchmark = StreamBenchmark(
+            "127.0.0.1", port, BenchmarkCommand.from_mix({"S?": 1}), duration=0.1
+        )
+
+        self.assertRaises(LewisException, benchmark.run)
+
+
+class TestEpicsBenchmark(unittest.TestCase):
+    def test_run(self):
+        benchmark = get_benchmark(
+            parser.parse_args(
+                ["epics", "chopper", "-p", "chopper", "-d", "0.2", "-r", "200"]
+            )
+        )
+
+        results = benchmark.run()
+
+        self.assertEqual(results["protocol"], "epics")
+        self.assertEqual(results["pvs"], 12)
+        self.assertGreater(results["puts"], 0)
+        self.assertEqual(results["timeouts"], 0)
+        self.assertEqual(results["rejected"], 0)
+        self.assertGreater(results["updates"], 0)
+        self.assertEqual(
+            results["update_latency"]["count"],
+            sum(monitor["updates"] for monitor in results["monitors"].values()),
+        )
+
+    def test_simulation_without_inprocess_pvs(self):
+        simulation = SimulationFactory("lewis.devices").create("chopper")
+        benchmark = EpicsBenchmark(simulation, duration=0.1, startup_timeout=0.2)
+
+        self.assertRaises(LewisException, benchmark.run)
+        self.assertFalse(simulation.is_started)
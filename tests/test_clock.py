@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+# *********************************************************************
+# lewis - a library for creating hardware device simulators
+# Copyright (C) 2016-2020 European Spallation Source ERIC
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# *********************************************************************
+
+import importlib.util
+import sys
+import time
+import unittest
+from types import ModuleType
+
+from mock import patch
+
+from lewis.core.clock import (
+    Clock,
+    MonotonicClock,
+    VirtualClock,
+    get_clock,
+    set_clock,
+)
+
+
+class TestMonotonicClock(unittest.TestCase):
+    def test_time_does_not_decrease(self):
+        clock = MonotonicClock()
+
+        first = clock.time_ns()
+        second = clock.time_ns()
+
+        self.assertIsInstance(first, int)
+        self.assertGreaterEqual(second, first)
+        self.assertGreaterEqual(clock.seconds_since(first), 0.0)
+
+    def test_fallback_without_perf_counter_ns(self):
+        # Python 3.6 does not have perf_counter_ns, load a separate copy of the module
+        fake_time = ModuleType("time")
+        fake_time.perf_counter = lambda: 1.5
+
+        spec = importlib.util.find_spec("lewis.core.clock")
+        module = importlib.util.module_from_spec(spec)
+
+        with patch.dict(sys.modules, {"time": fake_time}):
+            spec.loader.exec_module(module)
+
+        self.assertEqual(module.MonotonicClock().time_ns(), 1500000000)
+        self.assertTrue(hasattr(time, "perf_counter_ns"))
+
+    def test_base_class_is_abstract(self):
+        self.assertRaises(NotImplementedError, Clock().time_ns)
+
+
+class TestVirtualClock(unittest.TestCase):
+    def test_advance(self):
+        clock = VirtualClock(1.0)
+        start = clock.time_ns()
+
+        self.assertEqual(start, 1000000000)
+        self.assertEqual(clock.seconds_since(start), 0.0)
+
+        clock.advance(0.0005)
+
+        self.assertEqual(clock.seconds_since(start), 0.0005)
+        self.assertAlmostEqual(clock.time(), 1.0005)
+
+    def test_advance_backwards_fails(self):
+        self.assertRaises(ValueError, VirtualClock().advance, -1.0)
+
+
+class TestDefaultClock(unittest.TestCase):
+    def test_set_clock(self):
+        self.addCleanup(set_clock, None)
+        self.assertIsInstance(get_clock(), MonotonicClock)
+
+        clock = VirtualClock()
+        set_clock(clock)
+        self.assertIs(get_clock(), clock)
+
+        set_clock(None)
+        self.assertIsInstance(get_clock(), MonotonicClock)
@@ -23,6 +23,7 @@ import unittest
 import zmq
 from mock import Mock, call, patch
 
+from lewis.core.adapters import DeviceLock
 from lewis.core.control_server import (
     ControlServer,
     ExposedObject,
@@ -174,6 +175,37 @@ class TestRPCObject(unittest.TestCase):
         mock_lock.__enter__.assert_called_once()
         mock_lock.__exit__.assert_called_once()
 
+    def test_getters_only_read_device_lock(self):
+        lock = DeviceLock()
+
+        obj = DummyObject()
+        exposed_object = ExposedObject(obj, ["a"], lock=lock)
+
+        self.assertEqual(exposed_object["a:get"](), obj.a)
+        self.assertEqual(lock.stats["reads"], 1)
+        self.assertFalse(lock.wake_event.is_set())
+
+        exposed_object["a:set"](5)
+        self.assertEqual(lock.stats["acquisitions"], 1)
+        self.assertTrue(lock.wake_event.is_set())
+
+    def test_getters_use_snapshot(self):
+        lock = DeviceLock(snapshots=True)
+
+        obj = DummyObject()
+        exposed_object = ExposedObject(obj, ["a"], lock=lock)
+
+        with lock.silent():
+            lock.publish_snapshot()
+
+        obj.a = 7
+        self.assertEqual(exposed_object["a:get"](), 10)
+        self.assertEqual(lock.stats["reads"], 0)
+
+        exposed_object["a:set"](8)
+        self.assertEqual(exposed_object["a:get"](), 8)
+        self.assertEqual(lock.stats["reads"], 1)
+
 
 class TestExposedObjectCollection(unittest.TestCase):
     def test_empty_initialization(self):
@@ -281,6 +313,24 @@ class TestControlServer(unittest.TestCase):
             ]
         )
 
+    def test_free_port_is_bound_for_port_0(self):
+        server = ControlServer(None, connection_string="127.0.0.1:0")
+        server.start_server()
+        self.addCleanup(server.stop_server)
+
+        self.assertTrue(server.is_running)
+        self.assertNotEqual(int(server.port), 0)
+
+    def test_stop_server(self):
+        mock_socket = Mock()
+
+        server = ControlServer(None, connection_string="127.0.0.1:10000")
+        server._socket = mock_socket
+        server.stop_server()
+
+        mock_socket.close.assert_called_once_with(linger=0)
+        self.assertFalse(server.is_running)
+
     def test_process_raises_if_not_started(self):
         server = ControlServer(None, connection_string="127.0.0.1:10000")
 
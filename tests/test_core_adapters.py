@@ -1,9 +1,11 @@
 import inspect
+import threading
+import time
 import unittest
 
-from mock import MagicMock, Mock
+from mock import MagicMock, Mock, patch
 
-from lewis.core.adapters import Adapter, AdapterCollection, NoLock
+from lewis.core.adapters import Adapter, AdapterCollection, DeviceLock, NoLock
 from lewis.core.exceptions import LewisException
 
 from .utils import assertRaisesNothing
@@ -48,6 +50,244 @@ class TestNoLock(unittest.TestCase):
         self.assertRaises(RuntimeError, failing_function)
 
 
+class TestDeviceLock(unittest.TestCase):
+    def test_release_sets_wake_event(self):
+        lock = DeviceLock()
+
+        with lock:
+            self.assertTrue(lock.locked())
+            self.assertFalse(lock.wake_event.is_set())
+
+        self.assertFalse(lock.locked())
+        self.assertTrue(lock.wake_event.is_set())
+
+    def test_silent_does_not_set_wake_event(self):
+        lock = DeviceLock()
+
+        with lock.silent():
+            self.assertTrue(lock.locked())
+
+        self.assertFalse(lock.locked())
+        self.assertFalse(lock.wake_event.is_set())
+
+    def test_stats_count_contentions(self):
+        lock = DeviceLock()
+
+        with lock:
+            pass
+
+        acquired = threading.Event()
+
+        def hold_lock():
+            with lock.silent():
+                acquired.set()
+                time.sleep(0.05)
+
+        thread = threading.Thread(target=hold_lock)
+        thread.start()
+        acquired.wait()
+
+        with lock:
+            pass
+
+        thread.join()
+
+        stats = lock.stats
+        self.assertEqual(stats["acquisitions"], 3)
+        self.assertEqual(stats["contentions"], 1)
+        self.assertGreater(stats["wait_time"]["max"], 0.0)
+
+        lock.reset_stats()
+        self.assertEqual(lock.stats["contentions"], 0)
+
+    def test_reads_are_exclusive_by_default(self):
+        lock = DeviceLock()
+
+        with lock.read():
+            self.assertTrue(lock.locked())
+            self.assertFalse(lock.acquire(blocking=False))
+
+        self.assertFalse(lock.wake_event.is_set())
+        self.assertEqual(lock.stats["reads"], 1)
+
+    def test_shared_reads(self):
+        lock = DeviceLock(shared_reads=True)
+
+        with lock.read():
+            with lock.read():
+                self.assertTrue(lock.locked())
+
+            self.assertFalse(lock.acquire(blocking=False))
+            self.assertFalse(lock.acquire(timeout=0.01))
+
+        self.assertFalse(lock.locked())
+        self.assertTrue(lock.acquire(blocking=False))
+        lock.release()
+
+        stats = lock.stats
+        self.assertEqual(stats["reads"], 2)
+        self.assertEqual(stats["read_contentions"], 0)
+        self.assertEqual(stats["acquisitions"], 1)
+
+    def test_exclusive_acquisition_waits_for_shared_reads(self):
+        lock = DeviceLock(shared_reads=True)
+        events = []
+
+        reading = threading.Event()
+
+        def read():
+            with lock.read():
+                reading.set()
+                time.sleep(0.05)
+                events.append("read")
+
+        thread = threading.Thread(target=read)
+        thread.start()
+        reading.wait()
+
+        with lock:
+            events.append("write")
+
+        thread.join()
+
+        self.assertEqual(events, ["read", "write"])
+        self.assertEqual(lock.stats["contentions"], 1)
+        self.assertGreater(lock.stats["wait_time"]["max"], 0.0)
+
+    def test_snapshot_is_only_published_if_enabled(self):
+        lock = DeviceLock()
+        getter = Mock(return_value=3)
+        lock.register_getter(getter)
+
+        with lock.silent():
+            lock.publish_snapshot()
+
+        self.assertIsNone(lock.snapshot)
+        getter.assert_not_called()
+
+    def test_snapshot_values(self):
+        lock = DeviceLock(snapshots=True)
+        values = [1, 2]
+
+        def get_values():
+            return values
+
+        def get_error():
+            raise AttributeError()
+
+        lock.register_getter(get_values)
+        lock.register_getter(get_error)
+
+        with lock.silent():
+            lock.publish_snapshot()
+
+        snapshot = lock.snapshot
+        values.append(3)
+
+        self.assertEqual(snapshot[get_values], [1, 2])
+        self.assertNotIn(get_error, snapshot)
+
+        # Reading does not discard the snapshot, writing does
+        with lock.read():
+            pass
+
+        self.assertIs(lock.snapshot, snapshot)
+
+        with lock:
+            pass
+
+        self.assertIsNone(lock.snapshot)
+
+    def test_getters_are_weakly_referenced(self):
+        lock = DeviceLock(snapshots=True)
+        lock.register_getter(lambda: 1)
+
+        with lock.silent():
+            lock.publish_snapshot()
+
+        self.assertEqual(len(lock.snapshot), 0)
+
+    def test_generation_changes_on_exclusive_acquisition(self):
+        lock = DeviceLock()
+        generation = lock.generation
+
+        with lock.read():
+            pass
+
+        self.assertEqual(lock.generation, generation)
+
+        with lock:
+            pass
+
+        with lock.silent():
+            pass
+
+        self.assertEqual(lock.generation, generation + 2)
+
+    def test_call_before_write(self):
+        lock = DeviceLock()
+        func = Mock()
+
+        lock.call_before_write(func)
+
+        with lock.read():
+            pass
+
+        with lock.silent():
+            pass
+
+        func.assert_not_called()
+
+        with lock:
+            func.assert_called_once_with()
+
+        with lock:
+            pass
+
+        func.assert_called_once_with()
+
+        handle = lock.call_before_write(func)
+        lock.cancel_before_write(handle)
+
+        with lock:
+            pass
+
+        func.assert_called_once_with()
+
+        # Cancelling a handle that has been called already does nothing
+        assertRaisesNothing(self, lock.cancel_before_write, handle)
+
+    def test_cancel_before_write_only_removes_handle(self):
+        lock = DeviceLock()
+        calls = []
+
+        first = lock.call_before_write(lambda: calls.append("first"))
+        lock.call_before_write(lambda: calls.append("second"))
+        lock.call_before_write(lambda: calls.append("third"))
+
+        lock.cancel_before_write(first)
+
+        with lock:
+            pass
+
+        self.assertEqual(calls, ["second", "third"])
+
+    def test_call_before_write_errors_are_logged(self):
+        lock = DeviceLock()
+        func = Mock()
+
+        lock.call_before_write(Mock(side_effect=RuntimeError("Failed.")))
+        lock.call_before_write(func)
+
+        with patch.object(lock, "log") as log_mock:
+            with lock:
+                pass
+
+        func.assert_called_once_with()
+        log_mock.exception.assert_called_once()
+        self.assertFalse(lock.locked())
+
+
 class TestAdapter(unittest.TestCase):
     def test_documentation(self):
         adapter = DummyAdapter("foo")
@@ -92,6 +332,53 @@ class TestAdapter(unittest.TestCase):
             LewisException, DummyAdapter, "protocol", options={"invalid": False}
         )
 
+    def test_server_on_assigned_event_loop(self):
+        adapter = DummyAdapter("foo")
+        event_loop = Mock()
+        event_loop.call.side_effect = lambda func, *args: func(*args)
+        adapter.event_loop = event_loop
+
+        server_type = Mock()
+        server = adapter._create_on_event_loop(server_type, 1, 2)
+
+        self.assertIs(server, server_type.return_value)
+        server_type.assert_called_once_with(1, 2, event_loop)
+
+        adapter._close_on_event_loop(server)
+
+        event_loop.call.assert_called_with(server.close)
+        event_loop.start.assert_not_called()
+        event_loop.stop.assert_not_called()
+        self.assertIs(adapter.event_loop, event_loop)
+
+    @patch("lewis.core.adapters.get_event_loop")
+    def test_server_without_event_loop_runs_shared_loop(self, get_event_loop_mock):
+        event_loop = get_event_loop_mock.return_value
+        event_loop.call.side_effect = lambda func, *args: func(*args)
+
+        adapter = DummyAdapter("foo")
+        server_type = Mock()
+        server = adapter._create_on_event_loop(server_type)
+
+        server_type.assert_called_once_with(event_loop)
+        event_loop.start.assert_called_once_with()
+
+        adapter._close_on_event_loop(server)
+
+        event_loop.stop.assert_called_once_with()
+        self.assertIsNone(adapter.event_loop)
+
+    @patch("lewis.core.adapters.get_event_loop")
+    def test_failing_server_releases_shared_loop(self, get_event_loop_mock):
+        event_loop = get_event_loop_mock.return_value
+        event_loop.call.side_effect = OSError("Address in use")
+
+        adapter = DummyAdapter("foo")
+
+        self.assertRaises(OSError, adapter._create_on_event_loop, Mock())
+        event_loop.stop.assert_called_once_with()
+        self.assertIsNone(adapter.event_loop)
+
 
 class TestAdapterCollection(unittest.TestCase):
     def test_add_adapter(self):
@@ -148,6 +435,76 @@ class TestAdapterCollection(unittest.TestCase):
 
         collection.disconnect()  # Clean up so that the test does not hang
 
+    def test_replace_device_lock(self):
+        collection = AdapterCollection(DummyAdapter("foo", running=False))
+        lock = DeviceLock()
+
+        collection.device_lock = lock
+        self.assertIs(collection.device_lock, lock)
+
+        collection.connect()
+        self.assertRaises(
+            RuntimeError, setattr, collection, "device_lock", DeviceLock()
+        )
+
+        collection.disconnect()
+
+    def test_event_loop_adapters_are_started_on_event_loop(self):
+        class EventLoopAdapter(DummyAdapter):
+            uses_event_loop = True
+
+            def start_server(self):
+                self.start_thread = threading.current_thread()
+                super(EventLoopAdapter, self).start_server()
+
+        adapter = EventLoopAdapter("foo")
+        collection = AdapterCollection(adapter)
+
+        collection.connect()
+        self.addCleanup(collection.disconnect)
+
+        self.assertTrue(collection.is_connected("foo"))
+        self.assertIs(adapter.device_lock, collection.device_lock)
+        self.assertEqual(adapter.start_thread.name, "lewis-event-loop")
+        self.assertTrue(adapter.event_loop.is_running)
+
+        collection.disconnect()
+
+        self.assertFalse(collection.is_connected("foo"))
+        self.assertFalse(adapter.event_loop.is_running)
+
+    def test_cycle_delay_follows_time_until_update(self):
+        class SlowAdapter(DummyAdapter):
+            seconds_until_update = None
+
+            def __init__(self, protocol):
+                super(SlowAdapter, self).__init__(protocol)
+                self.cycle_delays = []
+                self.handled = threading.Event()
+
+            def handle(self, cycle_delay=0.1):
+                self.cycle_delays.append(cycle_delay)
+                self.handled.set()
+                time.sleep(0.001)
+
+        adapter = SlowAdapter("foo")
+        collection = AdapterCollection(adapter)
+
+        for until_update, expected_delay in [
+            (None, 0.01),
+            (0.001, 0.01),
+            (0.2, 0.2),
+            (5.0, collection.max_cycle_delay),
+        ]:
+            adapter.seconds_until_update = until_update
+            adapter.handled.clear()
+
+            collection.connect()
+            adapter.handled.wait(1.0)
+            collection.disconnect()
+
+            self.assertEqual(adapter.cycle_delays[-1], expected_delay)
+
     def test_configuration(self):
         collection = AdapterCollection(
             DummyAdapter("protocol_a", options={"bar": 2, "foo": 3}),
@@ -61,6 +61,108 @@ class TestIsDevice(unittest.TestCase):
         self.assertTrue(is_device(DummyStatemachineDevice))
 
 
+class TestAttributeChanges(unittest.TestCase):
+    class ObservedDevice(Device):
+        tracked_attributes = ("speed", "values")
+
+        def __init__(self):
+            super(TestAttributeChanges.ObservedDevice, self).__init__()
+            self.speed = 0.0
+            self.values = [1, 2]
+            self.other = 0.0
+
+        @property
+        def double_speed(self):
+            return self.speed * 2
+
+        @double_speed.setter
+        def double_speed(self, value):
+            self.speed = value / 2
+
+    def test_only_listed_attributes_are_tracked(self):
+        device = self.ObservedDevice()
+        device.other = 3.0
+
+        self.assertTrue(device.tracks_attribute_changes("speed"))
+        self.assertFalse(device.tracks_attribute_changes("other"))
+        self.assertFalse(device.tracks_attribute_changes("double_speed"))
+        self.assertEqual(device.get_attribute_changes("other"), 0)
+        self.assertNotIn("other", vars(type(device)))
+
+    def test_other_device_types_are_not_modified(self):
+        self.ObservedDevice()
+
+        self.assertNotIn("speed", vars(Device))
+        self.assertFalse(Device.tracks_attribute_changes("speed"))
+
+    def test_only_different_values_are_counted(self):
+        device = self.ObservedDevice()
+
+        device.speed = 0.0
+        self.assertEqual(device.get_attribute_changes("speed"), 0)
+
+        device.speed = 3.0
+        self.assertEqual(device.speed, 3.0)
+        self.assertEqual(device.get_attribute_changes("speed"), 1)
+        self.assertEqual(device.get_attribute_changes("unknown"), 0)
+
+    def test_instances_are_counted_separately(self):
+        first, second = self.ObservedDevice(), self.ObservedDevice()
+        second.speed = 3.0
+
+        self.assertEqual(first.get_attribute_changes("speed"), 0)
+        self.assertEqual(second.get_attribute_changes("speed"), 1)
+
+    def test_subclasses_inherit_and_extend_tracking(self):
+        class ExtendedDevice(self.ObservedDevice):
+            tracked_attributes = ("other",)
+
+        device = ExtendedDevice()
+        device.speed = 1.0
+        device.other = 1.0
+
+        self.assertEqual(device.get_attribute_changes("speed"), 1)
+        self.assertEqual(device.get_attribute_changes("other"), 1)
+
+    def test_class_attributes_can_not_be_tracked(self):
+        def create_type():
+            class InvalidDevice(Device):
+                tracked_attributes = ("speed",)
+                speed = 0.0
+
+        self.assertRaises(RuntimeError, create_type)
+
+    def test_missing_attribute_raises(self):
+        device = self.ObservedDevice()
+        del device.speed
+
+        self.assertRaises(AttributeError, getattr, device, "speed")
+        self.assertFalse(hasattr(device, "speed"))
+        self.assertEqual(device.get_attribute_changes("speed"), 1)
+
+    def test_property_setters_count_assigned_attributes(self):
+        device = self.ObservedDevice()
+        device.double_speed = 4.0
+
+        self.assertEqual(device.speed, 2.0)
+        self.assertEqual(device.get_attribute_changes("speed"), 1)
+        self.assertEqual(device.get_attribute_changes("double_speed"), 0)
+
+    def test_assigning_other_values_is_always_counted(self):
+        device = self.ObservedDevice()
+        device.values = [1, 2]
+        device.speed = [0.0, 1.0]
+
+        self.assertEqual(device.get_attribute_changes("values"), 1)
+        self.assertEqual(device.get_attribute_changes("speed"), 1)
+
+    def test_in_place_modification_is_not_counted(self):
+        device = self.ObservedDevice()
+        device.values.append(3)
+
+        self.assertEqual(device.get_attribute_changes("values"), 0)
+
+
 class TestDeviceBuilderSimpleModule(unittest.TestCase):
     @classmethod
     def setUpClass(cls):
@@ -0,0 +1,393 @@
+# -*- coding: utf-8 -*-
+# *********************************************************************
+# lewis - a library for creating hardware device simulators
+# Copyright (C) 2016-2020 European Spallation Source ERIC
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# *********************************************************************
+
+import time
+import unittest
+
+from mock import Mock, patch
+
+from lewis.adapters.epics import PV, EpicsAdapter, EpicsInterface, PollSchedule
+from lewis.adapters.epics_inprocess import (
+    InProcessClient,
+    InProcessDriver,
+    InProcessServer,
+)
+from lewis.core.adapters import AdapterCollection, DeviceLock
+from lewis.core.clock import VirtualClock, set_clock
+from lewis.core.exceptions import LewisException
+from lewis.core.simulation import Simulation
+from lewis.core.waveform import Waveform
+from lewis.devices import Device
+
+
+class DummyDevice(Device):
+    tracked_attributes = ("speed", "values", "trace")
+
+    def __init__(self):
+        super(DummyDevice, self).__init__()
+        self.speed = 1.0
+        self.values = [1.0]
+        self.trace = Waveform(3)
+
+    @property
+    def state(self):
+        return "idle"
+
+    @property
+    def speed_limits(self):
+        return {"lolim": 0.0, "hilim": self.speed * 10}
+
+
+class DummyInterface(EpicsInterface):
+    pvs = {
+        "Speed": PV("speed", meta_data_property="speed_limits"),
+        "State": PV("state", type="string", read_only=True),
+        "Mode": PV("mode", type="enum", enums=["off", "on"]),
+    }
+
+    mode = 0
+
+
+class TestBoundPV(unittest.TestCase):
+    def test_changes_of_plain_attribute(self):
+        device = DummyDevice()
+        bound_pv = PV("speed").bind(device)
+
+        changes = bound_pv.changes
+        device.speed = 1.0
+        self.assertEqual(bound_pv.changes, changes)
+
+        device.speed = 2.0
+        self.assertEqual(bound_pv.changes, changes + 1)
+
+    def test_no_changes_for_properties_and_mutable_values(self):
+        device = DummyDevice()
+
+        self.assertIsNone(PV("state").bind(device).changes)
+        self.assertIsNone(PV("values").bind(device).changes)
+        self.assertIsNone(PV(lambda: 1.0).bind(device).changes)
+
+    def test_no_changes_for_untracked_attributes(self):
+        device = DummyDevice()
+        device.untracked = 1.0
+
+        self.assertIsNone(PV("untracked").bind(device).changes)
+
+    def test_changes_of_waveform(self):
+        device = DummyDevice()
+        bound_pv = PV("trace").bind(device)
+
+        changes = bound_pv.changes
+        device.trace.append(1.0)
+        self.assertNotEqual(bound_pv.changes, changes)
+
+        changes = bound_pv.changes
+        device.trace = Waveform(3)
+        self.assertNotEqual(bound_pv.changes, changes)
+
+    def test_has_meta(self):
+        device = DummyDevice()
+
+        bound_pv = PV("speed", meta_data_property="speed_limits").bind(device)
+        self.assertTrue(bound_pv.has_meta)
+        self.assertEqual(bound_pv.meta, {"lolim": 0.0, "hilim": 10.0})
+
+        bound_pv = PV("speed").bind(device)
+        self.assertFalse(bound_pv.has_meta)
+        self.assertEqual(bound_pv.meta, {})
+
+
+class TestPollSchedule(unittest.TestCase):
+    def setUp(self):
+        self.clock = VirtualClock()
+        set_clock(self.clock)
+        self.addCleanup(set_clock, None)
+
+        self.schedule = PollSchedule({"fast": 0.1, "slow": 1.0, "always": 0.0})
+
+    def test_pvs_are_due_after_their_poll_interval(self):
+        self.assertEqual(self.schedule.pop_due(), ["always"])
+        self.assertAlmostEqual(self.schedule.seconds_until_due(), 0.1)
+
+        self.clock.advance(0.1)
+        self.assertEqual(self.schedule.pop_due(), ["always", "fast"])
+        self.assertEqual(self.schedule.pop_due(), ["always"])
+
+        self.clock.advance(0.9)
+        self.assertEqual(sorted(self.schedule.pop_due()), ["always", "fast", "slow"])
+        self.assertAlmostEqual(self.schedule.seconds_until_due(), 0.1)
+
+    def test_overdue_pvs_are_rescheduled_from_now(self):
+        self.clock.advance(0.35)
+        self.assertIn("fast", self.schedule.pop_due())
+        self.assertAlmostEqual(self.schedule.seconds_until_due(), 0.1)
+
+    def test_reset(self):
+        self.clock.advance(0.05)
+        self.schedule.reset()
+
+        self.clock.advance(0.05)
+        self.assertEqual(self.schedule.pop_due(), ["always"])
+        self.assertAlmostEqual(self.schedule.seconds_until_due(), 0.05)
+
+    def test_empty_schedule(self):
+        schedule = PollSchedule({"always": 0.0})
+
+        self.assertIsNone(schedule.seconds_until_due())
+        self.assertEqual(schedule.pop_due(), ["always"])
+
+
+class TestInProcessBackend(unittest.TestCase):
+    def setUp(self):
+        self.server = InProcessServer()
+        self.server.createPV(
+            prefix="TEST:",
+            pvdb={"A": {}, "B": {"type": "enum", "enums": ["no", "yes"]}},
+        )
+        self.driver = InProcessDriver(server=self.server)
+
+        self.client = InProcessClient()
+
+        self.addCleanup(self.client.close)
+        self.addCleanup(self.server.close)
+
+    def test_default_values_and_pv_names(self):
+        self.assertEqual(self.server.pv_names, ["TEST:A", "TEST:B"])
+        self.assertIn("TEST:A", self.client.pv_names)
+        self.assertEqual(self.driver.getParam("A"), 0.0)
+        self.assertEqual(self.client.get("TEST:B"), 0)
+
+    def test_put_is_processed_by_server(self):
+        future = self.client.put("TEST:B", "yes", wait=False)
+        self.assertFalse(future.done())
+
+        self.server.process(0.0)
+        self.assertTrue(future.result(1.0))
+        self.assertEqual(self.client.get("TEST:B"), 1)
+
+    def test_monitor(self):
+        updates = []
+        monitor = self.client.monitor(
+            "TEST:A", lambda name, value, timestamp: updates.append((name, value))
+        )
+
+        self.driver.setParam("A", 1.0)
+        self.driver.setParam("A", 1.0)
+        self.driver.updatePVs()
+
+        # Unchanged values are not posted again
+        self.driver.setParam("A", 1.0)
+        self.driver.updatePVs()
+
+        monitor.clear()
+        self.driver.setParam("A", 2.0)
+        self.driver.updatePVs()
+
+        self.client.flush()
+        self.assertEqual(updates, [("TEST:A", 0.0), ("TEST:A", 1.0)])
+
+    def test_param_info(self):
+        self.driver.setParamInfo("A", {"hilim": 10.0})
+        self.assertEqual(self.driver.getParamInfo("A", ["hilim"]), {"hilim": 10.0})
+
+    def test_unknown_pvs_and_invalid_values(self):
+        self.assertRaises(LewisException, self.client.get, "TEST:C")
+        self.assertRaises(LewisException, self.client.put, "TEST:A", "fast")
+        self.assertRaises(LewisException, self.driver.getParam, "C")
+
+    def test_closed_server_is_not_found(self):
+        future = self.client.put("TEST:A", 1.0, wait=False)
+        self.server.close()
+
+        self.assertFalse(future.result(1.0))
+        self.assertNotIn("TEST:A", self.client.pv_names)
+        self.assertRaises(LewisException, self.client.get, "TEST:A")
+
+
+class TestEpicsAdapterInProcess(unittest.TestCase):
+    def setUp(self):
+        self.device = DummyDevice()
+        self.interface = DummyInterface()
+        self.interface.device = self.device
+
+        self.adapter = EpicsAdapter(
+            options={"prefix": "DUMMY:", "backend": "inprocess"}
+        )
+        self.adapter.interface = self.interface
+        self.adapter.device_lock = DeviceLock()
+        self.adapter.start_server()
+        self.addCleanup(self.adapter.stop_server)
+
+        self.client = InProcessClient()
+        self.addCleanup(self.client.close)
+
+    def test_invalid_backend(self):
+        self.assertRaises(LewisException, EpicsAdapter, {"backend": "invalid"})
+
+    def test_values_are_published_on_start(self):
+        self.assertTrue(self.adapter.is_running)
+        self.assertEqual(self.client.get("DUMMY:Speed"), 1.0)
+        self.assertEqual(self.client.get("DUMMY:State"), "idle")
+
+    def test_put_and_monitor(self):
+        updates = []
+        self.client.monitor(
+            "DUMMY:Speed", lambda name, value, timestamp: updates.append(value)
+        )
+
+        future = self.client.put("DUMMY:Speed", 3, wait=False)
+        self.adapter.handle(0.0)
+
+        self.assertTrue(future.result(1.0))
+        self.assertEqual(self.device.speed, 3.0)
+
+        future = self.client.put("DUMMY:Mode", "on", wait=False)
+        self.adapter.handle(0.0)
+
+        self.assertTrue(future.result(1.0))
+        self.assertEqual(self.interface.mode, 1)
+
+        self.client.flush()
+        self.assertEqual(updates, [1.0, 3.0])
+
+    def test_rejected_put(self):
+        future = self.client.put("DUMMY:State", "busy", wait=False)
+        self.adapter.handle(0.0)
+
+        self.assertFalse(future.result(1.0))
+        self.assertEqual(self.client.get("DUMMY:State"), "idle")
+
+    def test_rebind_to_new_device(self):
+        device = DummyDevice()
+        device.speed = 7.0
+        self.interface.device = device
+
+        self.adapter.handle(0.0)
+        self.assertEqual(self.client.get("DUMMY:Speed"), 7.0)
+
+        future = self.client.put("DUMMY:Speed", 3, wait=False)
+        self.adapter.handle(0.0)
+
+        self.assertTrue(future.result(1.0))
+        self.assertEqual(device.speed, 3.0)
+        self.assertEqual(self.device.speed, 1.0)
+
+    def test_rebind_uses_changes_of_new_device(self):
+        clock = VirtualClock()
+        set_clock(clock)
+        self.addCleanup(set_clock, None)
+
+        device = DummyDevice()
+        self.interface.device = device
+        self.adapter.handle(0.0)
+
+        # Only the new device changes, the previous one must not be consulted for changes
+        with self.adapter.device_lock:
+            device.speed = 5.0
+
+        clock.advance(1.0)
+        self.adapter.handle(0.0)
+        self.assertEqual(self.client.get("DUMMY:Speed"), 5.0)
+
+    def test_rebind_updates_poll_schedule(self):
+        clock = VirtualClock()
+        set_clock(clock)
+        self.addCleanup(set_clock, None)
+
+        # Slower polling for the PV than the interface defined before rebinding
+        self.interface.pvs = dict(
+            DummyInterface.pvs, Speed=PV("speed", poll_interval=1.0)
+        )
+        device = DummyDevice()
+        device.speed = 7.0
+        self.interface.device = device
+
+        self.adapter.handle(0.0)
+        self.assertEqual(self.client.get("DUMMY:Speed"), 7.0)
+
+        device.speed = 9.0
+        self.adapter.handle(0.0)
+        self.assertEqual(self.client.get("DUMMY:Speed"), 7.0)
+
+        clock.advance(1.0)
+        self.adapter.handle(0.0)
+        self.assertEqual(self.client.get("DUMMY:Speed"), 9.0)
+
+    def test_seconds_until_update(self):
+        clock = VirtualClock()
+        set_clock(clock)
+        self.addCleanup(set_clock, None)
+
+        self.interface.pvs = dict(
+            DummyInterface.pvs, Speed=PV("speed", poll_interval=2.0)
+        )
+        self.interface.device = DummyDevice()
+        self.adapter.handle(0.0)
+
+        self.assertAlmostEqual(self.adapter.seconds_until_update, 1.0)
+
+        clock.advance(0.25)
+        self.assertAlmostEqual(self.adapter.seconds_until_update, 0.75)
+
+        # PVs without poll interval have to be updated in every cycle
+        self.interface.pvs = dict(DummyInterface.pvs, Mode=PV("mode", poll_interval=0))
+        self.interface.device = DummyDevice()
+        self.adapter.handle(0.0)
+
+        self.assertIsNone(self.adapter.seconds_until_update)
+
+        self.adapter.stop_server()
+        self.assertIsNone(self.adapter.seconds_until_update)
+
+    def test_slow_pvs_are_not_polled_at_high_frequency(self):
+        self.adapter.stop_server()
+
+        collection = AdapterCollection(self.adapter)
+        with patch.object(
+            self.adapter, "handle", wraps=self.adapter.handle
+        ) as handle_mock:
+            collection.connect()
+            time.sleep(0.3)
+            collection.disconnect()
+
+        # Polling with the cycle delay of 0.01 s would result in about 30 calls
+        self.assertLessEqual(handle_mock.call_count, 3)
+
+    def test_switch_setup(self):
+        device = DummyDevice()
+        device.speed = 7.0
+
+        builder = Mock(setups={"other": None})
+        builder.create_device.return_value = device
+
+        simulation = Simulation(
+            device=self.device,
+            adapters=[self.adapter],
+            device_builder=builder,
+        )
+        simulation.switch_setup("other")
+
+        self.adapter.handle(0.0)
+        self.assertEqual(self.client.get("DUMMY:Speed"), 7.0)
+
+    def test_stop_server(self):
+        self.adapter.stop_server()
+
+        self.assertFalse(self.adapter.is_running)
+        self.assertNotIn("DUMMY:Speed", self.client.pv_names)
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+# *********************************************************************
+# lewis - a library for creating hardware device simulators
+# Copyright (C) 2016-2020 European Spallation Source ERIC
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# *********************************************************************
+
+import asyncio
+import asyncore
+import socket
+import threading
+import unittest
+
+from lewis.core.event_loop import EventLoop
+
+
+class EchoHandler(asyncore.dispatcher_with_send):
+    def handle_read(self):
+        self.send(self.recv(1024))
+
+
+class EchoServer(asyncore.dispatcher):
+    def __init__(self, socket_map):
+        asyncore.dispatcher.__init__(self, map=socket_map)
+        self.create_socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.bind(("127.0.0.1", 0))
+        self.listen(5)
+
+    def handle_accept(self):
+        pair = self.accept()
+        if pair is not None:
+            EchoHandler(pair[0], map=self._map)
+
+
+class EchoProtocol(asyncio.Protocol):
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def data_received(self, data):
+        self.transport.write(data)
+
+
+class TestEventLoop(unittest.TestCase):
+    def setUp(self):
+        self.event_loop = EventLoop()
+        self.event_loop.start()
+        self.addCleanup(self.event_loop.stop)
+
+    def test_start_stop_is_reference_counted(self):
+        self.event_loop.start()
+        self.event_loop.stop()
+        self.assertTrue(self.event_loop.is_running)
+
+        self.event_loop.stop()
+        self.assertFalse(self.event_loop.is_running)
+        self.assertIsNone(self.event_loop.loop)
+
+    def test_call(self):
+        self.assertEqual(self.event_loop.call(lambda a, b: a + b, 1, 2), 3)
+        self.assertTrue(self.event_loop.call(lambda: self.event_loop.in_loop_thread))
+        self.assertFalse(self.event_loop.in_loop_thread)
+
+        def fail():
+            raise ValueError()
+
+        self.assertRaises(ValueError, self.event_loop.call, fail)
+
+    def test_call_later(self):
+        called = threading.Event()
+
+        self.event_loop.call(self.event_loop.call_later, 0.01, called.set)
+
+        self.assertTrue(called.wait(1.0))
+
+    def test_asyncore_dispatchers(self):
+        server = self.event_loop.call(EchoServer, self.event_loop.socket_map)
+
+        with socket.create_connection(server.socket.getsockname(), timeout=1.0) as sock:
+            sock.sendall(b"hello")
+            self.assertEqual(sock.recv(1024), b"hello")
+
+        self.event_loop.stop()
+        self.assertEqual(len(server._map), 0)
+        self.event_loop.start()
+
+    def test_listen(self):
+        listener = self.event_loop.call(
+            self.event_loop.listen, EchoProtocol, "127.0.0.1", 0
+        )
+
+        with socket.create_connection(listener.address, timeout=1.0) as sock:
+            sock.sendall(b"hello")
+            self.assertEqual(sock.recv(1024), b"hello")
+
+        self.assertRaises(
+            OSError,
+            self.event_loop.call,
+            self.event_loop.listen,
+            EchoProtocol,
+            *listener.address
+        )
+
+        self.event_loop.call(listener.close)
@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+# *********************************************************************
+# lewis - a library for creating hardware device simulators
+# Copyright (C) 2016-2020 European Spallation Source ERIC
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# *********************************************************************
+
+import json
+import multiprocessing
+import signal
+import unittest
+
+from mock import Mock, patch
+
+from lewis.core.control_server import ExposedObject
+from lewis.core.exceptions import LewisException
+from lewis.core.fleet import FleetControlServer, SimulationFleet
+
+
+class TestSimulationFleet(unittest.TestCase):
+    def _get_simulations(self, count):
+        return {"sim{}".format(i): {"device": "julabo"} for i in range(count)}
+
+    def test_requires_simulations(self):
+        self.assertRaises(LewisException, SimulationFleet, {})
+
+    def test_shards_are_contiguous_and_balanced(self):
+        fleet = SimulationFleet(self._get_simulations(5), workers=2)
+
+        self.assertEqual(fleet.workers, 2)
+        self.assertEqual(fleet.shards, [["sim0", "sim1", "sim2"], ["sim3", "sim4"]])
+
+    def test_workers_limited_by_simulations(self):
+        fleet = SimulationFleet(self._get_simulations(2), workers=8)
+
+        self.assertEqual(fleet.workers, 2)
+        self.assertEqual(fleet.shards, [["sim0"], ["sim1"]])
+
+    def test_no_pinning(self):
+        fleet = SimulationFleet(self._get_simulations(3), workers=3, pin_workers=False)
+
+        self.assertEqual(fleet._get_cpus(), [None, None, None])
+
+    @patch("lewis.core.fleet.os.sched_getaffinity", create=True)
+    @patch("lewis.core.fleet.os.sched_setaffinity", create=True)
+    def test_pinning_cycles_through_cpus(self, setaffinity_mock, getaffinity_mock):
+        getaffinity_mock.return_value = {4, 2}
+
+        fleet = SimulationFleet(self._get_simulations(3), workers=3)
+
+        self.assertEqual(fleet._get_cpus(), [2, 4, 2])
+
+    def test_worker_ending_without_port_raises(self):
+        fleet = SimulationFleet(self._get_simulations(1))
+
+        connection, worker_connection = multiprocessing.Pipe(duplex=False)
+        worker_connection.close()
+
+        self.assertRaises(LewisException, fleet._receive_port, 0, connection)
+
+    @patch("lewis.core.fleet.os.kill")
+    def test_stop_kills_workers_that_do_not_end(self, kill_mock):
+        fleet = SimulationFleet(self._get_simulations(1))
+
+        process = Mock(pid=1234)
+        process.is_alive.return_value = True
+        fleet._processes = [process]
+
+        fleet.stop()
+
+        process.terminate.assert_called_once_with()
+        kill_mock.assert_called_once_with(1234, signal.SIGKILL)
+        self.assertEqual(process.join.call_count, 2)
+
+    def test_stop_joins_workers_and_closes_control_server(self):
+        fleet = SimulationFleet(self._get_simulations(1))
+
+        process = Mock()
+        process.is_alive.return_value = False
+        server = Mock()
+
+        fleet._processes = [process]
+        fleet._server = server
+        fleet._serving = True
+
+        # While a request is processed, for example fleet.stop, the server stays open
+        fleet.stop()
+
+        process.join.assert_called_once_with(5.0)
+        server.stop_server.assert_not_called()
+        self.assertEqual(fleet.is_alive, [])
+
+        fleet._serving = False
+        fleet.stop()
+
+        server.stop_server.assert_called_once_with()
+        self.assertIsNone(fleet._server)
+
+
+@patch("lewis.core.fleet.ControlClient")
+class TestFleetControlServer(unittest.TestCase):
+    def _get_server(self):
+        return FleetControlServer(
+            {"fleet": Mock()},
+            "127.0.0.1:10000",
+            ["127.0.0.1:10001", "127.0.0.1:10002"],
+            {"sim0": 0, "sim1": 1},
+        )
+
+    def test_routes(self, control_client_mock):
+        server = self._get_server()
+
+        self.assertEqual(
+            server._get_worker_and_method("sim1.device.speed:get"),
+            (1, "sim1.device.speed:get"),
+        )
+        self.assertEqual(
+            server._get_worker_and_method("worker0.cycles:get"),
+            (0, "simulation.cycles:get"),
+        )
+        self.assertEqual(server._get_worker_and_method("worker2.cycles:get"), None)
+        self.assertEqual(server._get_worker_and_method("fleet.stop"), None)
+
+    def test_get_objects_merges_workers(self, control_client_mock):
+        control_client_mock.return_value.json_rpc.side_effect = [
+            ({"result": ["simulation", "sim0.device"]}, 1),
+            ({"result": ["simulation", "sim1.device"]}, 2),
+        ]
+
+        server = self._get_server()
+
+        self.assertEqual(
+            server._get_objects(),
+            ["fleet", "worker0", "sim0.device", "worker1", "sim1.device"],
+        )
+
+    def test_process_forwards_request(self, control_client_mock):
+        control_client_mock.return_value.json_rpc.return_value = (
+            {"jsonrpc": "2.0", "id": "worker-id", "result": 42},
+            "worker-id",
+        )
+
+        server = self._get_server()
+        server._socket = Mock()
+        server._socket.recv_unicode.return_value = json.dumps(
+            {
+                "jsonrpc": "2.0",
+                "id": "1",
+                "method": "sim1.device.speed:get",
+                "params": [],
+            }
+        )
+
+        server.process()
+
+        control_client_mock.return_value.json_rpc.assert_called_once_with(
+            "sim1.device.speed:get"
+        )
+        server._socket.send_unicode.assert_called_once()
+        self.assertEqual(
+            json.loads(server._socket.send_unicode.call_args[0][0]),
+            {"jsonrpc": "2.0", "id": "1", "result": 42},
+        )
+
+    def test_local_requests_are_handled_by_exposed_objects(self, control_client_mock):
+        server = FleetControlServer(
+            {"fleet": ExposedObject(Mock(workers=2), members=("workers",))},
+            "127.0.0.1:10000",
+            ["127.0.0.1:10001"],
+            {"sim0": 0},
+        )
+
+        response = server._handle_request(
+            json.dumps(
+                {
+                    "jsonrpc": "2.0",
+                    "id": "1",
+                    "method": "fleet.workers:get",
+                    "params": [],
+                }
+            )
+        )
+
+        self.assertEqual(json.loads(response)["result"], 2)
+        control_client_mock.return_value.json_rpc.assert_not_called()
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+# *********************************************************************
+# lewis - a library for creating hardware device simulators
+# Copyright (C) 2016-2020 European Spallation Source ERIC
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# *********************************************************************
+
+import socket
+import struct
+import unittest
+
+from lewis.adapters.modbus import ModbusAdapter, ModbusBasicDataBank, ModbusInterface
+from lewis.core.adapters import DeviceLock
+
+
+class DummyInterface(ModbusInterface):
+    di = ModbusBasicDataBank(False)
+    co = di
+    ir = ModbusBasicDataBank(0)
+    hr = ir
+
+
+def request(transaction_id, fcode, addr, value):
+    return struct.pack(">HHHBBHH", transaction_id, 0, 6, 1, fcode, addr, value)
+
+
+class TestAsyncioModbusAdapter(unittest.TestCase):
+    def setUp(self):
+        self.adapter = ModbusAdapter(options={"bind_address": "127.0.0.1", "port": 0})
+        self.adapter.interface = DummyInterface()
+        self.adapter.device_lock = DeviceLock()
+        self.adapter.start_server()
+        self.addCleanup(self.adapter.stop_server)
+
+        self.address = self.adapter._server._listener.address
+
+    def _connect(self):
+        client = socket.create_connection(self.address, timeout=2)
+        self.addCleanup(client.close)
+        return client
+
+    def test_write_is_visible_to_other_clients(self):
+        first, second = self._connect(), self._connect()
+
+        first.sendall(request(1, 0x06, 5, 1234))
+        self.assertEqual(first.recv(1024), request(1, 0x06, 5, 1234))
+
+        second.sendall(request(2, 0x03, 5, 1))
+        self.assertEqual(
+            second.recv(1024), struct.pack(">HHHBBBH", 2, 0, 5, 1, 0x03, 2, 1234)
+        )
+
+    def test_fragmented_requests(self):
+        client = self._connect()
+        data = request(1, 0x03, 7, 1) + request(2, 0x03, 7, 1)
+
+        client.sendall(data[:5])
+        client.sendall(data[5:15])
+        client.sendall(data[15:])
+
+        expected = struct.pack(">HHHBBBH", 1, 0, 5, 1, 0x03, 2, 0) + struct.pack(
+            ">HHHBBBH", 2, 0, 5, 1, 0x03, 2, 0
+        )
+
+        received = b""
+        while len(received) < len(expected):
+            received += client.recv(1024)
+
+        self.assertEqual(received, expected)
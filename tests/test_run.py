@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+# *********************************************************************
+# lewis - a library for creating hardware device simulators
+# Copyright (C) 2016-2020 European Spallation Source ERIC
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# *********************************************************************
+
+import unittest
+
+from lewis.core.exceptions import LewisException
+from lewis.scripts.run import parse_duration
+
+
+class TestParseDuration(unittest.TestCase):
+    def test_units(self):
+        self.assertEqual(parse_duration("600"), 600.0)
+        self.assertEqual(parse_duration("600s"), 600.0)
+        self.assertEqual(parse_duration("250ms"), 0.25)
+        self.assertEqual(parse_duration("10m"), 600.0)
+        self.assertEqual(parse_duration("1.5h"), 5400.0)
+
+    def test_invalid_durations(self):
+        for raw_duration in ("abc", "10x", "0", "-5s", "nan", "inf", "infs", "1e400"):
+            self.assertRaises(LewisException, parse_duration, raw_duration)
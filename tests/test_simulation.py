@@ -17,11 +17,15 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 # *********************************************************************
 
+import time
 import unittest
+from threading import Thread
 
 from mock import ANY, MagicMock, Mock, call, patch
 
-from lewis.core.simulation import Simulation
+from lewis.core.clock import Clock, VirtualClock
+from lewis.core.simulation import Simulation, SimulationHost
+from lewis.devices import Device
 
 from .utils import assertRaisesNothing
 
@@ -39,29 +43,29 @@ class TestSimulation(unittest.TestCase):
         self.addCleanup(patcher.stop)
         self.mock_sleep = patcher.start()
 
-    @patch("lewis.core.simulation.seconds_since")
-    def test_process_cycle_returns_elapsed_time(self, elapsed_seconds_mock):
-        env = Simulation(device=Mock())
+    def test_process_cycle_returns_elapsed_time(self):
+        clock = Mock(spec=Clock)
+        env = Simulation(device=Mock(), clock=clock)
 
         # It doesn't matter what happens in the simulation cycle, here we
         # only care how long it took.
         with patch.object(env, "_process_simulation_cycle"):
-            elapsed_seconds_mock.return_value = 0.5
+            clock.seconds_since.return_value = 0.5
             delta = env._process_cycle(0.0)
 
-            elapsed_seconds_mock.assert_called_once_with(ANY)
+            clock.seconds_since.assert_called_once_with(ANY)
             self.assertEqual(delta, 0.5)
 
-    @patch("lewis.core.simulation.seconds_since")
-    def test_process_cycle_changes_runtime_status(self, elapsed_seconds_mock):
-        env = Simulation(device=Mock())
+    def test_process_cycle_changes_runtime_status(self):
+        clock = Mock(spec=Clock)
+        env = Simulation(device=Mock(), clock=clock)
 
         with patch.object(env, "_process_simulation_cycle"):
             self.assertEqual(env.uptime, 0.0)
 
             set_simulation_running(env)
 
-            elapsed_seconds_mock.return_value = 0.5
+            clock.seconds_since.return_value = 0.5
             env._process_cycle(0.0)
 
             self.assertEqual(env.uptime, 0.5)
@@ -204,6 +208,211 @@ class TestSimulation(unittest.TestCase):
 
         self.assertRaises(ValueError, setattr, env, "cycle_delay", -4)
 
+    def test_scheduler_and_overrun_policy_range(self):
+        env = Simulation(device=Mock())
+
+        self.assertEqual(env.scheduler, "delay")
+        self.assertEqual(env.overrun_policy, "catch_up")
+
+        assertRaisesNothing(self, setattr, env, "scheduler", "deadline")
+        self.assertEqual(env.scheduler, "deadline")
+
+        assertRaisesNothing(self, setattr, env, "overrun_policy", "skip")
+        self.assertEqual(env.overrun_policy, "skip")
+
+        self.assertRaises(ValueError, setattr, env, "scheduler", "fast")
+        self.assertRaises(ValueError, setattr, env, "overrun_policy", "ignore")
+
+    def test_deadline_scheduler_subtracts_processing_time(self):
+        clock = VirtualClock(10.0)
+        device_mock = Mock()
+        env = Simulation(device=device_mock, clock=clock)
+        set_simulation_running(env)
+        env.scheduler = "deadline"
+
+        # Cycle starts at t=10.0, device processing finishes at t=10.13
+        device_mock.process.side_effect = lambda dt: clock.advance(0.13)
+        self.assertAlmostEqual(env._process_cycle(0.0), 0.13)
+        self.assertAlmostEqual(self.mock_sleep.call_args[0][0], 0.1)
+
+        # Next cycle starts at t=10.13, so only 0.07 s remain until the deadline
+        device_mock.process.side_effect = lambda dt: clock.advance(0.1)
+        self.assertAlmostEqual(env._process_cycle(0.13), 0.1)
+        self.assertAlmostEqual(self.mock_sleep.call_args[0][0], 0.07)
+
+        device_mock.assert_has_calls([call.process(0.0), call.process(0.13)])
+        self.assertEqual(env.overruns, 0)
+
+    def test_deadline_scheduler_catches_up_after_overrun(self):
+        clock = VirtualClock()
+        device_mock = Mock()
+        env = Simulation(device=device_mock, clock=clock)
+        set_simulation_running(env)
+        env.scheduler = "deadline"
+
+        # Processing takes 0.45 s, so the deadlines at 0.2 and 0.3 are missed
+        device_mock.process.side_effect = lambda dt: clock.advance(0.45)
+        env._process_cycle(0.0)
+        device_mock.process.side_effect = None
+        self.assertEqual(env.overruns, 1)
+
+        # The next cycle does not sleep to catch up
+        env._process_cycle(0.45)
+        self.assertEqual(self.mock_sleep.call_args[0][0], 0.0)
+        self.assertEqual(env.skipped_cycles, 0)
+
+    def test_deadline_scheduler_skips_missed_cycles(self):
+        clock = VirtualClock()
+        device_mock = Mock()
+        env = Simulation(device=device_mock, clock=clock)
+        set_simulation_running(env)
+        env.scheduler = "deadline"
+        env.overrun_policy = "skip"
+
+        device_mock.process.side_effect = lambda dt: clock.advance(0.45)
+        env._process_cycle(0.0)
+        device_mock.process.side_effect = None
+        self.assertEqual(env.overruns, 1)
+        self.assertEqual(env.skipped_cycles, 3)
+
+        # The next deadline is the first one in the future (0.5)
+        env._process_cycle(0.45)
+        self.assertAlmostEqual(self.mock_sleep.call_args[0][0], 0.05)
+
+    def test_run_virtual_until(self):
+        device_mock = Mock()
+        env = Simulation(device=device_mock)
+
+        env.run_virtual(until=1.0, dt=0.1)
+
+        self.assertEqual(env.cycles, 10)
+        self.assertAlmostEqual(env.runtime, 1.0)
+        device_mock.assert_has_calls([call.process(0.1)] * 10)
+        self.mock_sleep.assert_not_called()
+        self.assertFalse(env.is_started)
+
+    def test_run_virtual_stop_condition(self):
+        env = Simulation(device=Mock())
+
+        env.run_virtual(stop_condition=lambda: env.cycles == 3)
+
+        self.assertEqual(env.cycles, 3)
+        self.assertAlmostEqual(env.runtime, 0.3)
+
+    def test_run_virtual_default_dt_uses_speed(self):
+        device_mock = Mock()
+        env = Simulation(device=device_mock)
+        env.cycle_delay = 0.05
+        env.speed = 4.0
+
+        env.run_virtual(until=0.4)
+
+        self.assertEqual(env.cycles, 2)
+        device_mock.assert_has_calls([call.process(0.2)] * 2)
+
+    def test_run_virtual_requires_positive_dt(self):
+        env = Simulation(device=Mock())
+        env.cycle_delay = 0.0
+
+        self.assertRaises(ValueError, env.run_virtual, until=1.0)
+        self.assertRaises(ValueError, env.run_virtual, until=1.0, dt=-0.1)
+
+    def _get_quiescent_simulation(self, quiescent_time):
+        device_mock = Mock(spec=Device)
+        device_mock.get_quiescent_time.return_value = quiescent_time
+
+        env = Simulation(device=device_mock)
+        env._wake_event = Mock()
+        set_simulation_running(env)
+
+        return env
+
+    def test_quiescent_device_waits_for_wake(self):
+        env = self._get_quiescent_simulation(float("inf"))
+
+        env._process_cycle(0.1)
+        env._wake_event.wait.assert_not_called()
+
+        env._process_cycle(0.1)
+        env._wake_event.wait.assert_called_once_with()
+        self.assertEqual(env.quiescent_cycles, 1)
+
+    def test_quiescent_wait_is_limited_by_quiescent_time(self):
+        env = self._get_quiescent_simulation(2.0)
+        env.speed = 4.0
+
+        env._process_cycle(0.1)
+        env._process_cycle(0.1)
+
+        env._wake_event.wait.assert_called_once_with(0.5)
+
+    def test_quiescence_can_be_disabled(self):
+        env = self._get_quiescent_simulation(float("inf"))
+        env.quiescence = False
+
+        env._process_cycle(0.1)
+        env._process_cycle(0.1)
+
+        env._wake_event.wait.assert_not_called()
+        self.assertEqual(env.quiescent_cycles, 0)
+
+    def test_run_virtual_skips_quiescent_time(self):
+        device_mock = Mock(spec=Device)
+        device_mock.get_quiescent_time.return_value = float("inf")
+        env = Simulation(device=device_mock)
+
+        env.run_virtual(until=1.0, dt=0.1)
+
+        self.assertEqual(env.cycles, 2)
+        self.assertAlmostEqual(env.runtime, 1.0)
+        device_mock.process.assert_has_calls([call(0.1), call(0.9)])
+
+    def test_snapshot_is_published_after_processing(self):
+        device_mock = Mock()
+        env = Simulation(device=device_mock)
+        env.snapshots = True
+
+        device_lock = env._adapters.device_lock
+        getter = Mock(side_effect=lambda: device_mock.process.call_count)
+        device_lock.register_getter(getter)
+
+        env._advance(0.1)
+        self.assertEqual(device_lock.snapshot[getter], 1)
+
+        env.snapshots = False
+        env._advance(0.1)
+        self.assertIsNone(device_lock.snapshot)
+
+    def test_stats_record_cycle_timing(self):
+        clock = VirtualClock(1.0)
+        device_mock = Mock()
+        env = Simulation(device=device_mock, clock=clock)
+        set_simulation_running(env)
+
+        # Sleeping takes 0.1 s in both cycles, processing takes 0.05 s and 0.02 s
+        self.mock_sleep.side_effect = clock.advance
+
+        device_mock.process.side_effect = lambda dt: clock.advance(0.05)
+        env._process_simulation_cycle(0.1)
+
+        device_mock.process.side_effect = lambda dt: clock.advance(0.02)
+        env._process_simulation_cycle(0.1)
+
+        stats = env.stats
+
+        self.assertEqual(stats["cycles"], 2)
+        self.assertEqual(stats["cycle_period"]["count"], 1)
+        self.assertAlmostEqual(stats["cycle_period"]["max"], 0.15)
+        self.assertEqual(stats["sleep_time"]["count"], 2)
+        self.assertAlmostEqual(stats["sleep_time"]["mean"], 0.1)
+        self.assertAlmostEqual(stats["processing_time"]["max"], 0.05)
+        self.assertIn("contentions", stats["device_lock"])
+
+        env.reset_stats()
+
+        self.assertEqual(env.stats["processing_time"]["count"], 0)
+        self.assertEqual(env.stats["cycles"], 2)
+
     def test_start_stop(self):
         env = Simulation(device=Mock())
 
@@ -301,7 +510,206 @@ class TestSimulation(unittest.TestCase):
             device=Mock(), adapters=adapter_mock, device_builder=MockBuilder()
         )
 
+        sim._quiescent_time = float("inf")
         sim.switch_setup("foo")
 
         self.assertEqual(sim._device, "foo")
+        self.assertEqual(sim._quiescent_time, 0.0)
+        self.assertTrue(sim._wake_event.is_set())
         self.assertRaises(RuntimeError, sim.switch_setup, "bar")
+
+    def test_switch_setup_of_member_wakes_host(self):
+        class MockBuilder:
+            setups = {"foo": None}
+
+            def create_device(self, setup):
+                return Mock()
+
+        member = Simulation(device=Mock(), device_builder=MockBuilder())
+        host = SimulationHost(simulations={"a": member})
+        host._quiescent_time = float("inf")
+
+        member.switch_setup("foo")
+
+        self.assertEqual(host._quiescent_time, 0.0)
+        self.assertTrue(host._wake_event.is_set())
+
+
+class IdleDevice(Device):
+    """Only changes after it has been started from outside."""
+
+    def __init__(self):
+        super(IdleDevice, self).__init__()
+        self.running = False
+        self.elapsed = 0.0
+
+    def doProcess(self, dt):
+        if self.running:
+            self.elapsed += dt
+
+    def get_quiescent_time(self):
+        return 0.0 if self.running else float("inf")
+
+
+class TestQuiescentWrites(unittest.TestCase):
+    def _run_write_after_idle(self, simulation, device, device_lock):
+        simulation.cycle_delay = 0.01
+
+        thread = Thread(target=simulation.start)
+        thread.start()
+
+        try:
+            time.sleep(0.5)
+
+            with device_lock:
+                device.running = True
+
+            written = time.perf_counter()
+            time.sleep(0.1)
+
+            with device_lock.read():
+                elapsed = device.elapsed
+
+            post_write = time.perf_counter() - written
+        finally:
+            simulation.stop()
+            thread.join()
+
+        # The idle time before the write must not be applied to the started device
+        self.assertGreater(elapsed, 0.0)
+        self.assertLess(elapsed, post_write + 0.05)
+
+        return simulation
+
+    def test_write_after_idle_time(self):
+        device = IdleDevice()
+        simulation = Simulation(device=device)
+
+        self._run_write_after_idle(simulation, device, simulation._adapters.device_lock)
+
+        self.assertGreater(simulation.runtime, 0.5)
+
+    def test_write_to_member_after_idle_time(self):
+        device = IdleDevice()
+        member = Simulation(device=device)
+        host = SimulationHost(simulations={"a": member})
+
+        self._run_write_after_idle(host, device, member._adapters.device_lock)
+
+
+class TestSimulationHost(unittest.TestCase):
+    def setUp(self):
+        patcher = patch("lewis.core.simulation.sleep")
+        self.addCleanup(patcher.stop)
+        self.mock_sleep = patcher.start()
+
+    def test_add_simulation(self):
+        host = SimulationHost()
+
+        self.assertEqual(host.simulations, [])
+
+        host.add_simulation("a", Simulation(device=Mock()))
+        host.add_simulation("b", Simulation(device=Mock()))
+
+        self.assertEqual(host.simulations, ["a", "b"])
+
+        self.assertRaises(
+            RuntimeError, host.add_simulation, "a", Simulation(device=Mock())
+        )
+        self.assertRaises(
+            RuntimeError, host.add_simulation, "a.b", Simulation(device=Mock())
+        )
+
+        set_simulation_running(host)
+        self.assertRaises(
+            RuntimeError, host.add_simulation, "c", Simulation(device=Mock())
+        )
+
+    def test_add_simulation_with_shared_device_lock(self):
+        host = SimulationHost(device=Mock())
+        own = Simulation(device=Mock())
+        shared = Simulation(device=Mock())
+
+        host.add_simulation("own", own)
+        host.add_simulation("shared", shared, share_device_lock=True)
+
+        host_lock = host._adapters.device_lock
+        self.assertIsNot(own._adapters.device_lock, host_lock)
+        self.assertIs(shared._adapters.device_lock, host_lock)
+
+    def test_add_simulation_with_control_server_fails(self):
+        host = SimulationHost()
+        simulation = Simulation(device=Mock())
+        simulation._control_server = Mock()
+
+        self.assertRaises(RuntimeError, host.add_simulation, "a", simulation)
+
+    def test_process_cycle_processes_all_devices(self):
+        devices = [Mock(), Mock()]
+        host = SimulationHost(
+            simulations={
+                "a": Simulation(device=devices[0]),
+                "b": Simulation(device=devices[1]),
+            }
+        )
+
+        set_simulation_running(host)
+        for name in host.simulations:
+            set_simulation_running(host._simulations[name])
+
+        host._simulations["b"].speed = 2.0
+        host._process_cycle(0.5)
+
+        devices[0].assert_has_calls([call.process(0.5)])
+        devices[1].assert_has_calls([call.process(1.0)])
+
+        self.assertEqual(host.cycles, 1)
+        self.assertEqual(host._simulations["a"].runtime, 0.5)
+        self.assertEqual(host._simulations["b"].runtime, 1.0)
+
+        host._simulations["a"].pause()
+        host._process_cycle(0.5)
+
+        self.assertEqual(devices[0].process.call_count, 1)
+        self.assertEqual(devices[1].process.call_count, 2)
+        self.assertEqual(host.cycles, 2)
+
+    def test_start_connects_member_adapters(self):
+        simulation = Simulation(device=Mock())
+        simulation._adapters = MagicMock()
+
+        host = SimulationHost(simulations={"a": simulation})
+        host.run_virtual(until=0.3, dt=0.1)
+
+        simulation._adapters.connect.assert_called_once_with()
+        simulation._adapters.disconnect.assert_called_once_with()
+        self.assertEqual(simulation.cycles, 3)
+        self.assertFalse(simulation.is_started)
+
+    @patch("lewis.core.simulation.ExposedObject")
+    @patch("lewis.core.simulation.ControlServer")
+    def test_control_server_exposes_members(
+        self, control_server_mock, exposed_object_mock
+    ):
+        exposed_object_mock.return_value = "test"
+
+        host = SimulationHost(
+            simulations={"a": Simulation(device=Mock())},
+            control_server="127.0.0.1:10000",
+        )
+
+        control_server_mock.assert_called_once_with(
+            {"simulation": "test"}, "127.0.0.1:10000"
+        )
+
+        control_server_mock.return_value.exposed_object.assert_has_calls(
+            [
+                call.add_object("test", "a.device"),
+                call.add_object("test", "a.simulation"),
+                call.add_object("test", "a.interface"),
+            ],
+            any_order=True,
+        )
+
+        self.assertRaises(RuntimeError, host.switch_setup, "foo")
+        self.assertRaises(RuntimeError, host.set_device_parameters, {"foo": 1})
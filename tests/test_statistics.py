@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+# *********************************************************************
+# lewis - a library for creating hardware device simulators
+# Copyright (C) 2016-2020 European Spallation Source ERIC
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# *********************************************************************
+
+import unittest
+
+from lewis.core.statistics import Histogram
+
+
+class TestHistogram(unittest.TestCase):
+    def test_empty(self):
+        histogram = Histogram()
+
+        self.assertEqual(
+            histogram.summary(),
+            {"count": 0, "mean": 0.0, "p50": 0.0, "p99": 0.0, "max": 0.0},
+        )
+
+    def test_percentiles_are_upper_bounds(self):
+        histogram = Histogram()
+
+        for value in range(1, 101):
+            histogram.add(value * 1e-3)
+
+        self.assertEqual(histogram.count, 100)
+        self.assertAlmostEqual(histogram.mean, 0.0505)
+        self.assertEqual(histogram.max, 0.1)
+
+        self.assertGreaterEqual(histogram.percentile(50), 0.05)
+        self.assertLess(histogram.percentile(50), 0.05 * 1.1)
+        self.assertGreaterEqual(histogram.percentile(99), 0.099)
+        self.assertLessEqual(histogram.percentile(99), 0.1)
+
+    def test_values_out_of_range(self):
+        histogram = Histogram(minimum=1e-3, maximum=1.0)
+
+        histogram.add(0.0)
+        histogram.add(50.0)
+
+        self.assertEqual(histogram.percentile(50), 1e-3)
+        self.assertEqual(histogram.percentile(100), 50.0)
+
+    def test_reset(self):
+        histogram = Histogram()
+        histogram.add(0.5)
+        histogram.reset()
+
+        self.assertEqual(histogram.count, 0)
+        self.assertEqual(histogram.percentile(50), 0.0)
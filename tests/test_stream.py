@@ -0,0 +1,526 @@
+# -*- coding: utf-8 -*-
+# *********************************************************************
+# lewis - a library for creating hardware device simulators
+# Copyright (C) 2016-2020 European Spallation Source ERIC
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# *********************************************************************
+
+import socket
+import time
+import unittest
+from unittest.mock import Mock, patch
+
+from lewis.adapters.stream import (
+    ChecksumFraming,
+    Cmd,
+    CommandIndex,
+    FixedLengthFraming,
+    Func,
+    LengthPrefixedFraming,
+    PatternMatcher,
+    ReadTimeouts,
+    ResponseCache,
+    StreamProtocol,
+    StreamAdapter,
+    StreamInterface,
+    TerminatorFraming,
+    Var,
+    regex,
+    scanf,
+)
+from lewis.core.adapters import DeviceLock, NoLock
+from lewis.core.clock import VirtualClock, set_clock
+from lewis.core.exceptions import LewisException
+
+from .utils import assertRaisesNothing
+
+
+class DummyDevice:
+    speed = 10
+
+
+class DummyInterface(StreamInterface):
+    commands = {
+        Cmd("echo", scanf("E %s")),
+        Var("speed", read_pattern=scanf("S?"), write_pattern=scanf("S=%d")),
+        Cmd("count", r"^C$", cached=True),
+    }
+
+    in_terminator = "\r\n"
+    out_terminator = "\n"
+
+    readtimeout = 50
+
+    calls = 0
+
+    def count(self):
+        self.calls += 1
+        return self.calls
+
+    def echo(self, value):
+        return value.decode()
+
+    def handle_error(self, request, error):
+        return "ERR"
+
+
+class TestAsyncioStreamAdapter(unittest.TestCase):
+    def setUp(self):
+        self.interface = DummyInterface()
+        self.interface.device = DummyDevice()
+
+        self.adapter = StreamAdapter(options={"bind_address": "127.0.0.1", "port": 0})
+        self.adapter.interface = self.interface
+        self.adapter.device_lock = DeviceLock()
+        self.adapter.start_server()
+
+        port = self.adapter._server._listener.address[1]
+
+        self.client = socket.create_connection(("127.0.0.1", port), timeout=2)
+
+    def tearDown(self):
+        self.client.close()
+        self.adapter.stop_server()
+
+    def _receive(self, expected_length):
+        data = b""
+        while len(data) < expected_length:
+            data += self.client.recv(1024)
+
+        return data
+
+    def test_pipelined_requests_are_processed_in_order(self):
+        self.client.sendall(b"E foo\r\nS?\r\nS=4\r\nS?\r\n")
+
+        self.assertEqual(self._receive(9), b"foo\n10\n4\n")
+        self.assertEqual(self.interface.device.speed, 4)
+
+    def test_request_split_over_several_packets(self):
+        self.client.sendall(b"E f")
+        time.sleep(0.01)
+        self.client.sendall(b"oo\r")
+        time.sleep(0.01)
+        self.client.sendall(b"\n")
+
+        self.assertEqual(self._receive(4), b"foo\n")
+
+    def test_read_timeout_is_an_error_with_terminator(self):
+        self.client.sendall(b"E foo")
+
+        self.assertEqual(self._receive(4), b"ERR\n")
+
+    def test_read_timeout_terminates_request_without_terminator(self):
+        self.adapter.stop_server()
+        self.interface.in_terminator = ""
+        self.adapter.start_server()
+
+        port = self.adapter._server._listener.address[1]
+        client = socket.create_connection(("127.0.0.1", port), timeout=2)
+
+        try:
+            client.sendall(b"S?")
+            self.assertEqual(client.recv(1024), b"10\n")
+        finally:
+            client.close()
+
+    def test_cached_replies_are_reused_until_write(self):
+        self.client.sendall(b"C\r\nC\r\n")
+        self.assertEqual(self._receive(4), b"1\n1\n")
+
+        self.client.sendall(b"S=4\r\nC\r\n")
+        self.assertEqual(self._receive(2), b"2\n")
+
+    def test_unknown_request_is_passed_to_handle_error(self):
+        self.client.sendall(b"X\r\n")
+
+        self.assertEqual(self._receive(4), b"ERR\n")
+
+    def test_stop_server_releases_event_loop(self):
+        event_loop = self.adapter.event_loop
+        self.assertTrue(event_loop.is_running)
+
+        self.adapter.stop_server()
+
+        self.assertIsNone(self.adapter.event_loop)
+        self.assertFalse(event_loop.is_running)
+        self.assertFalse(self.adapter.is_running)
+
+
+class TestStreamAdapterOptions(unittest.TestCase):
+    def test_invalid_backend_raises(self):
+        from lewis.core.exceptions import LewisException
+
+        self.assertRaises(LewisException, StreamAdapter, options={"backend": "twisted"})
+
+
+class PrefixMatcher(PatternMatcher):
+    arg_count = 1
+    argument_mappings = None
+
+    def match(self, request):
+        if request.startswith(self.pattern):
+            return [request[len(self.pattern) :]]
+
+        return None
+
+
+class TestCommandIndex(unittest.TestCase):
+    def _index(self, *patterns):
+        commands = [
+            Func(lambda *args: (index, args), pattern)
+            for index, pattern in enumerate(patterns)
+        ]
+
+        return commands, CommandIndex(commands)
+
+    def _assert_same_as_linear_search(self, commands, index, requests):
+        for request in requests:
+            expected = next(
+                (
+                    (cmd, tuple(cmd.matcher.match(request)))
+                    for cmd in commands
+                    if cmd.can_process(request)
+                ),
+                (None, None),
+            )
+
+            cmd, arguments = index.find(request)
+
+            self.assertIs(cmd, expected[0], request)
+            self.assertEqual(
+                tuple(arguments) if arguments is not None else None, expected[1]
+            )
+
+    def test_first_matching_command_is_found(self):
+        commands, index = self._index(
+            r"^T$",
+            r"^T=(\d+)$",
+            scanf("S=%f,%d"),
+            r"^T(.*)$",
+            r"^V\?$",
+            r"^(A|B)(x)?$",
+        )
+
+        self._assert_same_as_linear_search(
+            commands,
+            index,
+            [
+                b"T",
+                b"T\n",
+                b"T=4",
+                b"T=x",
+                b"S=1.5,3",
+                b"V?",
+                b"V",
+                b"A",
+                b"Bx",
+                b"C",
+                b"",
+            ],
+        )
+
+    def test_literal_shadowed_by_earlier_command(self):
+        commands, index = self._index(r"^T(.*)$", r"^T$")
+
+        self.assertEqual(index.find(b"T"), (commands[0], (b"",)))
+
+    def test_patterns_that_can_not_be_combined(self):
+        commands, index = self._index(
+            r"(?i)^hello$",
+            r"^(?P<name>\w+)!$",
+            r"^(a)\1$",
+            PrefixMatcher(b"P"),
+            r"^P(\d)$",
+            r"^X$",
+        )
+
+        self._assert_same_as_linear_search(
+            commands,
+            index,
+            [b"HELLO", b"hello", b"abc!", b"aa", b"ab", b"P1", b"Pq", b"X", b"Y"],
+        )
+
+    def test_arguments_are_matched_once(self):
+        matcher = regex(r"^T=(\d+)$")
+        cmd = Func(lambda value: value, matcher)
+        index = CommandIndex([cmd, Func(lambda: None, r"^Q$")])
+
+        with patch.object(matcher, "match", side_effect=AssertionError):
+            found, arguments = index.find(b"T=4")
+
+        self.assertIs(found, cmd)
+        self.assertEqual(cmd.process_arguments(arguments), b"4")
+
+
+class TestFunc(unittest.TestCase):
+    def test_read_only_requires_pattern_without_arguments(self):
+        self.assertRaises(
+            RuntimeError, Func, lambda *args: None, scanf("R%d"), read_only=True
+        )
+        assertRaisesNothing(self, Func, lambda *args: None, scanf("R"), read_only=True)
+        assertRaisesNothing(self, Func, lambda *args: None, scanf("R%d"))
+
+
+class TestResponseCache(unittest.TestCase):
+    def test_replies_are_valid_until_generation_changes(self):
+        lock = DeviceLock()
+        cache = ResponseCache(lock)
+
+        self.assertIsNone(cache.get(b"T"))
+
+        with lock.read():
+            cache.add(b"T", "4")
+            cache.add(b"S", None)
+
+        self.assertEqual(cache.get(b"T"), "4")
+        self.assertIsNone(cache.get(b"S", "default"))
+
+        with lock:
+            pass
+
+        self.assertEqual(cache.get(b"T", "default"), "default")
+
+    def test_nothing_is_cached_without_generations(self):
+        cache = ResponseCache(NoLock())
+        cache.add(b"T", "4")
+
+        self.assertIsNone(cache.get(b"T"))
+
+
+class TestStreamProtocol(unittest.TestCase):
+    def setUp(self):
+        self.interface = DummyInterface()
+        self.interface.device = DummyDevice()
+
+        device_lock = DeviceLock()
+        self.server = Mock(device_lock=device_lock)
+        self.server.response_cache = ResponseCache(device_lock)
+
+        self.transport = Mock()
+        self.transport.get_extra_info.return_value = ("127.0.0.1", 1234)
+
+        self.protocol = StreamProtocol(self.interface, self.server)
+        self.protocol.connection_made(self.transport)
+
+    def test_pipelined_requests_are_processed_in_one_batch(self):
+        self.protocol.data_received(b"S=1\r\nS?\r\nC\r\nS=2\r\nC\r\nS?\r\nE f")
+
+        self.transport.write.assert_called_once_with(b"1\n1\n2\n2\n")
+        self.assertEqual(self.server.device_lock.stats["acquisitions"], 1)
+
+        self.protocol.data_received(b"oo\r\n")
+        self.transport.write.assert_called_with(b"foo\n")
+
+    def test_read_only_batch_is_processed_as_read(self):
+        self.protocol.data_received(b"S?\r\nC\r\nC\r\n")
+
+        self.transport.write.assert_called_once_with(b"10\n1\n1\n")
+        self.assertEqual(self.server.device_lock.stats["acquisitions"], 0)
+        self.assertEqual(self.server.device_lock.stats["reads"], 1)
+
+    def _use_snapshots(self):
+        device_lock = DeviceLock(snapshots=True)
+        for cmd in self.interface.bound_commands:
+            if cmd.read_only:
+                device_lock.register_getter(cmd.func)
+
+        self.server.device_lock = device_lock
+        self.server.response_cache = ResponseCache(device_lock)
+        device_lock.publish_snapshot()
+
+        return device_lock
+
+    def test_requests_are_answered_from_snapshot(self):
+        device_lock = self._use_snapshots()
+        self.interface.device.speed = 20
+
+        self.protocol.data_received(b"S?\r\n")
+        self.protocol.data_received(b"S?\r\nS?\r\nC\r\n")
+
+        self.transport.write.assert_called_with(b"10\n10\n1\n")
+        self.assertEqual(device_lock.stats["acquisitions"], 0)
+        self.assertEqual(device_lock.stats["reads"], 1)
+
+        # Reads after a write in the same batch must not use the snapshot
+        self.protocol.data_received(b"S?\r\nS=3\r\nS?\r\n")
+        self.transport.write.assert_called_with(b"10\n3\n")
+        self.assertEqual(device_lock.stats["acquisitions"], 1)
+
+    def test_snapshot_errors_are_handled(self):
+        class Unprintable:
+            def __str__(self):
+                raise ValueError("Can not be printed.")
+
+        self.interface.device.speed = Unprintable()
+        self._use_snapshots()
+
+        self.protocol.data_received(b"S?\r\n")
+        self.transport.write.assert_called_with(b"ERR\n")
+
+        self.protocol.data_received(b"S?\r\nS?\r\n")
+        self.transport.write.assert_called_with(b"ERR\nERR\n")
+
+    def test_multi_byte_binary_terminator(self):
+        self.interface.in_terminator = b"\xff\x00"
+        self.interface.out_terminator = b"\x00"
+
+        protocol = StreamProtocol(self.interface, self.server)
+        protocol.connection_made(self.transport)
+
+        protocol.data_received(b"S?\xff")
+        self.transport.write.assert_not_called()
+
+        protocol.data_received(b"\x00S")
+        self.transport.write.assert_called_once_with(b"10\x00")
+
+        protocol.data_received(b"?\xff\x00E x\xff")
+        protocol.data_received(b"\x00")
+        self.transport.write.assert_called_with(b"x\x00")
+        self.assertEqual(self.transport.write.call_count, 3)
+
+    def test_length_prefixed_framing(self):
+        self.interface.framing = LengthPrefixedFraming(">H")
+
+        protocol = StreamProtocol(self.interface, self.server)
+        protocol.connection_made(self.transport)
+
+        protocol.data_received(b"\x00\x02S?\x00")
+        self.transport.write.assert_called_once_with(b"\x00\x0210")
+
+        protocol.data_received(b"\x05E abc\x00\x02S")
+        self.transport.write.assert_called_with(b"\x00\x03abc")
+
+        protocol.data_received(b"?")
+        self.assertEqual(self.transport.write.call_args[0][0], b"\x00\x0210")
+
+    def test_invalid_checksum_is_an_error(self):
+        self.interface.framing = ChecksumFraming(FixedLengthFraming(3))
+
+        protocol = StreamProtocol(self.interface, self.server)
+        protocol.connection_made(self.transport)
+
+        protocol.data_received(b"S?\x92S?\x00S?\x92")
+        self.transport.write.assert_called_once_with(b"10aERR\xe9" + b"10a")
+
+
+class TestFraming(unittest.TestCase):
+    def test_terminator_framing(self):
+        framing = TerminatorFraming("\r\n", "\n")
+        buffer = bytearray(b"a\r\nbc\r")
+
+        frames, searched = framing.split(buffer, 0)
+
+        self.assertEqual(frames, [b"a"])
+        self.assertEqual(buffer, b"bc\r")
+        self.assertEqual(searched, 3)
+
+        buffer += b"\n"
+        self.assertEqual(framing.split(buffer, searched), ([b"bc"], 0))
+        self.assertEqual(framing.encode(b"x"), b"x\n")
+        self.assertFalse(framing.terminated_by_timeout)
+        self.assertTrue(TerminatorFraming("", "\n").terminated_by_timeout)
+
+    def test_fixed_length_framing(self):
+        framing = FixedLengthFraming(2)
+        buffer = bytearray(b"abcde")
+
+        self.assertEqual(framing.split(buffer, 0), ([b"ab", b"cd"], 0))
+        self.assertEqual(buffer, b"e")
+        self.assertEqual(framing.split(buffer, 0), ([], 0))
+        self.assertEqual(framing.encode(b"xyz"), b"xyz")
+        self.assertRaises(LewisException, FixedLengthFraming, 0)
+
+    def test_length_prefixed_framing(self):
+        framing = LengthPrefixedFraming("B", includes_prefix=True)
+        buffer = bytearray(b"\x03ab\x01\x04c")
+
+        self.assertEqual(framing.split(buffer, 0), ([b"ab", b""], 0))
+        self.assertEqual(buffer, b"\x04c")
+        self.assertEqual(framing.encode(b"xyz"), b"\x04xyz")
+        self.assertRaises(ValueError, framing.encode, b"x" * 255)
+
+    def test_checksum_framing(self):
+        framing = ChecksumFraming(
+            LengthPrefixedFraming("B"),
+            checksum=lambda data: sum(data) & 0xFFFF,
+            checksum_format=">H",
+        )
+
+        self.assertEqual(framing.encode(b"\xff\xff"), b"\x04\xff\xff\x01\xfe")
+        self.assertEqual(framing.decode(b"\xff\xff\x01\xfe"), b"\xff\xff")
+        self.assertRaises(ValueError, framing.decode, b"\xff\xff\x01\xff")
+        self.assertRaises(ValueError, framing.decode, b"\x01")
+
+
+class TestReadTimeouts(unittest.TestCase):
+    def setUp(self):
+        self.clock = VirtualClock()
+        set_clock(self.clock)
+        self.addCleanup(set_clock, None)
+
+        self.event_loop = Mock()
+        self.timeouts = ReadTimeouts(self.event_loop)
+
+    def test_only_expired_deadlines_are_handled(self):
+        handlers = [Mock() for _ in range(3)]
+
+        for index, handler in enumerate(handlers):
+            self.timeouts.restart(handler, 0.1 * (index + 1))
+
+        self.clock.advance(0.25)
+        self.timeouts.expire()
+
+        handlers[0]._read_timeout_expired.assert_called_once_with()
+        handlers[1]._read_timeout_expired.assert_called_once_with()
+        handlers[2]._read_timeout_expired.assert_not_called()
+
+        self.clock.advance(1.0)
+        self.timeouts.expire()
+
+        for handler in handlers:
+            handler._read_timeout_expired.assert_called_once_with()
+
+    def test_restart_extends_deadline(self):
+        handler = Mock()
+        self.timeouts.restart(handler, 0.1)
+
+        self.clock.advance(0.08)
+        self.timeouts.restart(handler, 0.1)
+
+        self.clock.advance(0.08)
+        self.timeouts.expire()
+        handler._read_timeout_expired.assert_not_called()
+
+        self.clock.advance(0.08)
+        self.timeouts.expire()
+        handler._read_timeout_expired.assert_called_once_with()
+
+    def test_cancel(self):
+        handler = Mock()
+        self.timeouts.restart(handler, 0.1)
+        self.timeouts.cancel(handler)
+        self.timeouts.restart(handler, 0.2)
+
+        self.clock.advance(0.3)
+        self.timeouts.expire()
+
+        handler._read_timeout_expired.assert_called_once_with()
+
+    def test_single_timer_for_earliest_deadline(self):
+        self.timeouts.restart(Mock(), 0.1)
+        self.timeouts.restart(Mock(), 0.2)
+
+        self.event_loop.call_later.assert_called_once()
+        self.assertAlmostEqual(self.event_loop.call_later.call_args[0][0], 0.1)
@@ -23,6 +23,7 @@ from datetime import datetime
 
 from mock import patch
 
+from lewis.core.clock import VirtualClock
 from lewis.core.exceptions import LewisException, LimitViolationException
 from lewis.core.utils import (
     FromOptionalDependency,
@@ -132,6 +133,12 @@ class TestSecondsSince(unittest.TestCase):
 
         self.assertRaises(TypeError, seconds_since, None)
 
+    @patch("lewis.core.utils.get_clock")
+    def test_seconds_since_clock_timestamp(self, get_clock_mock):
+        get_clock_mock.return_value = VirtualClock(2.5)
+
+        self.assertEqual(seconds_since(500000000), 2.0)
+
 
 class TestFromOptionalDependency(unittest.TestCase):
     def test_existing_module_works(self):
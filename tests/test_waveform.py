@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+# *********************************************************************
+# lewis - a library for creating hardware device simulators
+# Copyright (C) 2016-2020 European Spallation Source ERIC
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# *********************************************************************
+
+import copy
+import unittest
+
+import numpy as np
+
+from lewis.core.waveform import Waveform
+
+
+class TestWaveform(unittest.TestCase):
+    def test_construction(self):
+        self.assertEqual(list(Waveform(3).values), [0.0, 0.0, 0.0])
+        self.assertEqual(
+            Waveform([[1, 2], [3, 4]], dtype=int).values.tolist(), [1, 2, 3, 4]
+        )
+        self.assertEqual(len(Waveform(5)), 5)
+
+    def test_modifications_increment_version(self):
+        waveform = Waveform(3)
+        version = waveform.version
+
+        waveform[0] = 1.0
+        waveform.fill(2.0)
+        waveform.append(3.0)
+
+        self.assertEqual(waveform.version, (version[0], version[1] + 3))
+        self.assertNotEqual(Waveform(3).version[0], version[0])
+
+    def test_append(self):
+        waveform = Waveform(4)
+
+        waveform.append([1, 2])
+        self.assertEqual(waveform.values.tolist(), [0, 0, 1, 2])
+
+        waveform.append(3)
+        self.assertEqual(waveform.values.tolist(), [0, 1, 2, 3])
+
+        waveform.append(range(6))
+        self.assertEqual(waveform.values.tolist(), [2, 3, 4, 5])
+
+    def test_views_are_read_only_and_not_modified(self):
+        waveform = Waveform([1.0, 2.0, 3.0])
+
+        values = waveform.values
+        part = waveform[1:]
+        array = np.asarray(waveform)
+
+        with self.assertRaises(ValueError):
+            values[0] = 5.0
+
+        waveform[1] = 5.0
+
+        self.assertEqual(values.tolist(), [1.0, 2.0, 3.0])
+        self.assertEqual(part.tolist(), [2.0, 3.0])
+        self.assertEqual(array.tolist(), [1.0, 2.0, 3.0])
+        self.assertEqual(waveform.values.tolist(), [1.0, 5.0, 3.0])
+
+    def test_single_values_do_not_cause_copies(self):
+        waveform = Waveform(3, dtype=int)
+        buffer = waveform._array
+
+        waveform[1] += 1
+        waveform[1] += 1
+
+        self.assertIs(waveform._array, buffer)
+        self.assertEqual(waveform[1], 2)
+
+    def test_copies_keep_values_and_version(self):
+        waveform = Waveform(2)
+        waveform_copy = copy.copy(waveform)
+
+        self.assertEqual(waveform_copy.version, waveform.version)
+
+        waveform[0] = 1.0
+
+        self.assertEqual(waveform_copy.values.tolist(), [0.0, 0.0])
+        self.assertNotEqual(waveform_copy.version, waveform.version)
+
+    def test_diverging_copies_have_different_versions(self):
+        waveform = Waveform(2)
+        first, second = copy.copy(waveform), copy.copy(waveform)
+
+        first[0] = 1.0
+        second[0] = 2.0
+
+        self.assertEqual(first.version[1], second.version[1])
+        self.assertNotEqual(first.version, second.version)
+        self.assertNotEqual(first.version, waveform.version)